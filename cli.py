@@ -0,0 +1,205 @@
+# Linha de comando do LCDPR, sem Qt: serve para cron, scripts de lote e
+# servidores sem interface gráfica.
+#   python cli.py [--banco lcdpr.db] <comando> [opções]
+import argparse
+import os
+import sys
+import time
+
+from dados import (
+    DB_FILENAME, LIMITE_VALIDACAO, ConnectionManager, Database, FiltroLancamentos, gerar_lote,
+    ler_ofx, ler_csv_extrato
+)
+
+
+def _progresso(feitas, total):
+    sys.stderr.write(f"\r{feitas}/{total}" if total else f"\r{feitas}")
+    if total and feitas >= total:
+        sys.stderr.write("\n")
+    sys.stderr.flush()
+
+
+def _imprimir_validacao(res, saida):
+    for e in res['erros']:
+        print(f"{e['registro']}\t{e['id']}\t{e['chave']}\t{e['campo']}\t{e['valor']}\t{e['mensagem']}",
+              file=saida)
+    if res['total'] > len(res['erros']):
+        print(f"... e mais {res['total'] - len(res['erros'])} problemas", file=saida)
+
+
+def cmd_validar(db, args):
+    res = db.validar_lcdpr(args.ano, args.limite)
+    _imprimir_validacao(res, sys.stdout)
+    print(f"{res['total']} problema(s) encontrado(s)", file=sys.stderr)
+    return 1 if res['total'] else 0
+
+
+def cmd_gerar_txt(db, args):
+    if not args.sem_validacao:
+        res = db.validar_lcdpr(args.ano)
+        if res['total']:
+            _imprimir_validacao(res, sys.stderr)
+            print(f"{res['total']} problema(s) de validação; TXT não gerado "
+                  f"(use --sem-validacao para gerar mesmo assim)", file=sys.stderr)
+            return 1
+    linhas = db.escrever_lcdpr_txt(args.saida, _progresso if args.progresso else None,
+                                   ano=args.ano, cache=not args.sem_cache)
+    print(f"{args.saida}: {linhas} linhas")
+    return 0
+
+
+def cmd_gerar_lote(args):
+    jobs = [(banco, ano) for banco in args.bancos for ano in args.anos]
+    inicio = time.perf_counter()
+    resultados = gerar_lote(jobs, args.pasta, args.processos,
+                            _progresso if args.progresso else None)
+    falhas = 0
+    for r in resultados:
+        situacao = "OK" if not r['erro'] else f"ERRO: {r['erro']}"
+        falhas += bool(r['erro'])
+        print(f"{os.path.basename(r['banco'])}\t{r['ano']}\t{r['linhas']}\t"
+              f"{r['segundos']:.2f}s\t{r['problemas']} problema(s)\t{situacao}")
+    print(f"{len(resultados) - falhas} gerado(s), {falhas} falha(s) em "
+          f"{time.perf_counter() - inicio:.1f}s")
+    return 1 if falhas else 0
+
+
+def cmd_exportar_csv(db, args):
+    filtro = None
+    if any(v is not None for v in (args.de, args.ate, args.conta, args.imovel, args.categoria)):
+        filtro = FiltroLancamentos(args.de or "0001-01-01", args.ate or "9999-12-31",
+                                   conta=args.conta, imovel=args.imovel, categoria=args.categoria)
+    n = db.exportar_lancamentos_csv(args.saida, filtro, _progresso if args.progresso else None)
+    print(f"{n} lançamentos exportados para {args.saida}")
+    return 0
+
+
+def cmd_importar(db, args):
+    print(f"{db.importar_lancamentos_csv(args.arquivo)} lançamentos importados de {args.arquivo}")
+    return 0
+
+
+def cmd_importar_txt(db, args):
+    res = db.importar_lcdpr_txt(args.arquivo, _progresso if args.progresso else None)
+    for num, msg in res['erros']:
+        print(f"{args.arquivo}:{num}: {msg}", file=sys.stderr)
+    if res['invalidas'] > len(res['erros']):
+        print(f"... e mais {res['invalidas'] - len(res['erros'])} linhas inválidas", file=sys.stderr)
+    print(f"{res['imoveis']} imóveis, {res['contas']} contas, {res['participantes']} participantes")
+    print(f"{res['lancamentos']} lançamentos importados, {res['duplicados']} já existentes, "
+          f"{res['invalidas']} linhas inválidas")
+    return 1 if res['invalidas'] else 0
+
+
+def cmd_importar_extrato(db, args):
+    if args.arquivo.lower().endswith(".ofx"):
+        linhas = ler_ofx(args.arquivo)
+    else:
+        layouts = db.layouts_extrato()
+        if args.layout not in layouts:
+            raise ValueError(f"layout desconhecido: {args.layout} (disponíveis: {', '.join(layouts)})")
+        linhas = ler_csv_extrato(args.arquivo, layouts[args.layout])
+    res = db.importar_extrato(linhas, args.conta, args.imovel, args.tipo_doc, args.categoria,
+                              args.simular, _progresso if args.progresso else None)
+    periodo = f" de {res['inicio']} a {res['fim']}" if res['inicio'] else ""
+    print(f"{res['lidas']} linhas lidas: {res['novas']} "
+          f"{'a importar' if args.simular else 'importadas'}{periodo}, "
+          f"{res['duplicadas']} duplicadas, {res['ignoradas']} sem valor")
+    print(f"entradas {res['entradas']:.2f}, saídas {res['saidas']:.2f}")
+    return 0
+
+
+def cmd_recalcular_saldos(db, args):
+    print(f"{db.recalcular_todos_saldos()} saldos alterados")
+    if args.resumo:
+        print(f"{db.reconstruir_resumo_mensal()} linhas em resumo_mensal")
+        print(f"{db.reconstruir_resumo_semanal()} linhas em resumo_semanal")
+    return 0
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="LCDPR sem interface gráfica")
+    parser.add_argument("--banco", default=DB_FILENAME, help=f"arquivo SQLite (padrão: {DB_FILENAME})")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("gerar-txt", help="gera o arquivo TXT do LCDPR")
+    p.add_argument("saida", nargs="?", default="LCDPR.txt")
+    p.add_argument("--ano", type=int, help="só os lançamentos deste ano no bloco Q100")
+    p.add_argument("--sem-cache", action="store_true",
+                   help="renderiza todas as linhas, sem ler nem gravar o cache do TXT")
+    p.add_argument("--sem-validacao", action="store_true",
+                   help="gera o TXT mesmo com problemas apontados por validar")
+    p.add_argument("--progresso", action="store_true", help="mostra o andamento em stderr")
+    p.set_defaults(fn=cmd_gerar_txt)
+
+    p = sub.add_parser("validar", help="confere os registros do TXT antes da entrega")
+    p.add_argument("--ano", type=int, help="só os lançamentos deste ano no bloco Q100")
+    p.add_argument("--limite", type=int, default=LIMITE_VALIDACAO,
+                   help=f"problemas listados em detalhe (padrão: {LIMITE_VALIDACAO})")
+    p.set_defaults(fn=cmd_validar)
+
+    p = sub.add_parser("gerar-lote", help="gera um TXT por (banco, ano) em processos paralelos")
+    p.add_argument("bancos", nargs="+")
+    p.add_argument("--anos", type=int, nargs="+", required=True)
+    p.add_argument("--pasta", default="LCDPR_lote", help="pasta de saída")
+    p.add_argument("--processos", type=int, help="padrão: um por núcleo")
+    p.add_argument("--progresso", action="store_true", help="mostra o andamento em stderr")
+    p.set_defaults(fn=None)
+
+    p = sub.add_parser("exportar-csv", help="exporta os lançamentos em CSV (.csv, .csv.gz ou .csv.zst)")
+    p.add_argument("saida")
+    p.add_argument("--de", help="data inicial (aaaa-mm-dd)")
+    p.add_argument("--ate", help="data final (aaaa-mm-dd)")
+    p.add_argument("--conta", type=int, help="id da conta bancária")
+    p.add_argument("--imovel", type=int, help="id do imóvel")
+    p.add_argument("--categoria")
+    p.add_argument("--progresso", action="store_true", help="mostra o andamento em stderr")
+    p.set_defaults(fn=cmd_exportar_csv)
+
+    p = sub.add_parser("importar", help="importa lançamentos de um CSV gerado por exportar-csv")
+    p.add_argument("arquivo")
+    p.set_defaults(fn=cmd_importar)
+
+    p = sub.add_parser("importar-txt", help="importa um TXT do LCDPR (cadastros e lançamentos)")
+    p.add_argument("arquivo")
+    p.add_argument("--progresso", action="store_true", help="mostra o andamento em stderr")
+    p.set_defaults(fn=cmd_importar_txt)
+
+    p = sub.add_parser("importar-extrato", help="importa um extrato bancário OFX ou CSV numa conta")
+    p.add_argument("arquivo", help=".ofx ou CSV no layout indicado")
+    p.add_argument("--conta", type=int, required=True, help="id da conta bancária")
+    p.add_argument("--imovel", type=int, required=True, help="id do imóvel")
+    p.add_argument("--layout", default="Padrão", help="layout do CSV salvo no banco (padrão: Padrão)")
+    p.add_argument("--tipo-doc", type=int, default=4, choices=range(1, 5), help="padrão: 4 (Outros)")
+    p.add_argument("--categoria")
+    p.add_argument("--simular", action="store_true", help="só conta novas e duplicadas, sem gravar")
+    p.add_argument("--progresso", action="store_true", help="mostra o andamento em stderr")
+    p.set_defaults(fn=cmd_importar_extrato)
+
+    p = sub.add_parser("recalcular-saldos", help="refaz a cadeia de saldos de todas as contas")
+    p.add_argument("--resumo", action="store_true", help="reconstrói também o resumo_mensal e o resumo_semanal")
+    p.set_defaults(fn=cmd_recalcular_saldos)
+    return parser
+
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    try:
+        if args.comando == "gerar-lote":
+            return cmd_gerar_lote(args)
+        # só as importações de lançamentos e de TXT podem criar um banco novo
+        if args.comando not in ("importar", "importar-txt") and not os.path.exists(args.banco):
+            raise FileNotFoundError(f"banco não encontrado: {args.banco}")
+        return args.fn(Database(args.banco), args)
+    except KeyboardInterrupt:
+        print("interrompido", file=sys.stderr)
+        return 130
+    except Exception as e:
+        print(f"erro: {e}", file=sys.stderr)
+        return 1
+    finally:
+        ConnectionManager.close_all()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
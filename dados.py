@@ -0,0 +1,2506 @@
+# Camada de dados do LCDPR, sem dependência do Qt
+import sqlite3
+import csv
+import os
+import json
+import time
+import threading
+import re
+import hashlib
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# --- CONSTANTES ---
+DB_FILENAME = 'lcdpr.db'
+LIMITE_BUSCA = 200          # linhas devolvidas por uma pesquisa textual
+LOTE_TXT = 5000             # linhas lidas por fetchmany ao gerar o TXT
+ESPERA_BLOQUEIO_MS = 60000  # quanto uma conexão espera a trava de escrita de outra
+
+# --- FORMATO COMPACTO DE ARMAZENAMENTO ---
+# Formato compacto: centavos inteiros e datas em dia juliano (JDN)
+FORMATO_PADRAO = 'padrao'
+FORMATO_COMPACTO = 'compacto'
+JDN_ORDINAL_OFFSET = 1721425
+
+
+# Conversão para o formato compacto: coluna -> (tipo, expressão)
+CONVERSAO_COMPACTA = {
+    'data': ('INTEGER', "CAST(julianday(data) + 0.5 AS INTEGER)"),
+    'valor_entrada': ('INTEGER', "CAST(ROUND(COALESCE(valor_entrada, 0) * 100) AS INTEGER)"),
+    'valor_saida': ('INTEGER', "CAST(ROUND(COALESCE(valor_saida, 0) * 100) AS INTEGER)"),
+    'saldo_final': ('INTEGER', "CAST(ROUND(saldo_final * 100) AS INTEGER)"),
+}
+
+
+def formatar_centavos(centavos, milhar=False):
+    sinal = '-' if centavos < 0 else ''
+    inteiro, cents = divmod(abs(centavos), 100)
+    inteiro = f"{inteiro:,}" if milhar else str(inteiro)
+    return f"{sinal}{inteiro}.{cents:02d}"
+
+
+# Recria resumo_mensal a partir de todos os lançamentos
+RESUMO_MENSAL_REBUILD = """
+    INSERT INTO resumo_mensal
+        (ano, mes, categoria, cod_conta, cod_imovel, entradas, saidas, qtd)
+    SELECT
+        CAST(strftime('%Y', data) AS INTEGER),
+        CAST(strftime('%m', data) AS INTEGER),
+        COALESCE(categoria, ''), cod_conta, cod_imovel,
+        ROUND(SUM(COALESCE(valor_entrada, 0)), 2),
+        ROUND(SUM(COALESCE(valor_saida, 0)), 2),
+        COUNT(*)
+    FROM lancamento
+    GROUP BY 1, 2, 3, 4, 5
+"""
+
+# Segunda-feira da semana de uma data gravada (texto ou JDN)
+SEMANA = "date({0}, 'weekday 0', '-6 days')"
+
+# Recria resumo_semanal a partir de todos os lançamentos (com GROUP BY 1, 2, 3)
+RESUMO_SEMANAL_REBUILD = f"""
+    INSERT INTO resumo_semanal (semana, cod_conta, cod_imovel, entradas, saidas, qtd)
+    SELECT
+        {SEMANA.format('data')}, cod_conta, cod_imovel,
+        ROUND(SUM(COALESCE(valor_entrada, 0)), 2),
+        ROUND(SUM(COALESCE(valor_saida, 0)), 2),
+        COUNT(*)
+    FROM lancamento
+"""
+RESUMO_SEMANAL_SOMA = """
+    ON CONFLICT (semana, cod_conta, cod_imovel) DO UPDATE SET
+        entradas = ROUND(entradas + excluded.entradas, 2),
+        saidas = ROUND(saidas + excluded.saidas, 2),
+        qtd = qtd + excluded.qtd
+"""
+
+# Tabelas de apoio usadas nos combos: (id, rótulo, código) já ordenadas
+DIMENSOES = {
+    'imovel_rural': "SELECT id, nome_imovel, cod_imovel FROM imovel_rural ORDER BY nome_imovel",
+    'conta_bancaria': "SELECT id, nome_banco, cod_conta FROM conta_bancaria ORDER BY nome_banco",
+    'participante': "SELECT id, nome, cpf_cnpj FROM participante ORDER BY nome",
+}
+
+# CPF/CNPJ sem a máscara, para casar prefixos digitados só com números
+SO_DIGITOS = "replace(replace(replace({0}, '.', ''), '-', ''), '/', '')"
+
+# Soma em resumo_mensal os lançamentos com id acima do informado (cargas em lote)
+RESUMO_MENSAL_INCREMENTO = """
+    INSERT INTO resumo_mensal
+        (ano, mes, categoria, cod_conta, cod_imovel, entradas, saidas, qtd)
+    SELECT
+        CAST(strftime('%Y', data) AS INTEGER),
+        CAST(strftime('%m', data) AS INTEGER),
+        COALESCE(categoria, ''), cod_conta, cod_imovel,
+        ROUND(SUM(COALESCE(valor_entrada, 0)), 2),
+        ROUND(SUM(COALESCE(valor_saida, 0)), 2),
+        COUNT(*)
+    FROM lancamento
+    WHERE id > ?
+    GROUP BY 1, 2, 3, 4, 5
+    ON CONFLICT (ano, mes, categoria, cod_conta, cod_imovel) DO UPDATE SET
+        entradas = ROUND(entradas + excluded.entradas, 2),
+        saidas = ROUND(saidas + excluded.saidas, 2),
+        qtd = qtd + excluded.qtd
+"""
+# O mesmo para resumo_semanal
+RESUMO_SEMANAL_INCREMENTO = (
+    RESUMO_SEMANAL_REBUILD + " WHERE id > ? GROUP BY 1, 2, 3" + RESUMO_SEMANAL_SOMA)
+
+# Gatilhos por linha suspensos durante uma carga em lote
+GATILHOS_INSERCAO = ('trg_resumo_mensal_ins', 'trg_resumo_semanal_ins', 'trg_lancamento_fts_ins',
+                     'trg_lancamento_cache_insert')
+
+# --- CACHE DO TXT DO LCDPR ---
+# Cache do TXT em trechos de 2**BLOCO_CACHE_BITS ids por registro
+BLOCO_CACHE_BITS = 12
+REGISTROS_CACHE = (
+    ('0040', 'imovel_rural'), ('0050', 'conta_bancaria'),
+    ('0100', 'participante'), ('Q100', 'lancamento'),
+)
+# Colunas do Q100 vigiadas no UPDATE; os saldos são marcados por recalcular_saldos
+COLUNAS_Q100 = (
+    'data', 'cod_imovel', 'cod_conta', 'num_doc', 'tipo_doc', 'historico', 'id_participante',
+    'tipo_lanc', 'valor_entrada', 'valor_saida',
+)
+VERSAO_CACHE_INCREMENTO = """
+    ON CONFLICT (registro, bloco) DO UPDATE SET versao = versao + 1
+"""
+# Tabela referenciada pelo Q100 -> (chave natural, coluna de lancamento)
+REFERENCIAS_Q100 = {
+    'imovel_rural': ('cod_imovel', 'cod_imovel'),
+    'conta_bancaria': ('cod_conta', 'cod_conta'),
+    'participante': ('cpf_cnpj', 'id_participante'),
+}
+GATILHOS_Q100 = tuple(
+    f"trg_{tabela}_cache_q100_{evento}" for tabela in REFERENCIAS_Q100 for evento in ('update', 'delete')
+)
+
+# --- CHAVE NATURAL DE LANÇAMENTOS ---
+# Hash de 64 bits que identifica um lançamento na importação de extratos
+def chave_natural(conta, data, centavos, num_doc, historico):
+    texto = "|".join((str(conta), data, str(centavos), (num_doc or "").strip().upper(),
+                      " ".join((historico or "").upper().split())))
+    return int.from_bytes(hashlib.blake2b(texto.encode('utf-8'), digest_size=8).digest(),
+                          'big', signed=True)
+
+
+def _preencher_chave_natural(conn):
+    if 'chave_natural' not in [c[1] for c in conn.execute("PRAGMA table_info(lancamento)")]:
+        conn.execute("ALTER TABLE lancamento ADD COLUMN chave_natural INTEGER")
+    formato = conn.execute(
+        "SELECT valor FROM app_config WHERE chave='formato_armazenamento'").fetchone()
+    compacto = bool(formato) and formato[0] == FORMATO_COMPACTO
+    ultimo = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, cod_conta, data, valor_entrada, valor_saida, num_doc, historico "
+            "FROM lancamento WHERE id > ? ORDER BY id LIMIT ?", (ultimo, LOTE_TXT)
+        ).fetchall()
+        if not rows:
+            break
+        chaves = []
+        for id_, conta, data, ent, sai, num_doc, historico in rows:
+            if compacto:
+                data = date.fromordinal(int(data) - JDN_ORDINAL_OFFSET).isoformat()
+                centavos = int(round(ent or 0)) - int(round(sai or 0))
+            else:
+                centavos = int(round((ent or 0) * 100)) - int(round((sai or 0) * 100))
+            chaves.append((chave_natural(conta, data, centavos, num_doc, historico), id_))
+        conn.executemany("UPDATE lancamento SET chave_natural=? WHERE id=?", chaves)
+        ultimo = rows[-1][0]
+
+
+# --- MIGRAÇÕES DE ESQUEMA ---
+# Migrações: (versão, descrição, passos idempotentes)
+MIGRATIONS = [
+    (1, "Índice de lançamentos por data (cobre somas de entrada/saída)", (
+        "CREATE INDEX IF NOT EXISTS idx_lancamento_data "
+        "ON lancamento (data, valor_entrada, valor_saida)",
+    )),
+    (2, "Índice de lançamentos por conta e id (último saldo da conta)", (
+        "CREATE INDEX IF NOT EXISTS idx_lancamento_conta_id "
+        "ON lancamento (cod_conta, id)",
+    )),
+    (3, "Índice de lançamentos por categoria e data", (
+        "CREATE INDEX IF NOT EXISTS idx_lancamento_categoria_data "
+        "ON lancamento (categoria, data)",
+    )),
+    (4, "Cadeia de saldos por conta ordenada por (data, id)", (
+        "CREATE INDEX IF NOT EXISTS idx_lancamento_conta_data_id "
+        "ON lancamento (cod_conta, data, id)",
+        "DROP VIEW IF EXISTS saldo_contas",
+        """
+        CREATE VIEW saldo_contas AS
+        SELECT
+            cb.id,
+            cb.cod_conta,
+            cb.nome_banco,
+            (SELECT l.saldo_final * (CASE l.natureza_saldo WHEN 'P' THEN 1 ELSE -1 END)
+             FROM lancamento l
+             WHERE l.cod_conta = cb.id
+             ORDER BY l.data DESC, l.id DESC
+             LIMIT 1) AS saldo_atual
+        FROM conta_bancaria cb
+        """,
+    )),
+    (5, "Resumo mensal materializado (substitui o GROUP BY de resumo_categorias)", (
+        """
+        CREATE TABLE IF NOT EXISTS resumo_mensal (
+            ano INTEGER NOT NULL,
+            mes INTEGER NOT NULL,
+            categoria TEXT NOT NULL DEFAULT '',
+            cod_conta INTEGER NOT NULL,
+            cod_imovel INTEGER NOT NULL,
+            entradas REAL NOT NULL DEFAULT 0,
+            saidas REAL NOT NULL DEFAULT 0,
+            qtd INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (ano, mes, categoria, cod_conta, cod_imovel)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_resumo_mensal_ins
+        AFTER INSERT ON lancamento
+        BEGIN
+            INSERT INTO resumo_mensal
+                (ano, mes, categoria, cod_conta, cod_imovel, entradas, saidas, qtd)
+            VALUES (
+                CAST(strftime('%Y', NEW.data) AS INTEGER),
+                CAST(strftime('%m', NEW.data) AS INTEGER),
+                COALESCE(NEW.categoria, ''), NEW.cod_conta, NEW.cod_imovel,
+                COALESCE(NEW.valor_entrada, 0), COALESCE(NEW.valor_saida, 0), 1
+            )
+            ON CONFLICT (ano, mes, categoria, cod_conta, cod_imovel) DO UPDATE SET
+                entradas = ROUND(entradas + excluded.entradas, 2),
+                saidas = ROUND(saidas + excluded.saidas, 2),
+                qtd = qtd + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_resumo_mensal_del
+        AFTER DELETE ON lancamento
+        BEGIN
+            UPDATE resumo_mensal SET
+                entradas = ROUND(entradas - COALESCE(OLD.valor_entrada, 0), 2),
+                saidas = ROUND(saidas - COALESCE(OLD.valor_saida, 0), 2),
+                qtd = qtd - 1
+            WHERE ano = CAST(strftime('%Y', OLD.data) AS INTEGER)
+              AND mes = CAST(strftime('%m', OLD.data) AS INTEGER)
+              AND categoria = COALESCE(OLD.categoria, '')
+              AND cod_conta = OLD.cod_conta AND cod_imovel = OLD.cod_imovel;
+            DELETE FROM resumo_mensal WHERE qtd <= 0;
+        END
+        """,
+        # o recálculo de saldos não dispara este gatilho
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_resumo_mensal_upd
+        AFTER UPDATE OF data, categoria, cod_conta, cod_imovel, valor_entrada, valor_saida
+        ON lancamento
+        BEGIN
+            UPDATE resumo_mensal SET
+                entradas = ROUND(entradas - COALESCE(OLD.valor_entrada, 0), 2),
+                saidas = ROUND(saidas - COALESCE(OLD.valor_saida, 0), 2),
+                qtd = qtd - 1
+            WHERE ano = CAST(strftime('%Y', OLD.data) AS INTEGER)
+              AND mes = CAST(strftime('%m', OLD.data) AS INTEGER)
+              AND categoria = COALESCE(OLD.categoria, '')
+              AND cod_conta = OLD.cod_conta AND cod_imovel = OLD.cod_imovel;
+            DELETE FROM resumo_mensal WHERE qtd <= 0;
+            INSERT INTO resumo_mensal
+                (ano, mes, categoria, cod_conta, cod_imovel, entradas, saidas, qtd)
+            VALUES (
+                CAST(strftime('%Y', NEW.data) AS INTEGER),
+                CAST(strftime('%m', NEW.data) AS INTEGER),
+                COALESCE(NEW.categoria, ''), NEW.cod_conta, NEW.cod_imovel,
+                COALESCE(NEW.valor_entrada, 0), COALESCE(NEW.valor_saida, 0), 1
+            )
+            ON CONFLICT (ano, mes, categoria, cod_conta, cod_imovel) DO UPDATE SET
+                entradas = ROUND(entradas + excluded.entradas, 2),
+                saidas = ROUND(saidas + excluded.saidas, 2),
+                qtd = qtd + 1;
+        END
+        """,
+        "DELETE FROM resumo_mensal",
+        RESUMO_MENSAL_REBUILD,
+        "DROP VIEW IF EXISTS resumo_categorias",
+        """
+        CREATE VIEW resumo_categorias AS
+        SELECT
+            NULLIF(categoria, '') AS categoria,
+            SUM(entradas) AS total_entradas,
+            SUM(saidas) AS total_saidas,
+            printf('%04d', ano) AS ano,
+            printf('%02d', mes) AS mes
+        FROM resumo_mensal
+        GROUP BY categoria, ano, mes
+        """,
+    )),
+    (6, "Saldo atual por conta materializado em conta_saldo", (
+        """
+        CREATE TABLE IF NOT EXISTS conta_saldo (
+            conta_id INTEGER PRIMARY KEY,
+            saldo_inicial REAL NOT NULL DEFAULT 0,
+            saldo_movimento REAL NOT NULL DEFAULT 0,
+            saldo_atual REAL NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_conta_saldo_ins
+        AFTER INSERT ON conta_bancaria
+        BEGIN
+            INSERT OR IGNORE INTO conta_saldo
+                (conta_id, saldo_inicial, saldo_movimento, saldo_atual)
+            VALUES (NEW.id, COALESCE(NEW.saldo_inicial, 0), 0, COALESCE(NEW.saldo_inicial, 0));
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_conta_saldo_upd
+        AFTER UPDATE OF saldo_inicial ON conta_bancaria
+        BEGIN
+            UPDATE conta_saldo SET
+                saldo_inicial = COALESCE(NEW.saldo_inicial, 0),
+                saldo_atual = ROUND(COALESCE(NEW.saldo_inicial, 0) + saldo_movimento, 2)
+            WHERE conta_id = NEW.id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_conta_saldo_del
+        AFTER DELETE ON conta_bancaria
+        BEGIN
+            DELETE FROM conta_saldo WHERE conta_id = OLD.id;
+        END
+        """,
+        "DELETE FROM conta_saldo",
+        """
+        INSERT INTO conta_saldo (conta_id, saldo_inicial, saldo_movimento, saldo_atual)
+        SELECT id, saldo_inicial, movimento, ROUND(saldo_inicial + movimento, 2)
+        FROM (
+            SELECT cb.id, COALESCE(cb.saldo_inicial, 0) AS saldo_inicial,
+                   COALESCE((SELECT l.saldo_final * (CASE l.natureza_saldo WHEN 'P' THEN 1 ELSE -1 END)
+                             FROM lancamento l
+                             WHERE l.cod_conta = cb.id
+                             ORDER BY l.data DESC, l.id DESC
+                             LIMIT 1), 0) AS movimento
+            FROM conta_bancaria cb
+        )
+        """,
+        "DROP VIEW IF EXISTS saldo_contas",
+        """
+        CREATE VIEW saldo_contas AS
+        SELECT cb.id, cb.cod_conta, cb.nome_banco, cs.saldo_atual
+        FROM conta_bancaria cb
+        JOIN conta_saldo cs ON cs.conta_id = cb.id
+        """,
+    )),
+    (7, "Tabela de configuração (formato de armazenamento)", (
+        """
+        CREATE TABLE IF NOT EXISTS app_config (
+            chave TEXT PRIMARY KEY,
+            valor TEXT
+        )
+        """,
+        f"INSERT OR IGNORE INTO app_config (chave, valor) "
+        f"VALUES ('formato_armazenamento', '{FORMATO_PADRAO}')",
+    )),
+    (8, "Índice (data, id) para paginação por chave da aba Lançamentos", (
+        "CREATE INDEX IF NOT EXISTS idx_lancamento_data_id ON lancamento (data, id)",
+    )),
+    (9, "Índices FTS5 de imóveis e participantes para a pesquisa", (
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS imovel_fts USING fts5(
+            cod_imovel, nome_imovel, cod_mun, uf,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_imovel_fts_ins
+        AFTER INSERT ON imovel_rural
+        BEGIN
+            INSERT INTO imovel_fts (rowid, cod_imovel, nome_imovel, cod_mun, uf)
+            VALUES (NEW.id, NEW.cod_imovel, NEW.nome_imovel, NEW.cod_mun, NEW.uf);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_imovel_fts_upd
+        AFTER UPDATE OF cod_imovel, nome_imovel, cod_mun, uf ON imovel_rural
+        BEGIN
+            DELETE FROM imovel_fts WHERE rowid = OLD.id;
+            INSERT INTO imovel_fts (rowid, cod_imovel, nome_imovel, cod_mun, uf)
+            VALUES (NEW.id, NEW.cod_imovel, NEW.nome_imovel, NEW.cod_mun, NEW.uf);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_imovel_fts_del
+        AFTER DELETE ON imovel_rural
+        BEGIN
+            DELETE FROM imovel_fts WHERE rowid = OLD.id;
+        END
+        """,
+        "DELETE FROM imovel_fts",
+        """
+        INSERT INTO imovel_fts (rowid, cod_imovel, nome_imovel, cod_mun, uf)
+        SELECT id, cod_imovel, nome_imovel, cod_mun, uf FROM imovel_rural
+        """,
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS participante_fts USING fts5(
+            nome, documento,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_participante_fts_ins
+        AFTER INSERT ON participante
+        BEGIN
+            INSERT INTO participante_fts (rowid, nome, documento)
+            VALUES (NEW.id, NEW.nome, {SO_DIGITOS.format('NEW.cpf_cnpj')});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_participante_fts_upd
+        AFTER UPDATE OF nome, cpf_cnpj ON participante
+        BEGIN
+            DELETE FROM participante_fts WHERE rowid = OLD.id;
+            INSERT INTO participante_fts (rowid, nome, documento)
+            VALUES (NEW.id, NEW.nome, {SO_DIGITOS.format('NEW.cpf_cnpj')});
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_participante_fts_del
+        AFTER DELETE ON participante
+        BEGIN
+            DELETE FROM participante_fts WHERE rowid = OLD.id;
+        END
+        """,
+        "DELETE FROM participante_fts",
+        f"""
+        INSERT INTO participante_fts (rowid, nome, documento)
+        SELECT id, nome, {SO_DIGITOS.format('cpf_cnpj')} FROM participante
+        """,
+        # primeira página das pesquisas sem termo, na ordem de cada aba
+        "CREATE INDEX IF NOT EXISTS idx_imovel_nome ON imovel_rural (nome_imovel)",
+        "CREATE INDEX IF NOT EXISTS idx_participante_data_cadastro ON participante (data_cadastro)",
+    )),
+    (10, "Índices compostos e FTS5 de histórico/documento para o filtro de lançamentos", (
+        "CREATE INDEX IF NOT EXISTS idx_lancamento_imovel_data_id "
+        "ON lancamento (cod_imovel, data, id)",
+        "CREATE INDEX IF NOT EXISTS idx_lancamento_participante_data_id "
+        "ON lancamento (id_participante, data, id)",
+        "CREATE INDEX IF NOT EXISTS idx_lancamento_tipo_data_id "
+        "ON lancamento (tipo_lanc, data, id)",
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS lancamento_fts USING fts5(
+            historico, num_doc,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_lancamento_fts_ins
+        AFTER INSERT ON lancamento
+        BEGIN
+            INSERT INTO lancamento_fts (rowid, historico, num_doc)
+            VALUES (NEW.id, NEW.historico, NEW.num_doc);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_lancamento_fts_upd
+        AFTER UPDATE OF historico, num_doc ON lancamento
+        BEGIN
+            DELETE FROM lancamento_fts WHERE rowid = OLD.id;
+            INSERT INTO lancamento_fts (rowid, historico, num_doc)
+            VALUES (NEW.id, NEW.historico, NEW.num_doc);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_lancamento_fts_del
+        AFTER DELETE ON lancamento
+        BEGIN
+            DELETE FROM lancamento_fts WHERE rowid = OLD.id;
+        END
+        """,
+        "DELETE FROM lancamento_fts",
+        """
+        INSERT INTO lancamento_fts (rowid, historico, num_doc)
+        SELECT id, historico, num_doc FROM lancamento
+        """,
+    )),
+    (11, "Versão das tabelas de apoio para invalidar o cache dos combos", (
+        """
+        CREATE TABLE IF NOT EXISTS dimensao_versao (
+            tabela TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+    ) + tuple(
+        f"INSERT OR IGNORE INTO dimensao_versao (tabela, versao) VALUES ('{tabela}', 0)"
+        for tabela in DIMENSOES
+    ) + tuple(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{tabela}_versao_{evento.lower()}
+        AFTER {evento} ON {tabela}
+        BEGIN
+            UPDATE dimensao_versao SET versao = versao + 1 WHERE tabela = '{tabela}';
+        END
+        """
+        for tabela in DIMENSOES for evento in ('INSERT', 'UPDATE', 'DELETE')
+    )),
+    (12, "Resumo semanal materializado para o fluxo de caixa por semana", (
+        """
+        CREATE TABLE IF NOT EXISTS resumo_semanal (
+            semana TEXT NOT NULL,
+            cod_conta INTEGER NOT NULL,
+            cod_imovel INTEGER NOT NULL,
+            entradas REAL NOT NULL DEFAULT 0,
+            saidas REAL NOT NULL DEFAULT 0,
+            qtd INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (semana, cod_conta, cod_imovel)
+        ) WITHOUT ROWID
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_resumo_semanal_ins
+        AFTER INSERT ON lancamento
+        BEGIN
+            INSERT INTO resumo_semanal (semana, cod_conta, cod_imovel, entradas, saidas, qtd)
+            VALUES ({SEMANA.format('NEW.data')}, NEW.cod_conta, NEW.cod_imovel,
+                    COALESCE(NEW.valor_entrada, 0), COALESCE(NEW.valor_saida, 0), 1)
+            {RESUMO_SEMANAL_SOMA};
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_resumo_semanal_del
+        AFTER DELETE ON lancamento
+        BEGIN
+            UPDATE resumo_semanal SET
+                entradas = ROUND(entradas - COALESCE(OLD.valor_entrada, 0), 2),
+                saidas = ROUND(saidas - COALESCE(OLD.valor_saida, 0), 2),
+                qtd = qtd - 1
+            WHERE semana = {SEMANA.format('OLD.data')}
+              AND cod_conta = OLD.cod_conta AND cod_imovel = OLD.cod_imovel;
+            DELETE FROM resumo_semanal WHERE qtd <= 0;
+        END
+        """,
+        # como em trg_resumo_mensal_upd, o recálculo de saldos não o dispara
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_resumo_semanal_upd
+        AFTER UPDATE OF data, cod_conta, cod_imovel, valor_entrada, valor_saida
+        ON lancamento
+        BEGIN
+            UPDATE resumo_semanal SET
+                entradas = ROUND(entradas - COALESCE(OLD.valor_entrada, 0), 2),
+                saidas = ROUND(saidas - COALESCE(OLD.valor_saida, 0), 2),
+                qtd = qtd - 1
+            WHERE semana = {SEMANA.format('OLD.data')}
+              AND cod_conta = OLD.cod_conta AND cod_imovel = OLD.cod_imovel;
+            DELETE FROM resumo_semanal WHERE qtd <= 0;
+            INSERT INTO resumo_semanal (semana, cod_conta, cod_imovel, entradas, saidas, qtd)
+            VALUES ({SEMANA.format('NEW.data')}, NEW.cod_conta, NEW.cod_imovel,
+                    COALESCE(NEW.valor_entrada, 0), COALESCE(NEW.valor_saida, 0), 1)
+            {RESUMO_SEMANAL_SOMA};
+        END
+        """,
+        "DELETE FROM resumo_semanal",
+        RESUMO_SEMANAL_REBUILD + " GROUP BY 1, 2, 3",
+    )),
+    (13, "Chave natural (hash) dos lançamentos para deduplicar importações", (
+        _preencher_chave_natural,
+        "CREATE INDEX IF NOT EXISTS idx_lancamento_chave ON lancamento (chave_natural)",
+    )),
+    (14, "Cache das linhas do TXT por trecho de ids, invalidado por gatilhos", (
+        """
+        CREATE TABLE IF NOT EXISTS lcdpr_versao (
+            registro TEXT NOT NULL,
+            bloco INTEGER NOT NULL,
+            versao INTEGER NOT NULL,
+            PRIMARY KEY (registro, bloco)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS lcdpr_cache (
+            registro TEXT NOT NULL,
+            ano INTEGER NOT NULL,
+            bloco INTEGER NOT NULL,
+            versao INTEGER NOT NULL,
+            linhas INTEGER NOT NULL,
+            texto TEXT NOT NULL,
+            PRIMARY KEY (registro, ano, bloco)
+        )
+        """,
+    ) + tuple(
+        f"""
+        INSERT OR IGNORE INTO lcdpr_versao (registro, bloco, versao)
+        SELECT '{registro}', id >> {BLOCO_CACHE_BITS}, 1 FROM {tabela} GROUP BY 2
+        """
+        for registro, tabela in REGISTROS_CACHE
+    ) + tuple(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{tabela}_cache_{evento.lower()}
+        AFTER {evento}{f" OF {', '.join(COLUNAS_Q100)}" if evento == 'UPDATE' and registro == 'Q100' else ""}
+        ON {tabela}
+        BEGIN
+            INSERT INTO lcdpr_versao (registro, bloco, versao)
+            VALUES ('{registro}', {'OLD' if evento == 'DELETE' else 'NEW'}.id >> {BLOCO_CACHE_BITS}, 1)
+            {VERSAO_CACHE_INCREMENTO};
+        END
+        """
+        for registro, tabela in REGISTROS_CACHE for evento in ('INSERT', 'UPDATE', 'DELETE')
+    ) + tuple(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{tabela}_cache_q100_{evento.lower()}
+        AFTER {evento}{f" OF {chave}" if evento == 'UPDATE' else ""} ON {tabela}
+        {f"WHEN OLD.{chave} IS NOT NEW.{chave}" if evento == 'UPDATE' else ""}
+        BEGIN
+            INSERT INTO lcdpr_versao (registro, bloco, versao)
+            SELECT 'Q100', id >> {BLOCO_CACHE_BITS}, 1 FROM lancamento
+            WHERE {coluna} = OLD.id GROUP BY 2
+            {VERSAO_CACHE_INCREMENTO};
+        END
+        """
+        for tabela, (chave, coluna) in REFERENCIAS_Q100.items() for evento in ('UPDATE', 'DELETE')
+    )),
+]
+
+CATEGORIAS = (
+    "Sementes", "Adubos", "Defensivos", "Combustível",
+    "Manutenção", "Mão de Obra", "Venda de Produtos",
+    "Serviços", "Outros",
+)
+
+# Colunas editáveis de um lançamento (saldo_final/natureza_saldo são calculados)
+LANCAMENTO_CAMPOS = (
+    'data', 'cod_imovel', 'cod_conta', 'num_doc', 'tipo_doc', 'historico',
+    'id_participante', 'tipo_lanc', 'valor_entrada', 'valor_saida', 'categoria',
+)
+# Ordem das tuplas gravadas em lote pelas importações
+LANCAMENTO_IMPORTACAO = LANCAMENTO_CAMPOS + ('saldo_final', 'natureza_saldo', 'chave_natural')
+
+
+# --- PERFILAMENTO DE CONSULTAS ---
+class QueryProfiler:
+    # Tempo e linhas por (tag, SQL); consultas lentas guardam o plano
+    MAX_LENTAS = 200
+
+    def __init__(self, limite_lento_ms=100.0):
+        self.limite_lento_ms = limite_lento_ms
+        self.estatisticas = {}
+        self.lentas = []
+        # pilha de tags por thread; acumuladores sob a trava
+        self._local = threading.local()
+        self._trava = threading.Lock()
+
+    @property
+    def _tags(self):
+        if not hasattr(self._local, 'tags'):
+            self._local.tags = []
+        return self._local.tags
+
+    @property
+    def tag_atual(self):
+        return self._tags[-1] if self._tags else ""
+
+    @contextmanager
+    def tag(self, nome):
+        self._tags.append(nome)
+        try:
+            yield
+        finally:
+            self._tags.pop()
+
+    def registrar(self, conn, sql, params, ms, linhas):
+        sql_norm = " ".join(sql.split())
+        chave = (self.tag_atual, sql_norm)
+        lenta = None
+        if ms >= self.limite_lento_ms and len(self.lentas) < self.MAX_LENTAS:
+            lenta = {
+                'tag': chave[0], 'sql': sql_norm, 'ms': round(ms, 3),
+                'linhas': linhas, 'params': [repr(p) for p in (params or [])][:20],
+                'plano': self._plano(conn, sql, params),
+                'quando': datetime.now().isoformat(timespec='seconds'),
+            }
+        with self._trava:
+            est = self.estatisticas.get(chave)
+            if est is None:
+                est = self.estatisticas[chave] = {
+                    'tag': chave[0], 'sql': sql_norm, 'chamadas': 0,
+                    'total_ms': 0.0, 'max_ms': 0.0, 'linhas': 0,
+                }
+            est['chamadas'] += 1
+            est['total_ms'] += ms
+            est['max_ms'] = max(est['max_ms'], ms)
+            if linhas is not None and linhas >= 0:
+                est['linhas'] += linhas
+            if lenta and len(self.lentas) < self.MAX_LENTAS:
+                self.lentas.append(lenta)
+
+    def _plano(self, conn, sql, params):
+        if sql.lstrip().split(None, 1)[0].upper() not in ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE'):
+            return []
+        try:
+            return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params or [])]
+        except sqlite3.Error as e:
+            return [f"(plano indisponível: {e})"]
+
+    def relatorio(self):
+        with self._trava:
+            linhas = [dict(est, medio_ms=est['total_ms'] / est['chamadas'])
+                      for est in self.estatisticas.values()]
+        return sorted(linhas, key=lambda e: e['total_ms'], reverse=True)
+
+    def consultas_lentas(self):
+        with self._trava:
+            return list(self.lentas)
+
+    def exportar_json(self, path):
+        dados = {
+            'limite_lento_ms': self.limite_lento_ms,
+            'consultas': self.relatorio(),
+            'lentas': self.consultas_lentas(),
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(dados, f, ensure_ascii=False, indent=2)
+
+    def limpar(self):
+        with self._trava:
+            self.estatisticas.clear()
+            self.lentas.clear()
+
+
+# --- CANCELAMENTO DE TAREFAS LONGAS ---
+class OperacaoCancelada(Exception):
+    pass
+
+
+# --- RESUMO DE ALTERAÇÕES NO LIVRO-CAIXA ---
+class Alteracao:
+    # Diferença de uma escrita em lancamento, na unidade de armazenamento
+    def __init__(self):
+        self.inseridos = []
+        self.atualizados = []
+        self.excluidos = []
+        # id -> saldo assinado dos lançamentos cuja cadeia foi recalculada
+        self.saldos = {}
+        # (data, valor_entrada, valor_saida) que saíram/entraram no livro
+        self.removidos = []
+        self.adicionados = []
+        # variação da soma de conta_saldo.saldo_atual
+        self.delta_saldo_total = 0
+
+    def __bool__(self):
+        return bool(self.inseridos or self.atualizados or self.excluidos or self.saldos)
+
+
+# --- FILTRO DA ABA LANÇAMENTOS ---
+class FiltroLancamentos:
+    # None/"" desliga o critério; valores em reais
+    def __init__(self, d1, d2, conta=None, imovel=None, participante="",
+                 categoria=None, tipo_lanc=None, valor_min=None, valor_max=None,
+                 num_doc="", texto=""):
+        self.d1 = d1
+        self.d2 = d2
+        self.conta = conta
+        self.imovel = imovel
+        self.participante = participante    # nome ou CPF/CNPJ (participante_fts)
+        self.categoria = categoria
+        self.tipo_lanc = tipo_lanc
+        self.valor_min = valor_min          # entrada + saída do lançamento
+        self.valor_max = valor_max
+        self.num_doc = num_doc
+        self.texto = texto                  # palavras do histórico
+
+
+# --- ARQUIVOS CSV DE LANÇAMENTOS ---
+# Cabeçalho gravado por exportar_lancamentos_csv, na ordem das colunas
+COLUNAS_CSV = (
+    "ID", "Data", "ID Imóvel", "Imóvel", "ID Conta", "Conta", "Documento", "Tipo Doc",
+    "Histórico", "ID Participante", "Participante", "Tipo", "Entrada", "Saída", "Saldo",
+    "Natureza", "Categoria",
+)
+# As que a importação lê; nomes, saldo e natureza são derivados
+COLUNAS_CSV_IMPORTACAO = (
+    "Data", "ID Imóvel", "ID Conta", "Documento", "Tipo Doc", "Histórico",
+    "ID Participante", "Tipo", "Entrada", "Saída", "Categoria",
+)
+
+
+def _modulo_zstd():
+    # zstd é opcional: módulo nativo do Python 3.14+ ou o pacote zstandard
+    try:
+        from compression import zstd
+        return zstd
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        raise RuntimeError("arquivos .zst requerem Python 3.14+ ou o pacote zstandard")
+
+
+def _abrir_texto(arquivo, modo, nome):
+    if nome.endswith(".gz"):
+        import gzip
+        return gzip.open(arquivo, modo + "t", encoding='utf-8', newline='', compresslevel=6)
+    if nome.endswith(".zst"):
+        return _modulo_zstd().open(arquivo, modo + "t", encoding='utf-8', newline='')
+    return open(arquivo, modo, encoding='utf-8', newline='', buffering=1 << 20)
+
+
+def abrir_saida(arquivo, nome=None):
+    return _abrir_texto(arquivo, "w", nome or arquivo)
+
+
+def abrir_entrada(arquivo):
+    return _abrir_texto(arquivo, "r", arquivo)
+
+
+# --- EXTRATOS BANCÁRIOS (OFX E CSV) ---
+# Leitores de extrato: tuplas (data ISO, centavos assinados, histórico, documento)
+VALOR_SIMPLES = re.compile(r"(-?)(\d+)([.,])(\d\d)")
+
+
+def centavos_de_texto(texto, decimal=','):
+    # aceita "1.234,56", "-10,00", "(10,00)" e os sufixos D/C dos bancos
+    m = VALOR_SIMPLES.fullmatch(texto)
+    if m:
+        sinal, inteiro, separador, cents = m.groups()
+        if separador == decimal:
+            centavos = int(inteiro) * 100 + int(cents)
+            return -centavos if sinal else centavos
+    t = texto.strip().upper().replace("R$", "").replace(" ", "")
+    negativo = False
+    if t.endswith("D"):
+        negativo, t = True, t[:-1]
+    elif t.endswith("C"):
+        t = t[:-1]
+    if t.startswith("(") and t.endswith(")"):
+        negativo, t = True, t[1:-1]
+    if t.startswith("-"):
+        negativo, t = True, t[1:]
+    elif t.startswith("+"):
+        t = t[1:]
+    t = t.replace("." if decimal == "," else ",", "").replace(decimal, ".")
+    try:
+        centavos = int((Decimal(t) * 100).to_integral_value(ROUND_HALF_UP))
+    except InvalidOperation:
+        raise ValueError(f"valor inválido: {texto!r}")
+    return -centavos if negativo else centavos
+
+
+def _tags_ofx(f, bloco=1 << 16):
+    # (fechamento?, TAG, texto); OFX 1.x (SGML) e 2.x (XML)
+    resto = ""
+    while True:
+        dados = f.read(bloco)
+        resto += dados
+        corte = len(resto) if not dados else max(resto.rfind("<"), 0)
+        for m in re.finditer(r"<(/?)([A-Za-z0-9.]+)[^>]*>([^<]*)", resto[:corte]):
+            yield m.group(1) == "/", m.group(2).upper(), m.group(3).strip()
+        resto = resto[corte:]
+        if not dados:
+            break
+
+
+def ler_ofx(arquivo):
+    with open(arquivo, 'rb') as f:
+        cabecalho = f.read(1024).decode('ascii', 'ignore').upper()
+    codificacao = 'utf-8' if re.search(r"UTF-?8", cabecalho) else 'cp1252'
+    with open(arquivo, encoding=codificacao, errors='replace') as f:
+        trn = None
+        for fecha, tag, texto in _tags_ofx(f):
+            if tag == "STMTTRN":
+                if trn:
+                    yield _linha_ofx(trn)
+                trn = None if fecha else {}
+            elif trn is not None and not fecha and texto:
+                trn[tag] = texto
+            elif tag == "BANKTRANLIST" and fecha and trn:
+                yield _linha_ofx(trn)
+                trn = None
+        if trn:
+            yield _linha_ofx(trn)
+
+
+def _linha_ofx(trn):
+    try:
+        dt = trn["DTPOSTED"]
+        data = f"{dt[:4]}-{dt[4:6]}-{dt[6:8]}"
+        date.fromisoformat(data)
+        # o padrão é ponto decimal, mas há bancos que gravam vírgula
+        valor = trn["TRNAMT"]
+        centavos = centavos_de_texto(valor, "," if valor.rfind(",") > valor.rfind(".") else ".")
+    except (KeyError, ValueError) as e:
+        raise ValueError(f"transação OFX {trn.get('FITID', '?')}: {e}")
+    historico = trn.get("MEMO") or trn.get("NAME") or ""
+    documento = trn.get("CHECKNUM") or trn.get("REFNUM") or trn.get("FITID") or ""
+    return data, centavos, historico, documento
+
+
+class LayoutExtrato:
+    # Layout de CSV de extrato; colunas por posição (0 = primeira)
+    def __init__(self, nome="Padrão", delimitador=";", codificacao="utf-8", pular=1,
+                 formato_data="%d/%m/%Y", decimal=",", col_data=0, col_historico=1,
+                 col_documento=None, col_valor=2, col_credito=None, col_debito=None,
+                 ignorar="SALDO"):
+        self.nome = nome
+        self.delimitador = delimitador
+        self.codificacao = codificacao
+        self.pular = pular
+        self.formato_data = formato_data
+        self.decimal = decimal
+        self.col_data = col_data
+        self.col_historico = col_historico
+        self.col_documento = col_documento
+        self.col_valor = col_valor
+        self.col_credito = col_credito
+        self.col_debito = col_debito
+        self.ignorar = ignorar
+
+    def como_dict(self):
+        return dict(vars(self))
+
+
+def ler_csv_extrato(arquivo, layout):
+    with open(arquivo, encoding=layout.codificacao, errors='replace', newline='') as f:
+        for num, l in enumerate(csv.reader(f, delimiter=layout.delimitador), 1):
+            if num <= layout.pular or not any(c.strip() for c in l):
+                continue
+            try:
+                historico = l[layout.col_historico].strip()
+                if layout.ignorar and historico.upper().startswith(layout.ignorar.upper()):
+                    continue
+                data = datetime.strptime(l[layout.col_data].strip(), layout.formato_data).date().isoformat()
+                if layout.col_valor is not None:
+                    centavos = centavos_de_texto(l[layout.col_valor], layout.decimal)
+                else:
+                    credito, debito = l[layout.col_credito].strip(), l[layout.col_debito].strip()
+                    centavos = ((centavos_de_texto(credito, layout.decimal) if credito else 0)
+                                - abs(centavos_de_texto(debito, layout.decimal) if debito else 0))
+                documento = l[layout.col_documento].strip() if layout.col_documento is not None else ""
+            except (ValueError, IndexError) as e:
+                raise ValueError(f"linha {num}: {e}")
+            yield data, centavos, historico, documento
+
+
+# --- TXT DO LCDPR (IMPORTAÇÃO) ---
+# Cadastros do TXT: tabela, colunas (a primeira é a chave), opcionais, resumo
+REGISTROS_LCDPR = {
+    '0040': ('imovel_rural', (
+        'cod_imovel', 'pais', 'moeda', 'cad_itr', 'caepf', 'insc_estadual', 'nome_imovel',
+        'endereco', 'num', 'compl', 'bairro', 'uf', 'cod_mun', 'cep', 'tipo_exploracao',
+    ), ('cad_itr', 'caepf', 'insc_estadual', 'num', 'compl'), 'imoveis'),
+    '0050': ('conta_bancaria', (
+        'cod_conta', 'pais_cta', 'banco', 'nome_banco', 'agencia', 'num_conta',
+    ), ('banco',), 'contas'),
+    '0100': ('participante', ('cpf_cnpj', 'nome', 'tipo_contraparte'), (), 'participantes'),
+}
+CAMPOS_Q100 = 12
+# Lançamentos com as chaves naturais no lugar dos ids, como o Q100 os grava
+FONTE_Q100 = """(
+    SELECT l.id, l.data, i.cod_imovel, c.cod_conta, l.num_doc, l.tipo_doc, l.historico,
+           p.cpf_cnpj, l.tipo_lanc, l.valor_entrada, l.valor_saida, l.saldo_final,
+           l.natureza_saldo
+    FROM lancamento l
+    LEFT JOIN imovel_rural i ON i.id = l.cod_imovel
+    LEFT JOIN conta_bancaria c ON c.id = l.cod_conta
+    LEFT JOIN participante p ON p.id = l.id_participante
+)"""
+
+
+def _codificacao_txt(arquivo):
+    # TXT de outros programas costuma vir em cp1252; os nossos são UTF-8
+    with open(arquivo, 'rb') as f:
+        inicio = f.read(1 << 20)
+    try:
+        inicio.decode('utf-8')
+    except UnicodeDecodeError as e:
+        if e.start < len(inicio) - 3:
+            return 'cp1252'
+    return 'utf-8-sig'
+
+
+def _data_lcdpr(texto):
+    # DDMMAAAA no leiaute da Receita; aaaa-mm-dd no TXT de escrever_lcdpr_txt
+    iso = f"{texto[4:]}-{texto[2:4]}-{texto[:2]}" if len(texto) == 8 and texto.isdigit() else texto
+    try:
+        data = date.fromisoformat(iso)
+    except ValueError:
+        raise ValueError(f"data inválida: {texto!r}")
+    return iso if len(iso) == 10 else data.isoformat()
+
+
+# --- VALIDAÇÃO DO LCDPR ---
+# Regras por registro: tabela, identificação e (coluna, mensagem, condição de erro)
+LIMITE_VALIDACAO = 5000     # problemas devolvidos em detalhe; os demais só são contados
+UFS = (
+    'AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA',
+    'PB', 'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO',
+)
+OBRIGATORIO = "campo obrigatório vazio"
+
+
+def _vazio(coluna):
+    return f"TRIM(COALESCE({coluna}, '')) = ''"
+
+
+def _fora_do_formato(coluna, digitos):
+    return f"NOT {_vazio(coluna)} AND {coluna} NOT GLOB '{'[0-9]' * digitos}'"
+
+
+VALIDACOES_LCDPR = {
+    '0040': ('imovel_rural', 'cod_imovel', tuple(
+        (c, OBRIGATORIO, _vazio(c))
+        for c in ('cod_imovel', 'nome_imovel', 'endereco', 'bairro', 'uf', 'cod_mun', 'cep')
+    ) + (
+        ('uf', "UF inexistente", f"NOT {_vazio('uf')} AND uf NOT IN ({', '.join(repr(u) for u in UFS)})"),
+        ('cod_mun', "código IBGE do município deve ter 7 dígitos", _fora_do_formato('cod_mun', 7)),
+        ('cep', "CEP deve ter 8 dígitos", _fora_do_formato('cep', 8)),
+        ('cad_itr', "CAD ITR deve ter 8 dígitos", _fora_do_formato('cad_itr', 8)),
+        ('caepf', "CAEPF deve ter 14 dígitos", _fora_do_formato('caepf', 14)),
+        ('tipo_exploracao', "tipo de exploração fora de 1 a 6", "tipo_exploracao NOT IN (1, 2, 3, 4, 5, 6)"),
+        ('participacao', "participação fora de 0 a 100%", "NOT (participacao > 0 AND participacao <= 100)"),
+    )),
+    '0050': ('conta_bancaria', 'cod_conta', tuple(
+        (c, OBRIGATORIO, _vazio(c)) for c in ('cod_conta', 'nome_banco', 'agencia', 'num_conta')
+    ) + (
+        ('banco', "código do banco deve ter 3 dígitos", _fora_do_formato('banco', 3)),
+    )),
+    '0100': ('participante', 'cpf_cnpj', (
+        ('cpf_cnpj', "CPF/CNPJ inválido", "tipo_cpf_cnpj(cpf_cnpj) = 0"),
+        ('nome', OBRIGATORIO, _vazio('nome')),
+        ('tipo_contraparte', "tipo de participante fora de 1 a 4", "tipo_contraparte NOT IN (1, 2, 3, 4)"),
+        ('cpf_cnpj', "pessoa física com CNPJ", "tipo_contraparte = 1 AND tipo_cpf_cnpj(cpf_cnpj) = 2"),
+        ('cpf_cnpj', "pessoa jurídica com CPF", "tipo_contraparte = 2 AND tipo_cpf_cnpj(cpf_cnpj) = 1"),
+    )),
+    # o lançamento é identificado pelo documento ou, sem ele, pelo histórico
+    'Q100': ('lancamento', "COALESCE(NULLIF(num_doc, ''), historico)", (
+        ('cod_imovel', "imóvel inexistente", "cod_imovel NOT IN (SELECT id FROM imovel_rural)"),
+        ('cod_conta', "conta bancária inexistente", "cod_conta NOT IN (SELECT id FROM conta_bancaria)"),
+        ('id_participante', "participante inexistente", "id_participante IS NOT NULL AND id_participante NOT IN (SELECT id FROM participante)"),
+        ('tipo_doc', "tipo de documento fora de 1 a 4", "tipo_doc NOT IN (1, 2, 3, 4)"),
+        ('tipo_lanc', "tipo de lançamento fora de 1 a 3", "tipo_lanc NOT IN (1, 2, 3)"),
+        ('historico', OBRIGATORIO, _vazio('historico')),
+        ('valor_entrada', "valor negativo", "valor_entrada < 0"),
+        ('valor_saida', "valor negativo", "valor_saida < 0"),
+        ('valor_entrada', "lançamento sem valor de entrada nem de saída",
+         "COALESCE(valor_entrada, 0) = 0 AND COALESCE(valor_saida, 0) = 0"),
+        ('natureza_saldo', "natureza do saldo deve ser P ou N", "natureza_saldo NOT IN ('P', 'N')"),
+    )),
+}
+
+
+def _digito_verificador(digitos, pesos):
+    resto = sum(int(d) * p for d, p in zip(digitos, pesos)) % 11
+    return "0" if resto < 2 else str(11 - resto)
+
+
+def _tipo_cpf_cnpj(texto):
+    # 1 = CPF válido, 2 = CNPJ válido, 0 = inválido
+    doc = re.sub(r"\D", "", texto or "")
+    if len(doc) == 11 and len(set(doc)) > 1:
+        pesos = range(10, 1, -1)
+        if (_digito_verificador(doc[:9], pesos) == doc[9]
+                and _digito_verificador(doc[:10], range(11, 1, -1)) == doc[10]):
+            return 1
+    elif len(doc) == 14 and len(set(doc)) > 1:
+        pesos = (5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)
+        if (_digito_verificador(doc[:12], pesos) == doc[12]
+                and _digito_verificador(doc[:13], (6,) + pesos) == doc[13]):
+            return 2
+    return 0
+
+
+# --- GERENCIADOR DE CONEXÕES ---
+class ConnectionManager:
+    # Uma conexão por arquivo de banco, compartilhada pelo processo
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-20000",
+        "PRAGMA mmap_size=268435456",
+        f"PRAGMA busy_timeout={ESPERA_BLOQUEIO_MS}",
+    )
+    STATEMENT_CACHE = 256
+    _managers = {}
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.conn = sqlite3.connect(filename, cached_statements=self.STATEMENT_CACHE)
+        for pragma in self.PRAGMAS:
+            self.conn.execute(pragma)
+        # usada pelas regras de VALIDACOES_LCDPR
+        self.conn.create_function("tipo_cpf_cnpj", 1, _tipo_cpf_cnpj, deterministic=True)
+        self.schema_verified = False
+        self.compacto = False
+        # tabela de apoio -> (versao, linhas); ver Database.dimensao()
+        self.dimensoes = {}
+        # profundidade da transação explícita aberta por Database.transaction()
+        self.tx_depth = 0
+        # perfilamento opcional: LCDPR_PROFILE=1 e LCDPR_SLOW_MS=<limite>
+        self.profiler = None
+        if os.environ.get('LCDPR_PROFILE'):
+            self.ativar_perfil(float(os.environ.get('LCDPR_SLOW_MS', 100)))
+
+    def ativar_perfil(self, limite_lento_ms=100.0):
+        if self.profiler is None:
+            self.profiler = QueryProfiler(limite_lento_ms)
+        self.profiler.limite_lento_ms = limite_lento_ms
+        return self.profiler
+
+    def desativar_perfil(self):
+        self.profiler = None
+
+    @classmethod
+    def get(cls, filename=DB_FILENAME):
+        key = os.path.abspath(filename) if filename != ':memory:' else filename
+        mgr = cls._managers.get(key)
+        if mgr is None:
+            mgr = cls._managers[key] = cls(filename)
+        return mgr
+
+    def close(self):
+        self.conn.close()
+        for key, mgr in list(self._managers.items()):
+            if mgr is self:
+                del self._managers[key]
+
+    @classmethod
+    def close_all(cls):
+        for mgr in list(cls._managers.values()):
+            mgr.close()
+
+
+# --- CLASSE DE ACESSO AOS DADOS ---
+class Database:
+    def __init__(self, filename=DB_FILENAME, manager=None):
+        # threads que precisam de outra conexão passam um manager próprio
+        self.manager = manager or ConnectionManager.get(filename)
+        self.conn = self.manager.conn
+        if not self.manager.schema_verified:
+            self.create_tables()
+            self.create_views()
+            self.migrate()
+            self.manager.compacto = self.get_config('formato_armazenamento') == FORMATO_COMPACTO
+            self.manager.schema_verified = True
+
+    def create_tables(self):
+        c = self.conn.cursor()
+        c.executescript("""
+        -- Imóveis rurais
+        CREATE TABLE IF NOT EXISTS imovel_rural (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cod_imovel TEXT UNIQUE NOT NULL,
+            pais TEXT NOT NULL DEFAULT 'BR',
+            moeda TEXT NOT NULL DEFAULT 'BRL',
+            cad_itr TEXT,
+            caepf TEXT,
+            insc_estadual TEXT,
+            nome_imovel TEXT NOT NULL,
+            endereco TEXT NOT NULL,
+            num TEXT,
+            compl TEXT,
+            bairro TEXT NOT NULL,
+            uf TEXT NOT NULL,
+            cod_mun TEXT NOT NULL,
+            cep TEXT NOT NULL,
+            tipo_exploracao INTEGER NOT NULL,
+            participacao REAL NOT NULL DEFAULT 100.0,
+            area_total REAL,
+            area_utilizada REAL,
+            data_cadastro DATE DEFAULT CURRENT_DATE
+        );
+        -- Contas bancárias
+        CREATE TABLE IF NOT EXISTS conta_bancaria (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cod_conta TEXT UNIQUE NOT NULL,
+            pais_cta TEXT NOT NULL DEFAULT 'BR',
+            banco TEXT,
+            nome_banco TEXT NOT NULL,
+            agencia TEXT NOT NULL,
+            num_conta TEXT NOT NULL,
+            saldo_inicial REAL DEFAULT 0,
+            data_abertura DATE DEFAULT CURRENT_DATE
+        );
+        -- Participantes
+        CREATE TABLE IF NOT EXISTS participante (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cpf_cnpj TEXT UNIQUE NOT NULL,
+            nome TEXT NOT NULL,
+            tipo_contraparte INTEGER NOT NULL,
+            data_cadastro DATE DEFAULT CURRENT_DATE
+        );
+        -- Culturas
+        CREATE TABLE IF NOT EXISTS cultura (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            ciclo TEXT,
+            unidade_medida TEXT
+        );
+        -- Áreas de produção
+        CREATE TABLE IF NOT EXISTS area_producao (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            imovel_id INTEGER NOT NULL,
+            cultura_id INTEGER NOT NULL,
+            area REAL NOT NULL,
+            data_plantio DATE,
+            data_colheita_estimada DATE,
+            produtividade_estimada REAL,
+            FOREIGN KEY(imovel_id) REFERENCES imovel_rural(id),
+            FOREIGN KEY(cultura_id) REFERENCES cultura(id)
+        );
+        -- Estoques
+        CREATE TABLE IF NOT EXISTS estoque (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto TEXT NOT NULL,
+            quantidade REAL NOT NULL,
+            unidade_medida TEXT NOT NULL,
+            valor_unitario REAL,
+            local_armazenamento TEXT,
+            data_entrada DATE DEFAULT CURRENT_DATE,
+            data_validade DATE,
+            imovel_id INTEGER,
+            FOREIGN KEY(imovel_id) REFERENCES imovel_rural(id)
+        );
+        -- Lançamentos contábeis
+        CREATE TABLE IF NOT EXISTS lancamento (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data DATE NOT NULL,
+            cod_imovel INTEGER NOT NULL,
+            cod_conta INTEGER NOT NULL,
+            num_doc TEXT,
+            tipo_doc INTEGER NOT NULL,
+            historico TEXT NOT NULL,
+            id_participante INTEGER,
+            tipo_lanc INTEGER NOT NULL,
+            valor_entrada REAL DEFAULT 0,
+            valor_saida REAL DEFAULT 0,
+            saldo_final REAL NOT NULL,
+            natureza_saldo TEXT NOT NULL,
+            categoria TEXT,
+            area_afetada INTEGER,
+            quantidade REAL,
+            unidade_medida TEXT,
+            FOREIGN KEY(cod_imovel) REFERENCES imovel_rural(id),
+            FOREIGN KEY(cod_conta) REFERENCES conta_bancaria(id),
+            FOREIGN KEY(id_participante) REFERENCES participante(id),
+            FOREIGN KEY(area_afetada) REFERENCES area_producao(id)
+        );
+        """)
+        self.conn.commit()
+
+    def create_views(self):
+        c = self.conn.cursor()
+        c.executescript("""
+        -- Saldo atual das contas
+        CREATE VIEW IF NOT EXISTS saldo_contas AS
+        SELECT 
+            cb.id,
+            cb.cod_conta,
+            cb.nome_banco,
+            l.saldo_final * (CASE l.natureza_saldo WHEN 'P' THEN 1 ELSE -1 END) AS saldo_atual
+        FROM conta_bancaria cb
+        LEFT JOIN (
+            SELECT cod_conta, MAX(id) AS max_id
+            FROM lancamento
+            GROUP BY cod_conta
+        ) last_l ON cb.id = last_l.cod_conta
+        LEFT JOIN lancamento l ON last_l.max_id = l.id;
+        -- Resumo por categoria
+        CREATE VIEW IF NOT EXISTS resumo_categorias AS
+        SELECT 
+            categoria,
+            SUM(valor_entrada) AS total_entradas,
+            SUM(valor_saida) AS total_saidas,
+            strftime('%Y', data) AS ano,
+            strftime('%m', data) AS mes
+        FROM lancamento
+        GROUP BY categoria, ano, mes;
+        """)
+        self.conn.commit()
+
+    def schema_version(self):
+        return self.conn.execute(
+            "SELECT COALESCE(MAX(versao), 0) FROM schema_version"
+        ).fetchone()[0]
+
+    def migrate(self):
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                versao INTEGER PRIMARY KEY,
+                descricao TEXT NOT NULL,
+                aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self.conn.commit()
+        atual = self.schema_version()
+        for versao, descricao, passos in MIGRATIONS:
+            if versao <= atual:
+                continue
+            self.conn.execute("BEGIN")
+            try:
+                for passo in passos:
+                    if callable(passo):
+                        passo(self.conn)
+                    else:
+                        self.conn.execute(passo)
+                self.conn.execute(
+                    "INSERT INTO schema_version (versao, descricao) VALUES (?, ?)",
+                    (versao, descricao)
+                )
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def get_config(self, chave, padrao=None):
+        row = self.fetch_one("SELECT valor FROM app_config WHERE chave=?", (chave,))
+        return row[0] if row else padrao
+
+    def set_config(self, chave, valor):
+        self.execute_query(
+            "INSERT INTO app_config (chave, valor) VALUES (?, ?) "
+            "ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor",
+            (chave, valor)
+        )
+
+    # --- Camada de compatibilidade do formato de armazenamento ---
+    # Conversão entre reais/ISO e o que está gravado no banco
+    @property
+    def compacto(self):
+        return self.manager.compacto
+
+    def data_para_db(self, data):
+        if data is None or not self.compacto:
+            return data
+        return date.fromisoformat(data).toordinal() + JDN_ORDINAL_OFFSET
+
+    def data_do_db(self, valor):
+        if valor is None or not self.compacto:
+            return valor
+        return date.fromordinal(int(valor) - JDN_ORDINAL_OFFSET).isoformat()
+
+    def valor_para_db(self, valor):
+        if valor is None:
+            return None
+        if not self.compacto:
+            return float(valor)
+        try:
+            centavos = Decimal(str(valor)).quantize(Decimal('0.01'), ROUND_HALF_UP) * 100
+        except InvalidOperation:
+            raise ValueError(f"valor inválido: {valor!r}")
+        return int(centavos)
+
+    def valor_do_db(self, valor):
+        if valor is None:
+            return 0.0
+        return valor / 100 if self.compacto else valor
+
+    def centavos(self, valor):
+        if valor is None:
+            return 0
+        return int(round(valor)) if self.compacto else int(round(valor * 100))
+
+    def formatar_valor(self, valor, milhar=False):
+        return formatar_centavos(self.centavos(valor), milhar)
+
+    def moeda(self, valor):
+        return f"R$ {self.formatar_valor(valor, milhar=True)}"
+
+    def _lancamento_para_db(self, dados):
+        dados = dict(dados)
+        if 'data' in dados:
+            dados['data'] = self.data_para_db(dados['data'])
+        for campo in ('valor_entrada', 'valor_saida'):
+            if campo in dados:
+                dados[campo] = self.valor_para_db(dados[campo])
+        return dados
+
+    def converter_formato_compacto(self):
+        # Converte para centavos e datas JDN, preservando índices e gatilhos
+        if self.compacto:
+            return False
+        with self.transaction():
+            extras = [sql for (sql,) in self.fetch_all(
+                "SELECT sql FROM sqlite_master "
+                "WHERE tbl_name='lancamento' AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+            )]
+            # gatilhos que leem lancamento impedem o RENAME
+            externos = self.fetch_all(
+                "SELECT name, sql FROM sqlite_master WHERE type='trigger' AND name IN "
+                f"({', '.join('?' * len(GATILHOS_Q100))})", GATILHOS_Q100)
+            for nome, sql in externos:
+                self.execute_query(f"DROP TRIGGER {nome}")
+                extras.append(sql)
+            # colunas de PRAGMA table_info, incluindo as das migrações
+            colunas, definicoes, expressoes = [], [], []
+            for _, nome, tipo, notnull, padrao, pk in self.fetch_all("PRAGMA table_info(lancamento)"):
+                tipo, expressao = CONVERSAO_COMPACTA.get(nome, (tipo, nome))
+                definicao = f"{nome} {tipo}"
+                if pk:
+                    definicao += " PRIMARY KEY AUTOINCREMENT"
+                if notnull:
+                    definicao += " NOT NULL"
+                if padrao is not None:
+                    definicao += f" DEFAULT {padrao}"
+                colunas.append(nome); definicoes.append(definicao); expressoes.append(expressao)
+            definicoes += [
+                f"FOREIGN KEY({de}) REFERENCES {tabela}({para})"
+                for _, _, tabela, de, para, *_ in self.fetch_all("PRAGMA foreign_key_list(lancamento)")
+            ]
+            self.execute_query(f"CREATE TABLE lancamento_compacto ({', '.join(definicoes)})")
+            # chave_natural não muda: é calculada sobre data ISO e centavos
+            self.execute_query(
+                f"INSERT INTO lancamento_compacto ({', '.join(colunas)}) "
+                f"SELECT {', '.join(expressoes)} FROM lancamento")
+            self.execute_query("DROP TABLE lancamento")
+            self.execute_query("ALTER TABLE lancamento_compacto RENAME TO lancamento")
+            for sql in extras:
+                self.execute_query(sql)
+            self.execute_query(
+                "UPDATE conta_bancaria SET saldo_inicial = "
+                "CAST(ROUND(COALESCE(saldo_inicial, 0) * 100) AS INTEGER)"
+            )
+            # as views continuam expondo reais para quem consulta via SQL
+            self.execute_query("DROP VIEW IF EXISTS saldo_contas")
+            self.execute_query("""
+                CREATE VIEW saldo_contas AS
+                SELECT cb.id, cb.cod_conta, cb.nome_banco, cs.saldo_atual / 100.0 AS saldo_atual
+                FROM conta_bancaria cb
+                JOIN conta_saldo cs ON cs.conta_id = cb.id
+            """)
+            self.execute_query("DROP VIEW IF EXISTS resumo_categorias")
+            self.execute_query("""
+                CREATE VIEW resumo_categorias AS
+                SELECT
+                    NULLIF(categoria, '') AS categoria,
+                    SUM(entradas) / 100.0 AS total_entradas,
+                    SUM(saidas) / 100.0 AS total_saidas,
+                    printf('%04d', ano) AS ano,
+                    printf('%02d', mes) AS mes
+                FROM resumo_mensal
+                GROUP BY categoria, ano, mes
+            """)
+            # a tabela foi copiada sem passar pelos gatilhos de versão do cache
+            self.execute_query("DELETE FROM lcdpr_cache")
+            self.set_config('formato_armazenamento', FORMATO_COMPACTO)
+            self.manager.compacto = True
+            self.reconstruir_resumo_mensal()
+            self.reconstruir_resumo_semanal()
+            self.recalcular_todos_saldos()
+        return True
+
+    # --- Unidade de trabalho ---
+    @property
+    def in_transaction(self):
+        return self.manager.tx_depth > 0
+
+    @contextmanager
+    def transaction(self):
+        # Transações aninhadas viram SAVEPOINTs
+        depth = self.manager.tx_depth
+        if depth == 0:
+            if self.conn.in_transaction:
+                self.conn.commit()
+            self.conn.execute("BEGIN")
+        else:
+            self.conn.execute(f"SAVEPOINT sp_{depth}")
+        self.manager.tx_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.manager.tx_depth -= 1
+            if depth == 0:
+                self.conn.rollback()
+            else:
+                self.conn.execute(f"ROLLBACK TO sp_{depth}")
+                self.conn.execute(f"RELEASE sp_{depth}")
+            raise
+        else:
+            self.manager.tx_depth -= 1
+            if depth == 0:
+                self.conn.commit()
+            else:
+                self.conn.execute(f"RELEASE sp_{depth}")
+
+    # --- Perfilamento ---
+    @property
+    def profiler(self):
+        return self.manager.profiler
+
+    def tag(self, nome):
+        return self.profiler.tag(nome) if self.profiler else nullcontext()
+
+    def _registrar(self, sql, params, inicio, linhas):
+        ms = (time.perf_counter() - inicio) * 1000
+        self.profiler.registrar(self.conn, sql, params, ms, linhas)
+
+    def execute_query(self, sql, params=None):
+        inicio = time.perf_counter()
+        c = self.conn.cursor()
+        c.execute(sql, params or [])
+        if not self.in_transaction:
+            self.conn.commit()
+        if self.profiler:
+            self._registrar(sql, params, inicio, c.rowcount)
+        return c
+
+    def executemany(self, sql, seq_params):
+        inicio = time.perf_counter()
+        c = self.conn.cursor()
+        c.executemany(sql, seq_params)
+        if not self.in_transaction:
+            self.conn.commit()
+        if self.profiler:
+            self._registrar(sql, None, inicio, c.rowcount)
+        return c
+
+    def bulk_insert(self, table, columns, rows):
+        sql = (f"INSERT INTO {table} ({', '.join(columns)}) "
+               f"VALUES ({', '.join('?' * len(columns))})")
+        with self.transaction():
+            return self.executemany(sql, rows).rowcount
+
+    @contextmanager
+    def insercao_em_lote(self):
+        # Suspende os gatilhos de inserção e aplica o equivalente de uma vez ao sair
+        with self.transaction():
+            ultimo = self.fetch_one("SELECT COALESCE(MAX(id), 0) FROM lancamento")[0]
+            gatilhos = self.fetch_all(
+                f"SELECT name, sql FROM sqlite_master WHERE type='trigger' "
+                f"AND name IN ({', '.join('?' * len(GATILHOS_INSERCAO))})", GATILHOS_INSERCAO)
+            for nome, _ in gatilhos:
+                self.execute_query(f"DROP TRIGGER {nome}")
+            yield self
+            self.execute_query(RESUMO_MENSAL_INCREMENTO, (ultimo,))
+            self.execute_query(RESUMO_SEMANAL_INCREMENTO, (ultimo,))
+            self.execute_query(
+                "INSERT INTO lancamento_fts (rowid, historico, num_doc) "
+                "SELECT id, historico, num_doc FROM lancamento WHERE id > ?", (ultimo,))
+            self.execute_query(
+                f"INSERT INTO lcdpr_versao (registro, bloco, versao) "
+                f"SELECT 'Q100', id >> {BLOCO_CACHE_BITS}, 1 FROM lancamento WHERE id > ? GROUP BY 2"
+                + VERSAO_CACHE_INCREMENTO, (ultimo,))
+            for _, sql in gatilhos:
+                self.execute_query(sql)
+
+    def bulk_update(self, table, columns, rows, key='id'):
+        sql = (f"UPDATE {table} SET {', '.join(c + '=?' for c in columns)} "
+               f"WHERE {key}=?")
+        with self.transaction():
+            return self.executemany(sql, rows).rowcount
+
+    # --- Leituras (nunca fazem commit) ---
+    def fetch_all(self, sql, params=None):
+        inicio = time.perf_counter()
+        rows = self.conn.execute(sql, params or []).fetchall()
+        if self.profiler:
+            self._registrar(sql, params, inicio, len(rows))
+        return rows
+
+    def fetch_one(self, sql, params=None):
+        inicio = time.perf_counter()
+        row = self.conn.execute(sql, params or []).fetchone()
+        if self.profiler:
+            self._registrar(sql, params, inicio, 1 if row else 0)
+        return row
+
+    # --- Lançamentos e cadeia de saldos ---
+    # Saldos: cadeia por conta em (data, id), recalculada a partir do ponto alterado
+    def inserir_lancamento(self, dados):
+        dados = self._lancamento_para_db(dados)
+        cols = [c for c in LANCAMENTO_CAMPOS if c in dados]
+        alt = Alteracao()
+        with self.transaction():
+            c = self.execute_query(
+                f"INSERT INTO lancamento ({', '.join(cols)}, saldo_final, natureza_saldo) "
+                f"VALUES ({', '.join('?' * len(cols))}, 0, 'P')",
+                [dados[c] for c in cols]
+            )
+            lanc_id = c.lastrowid
+            self._gravar_chaves([lanc_id])
+            alt.inseridos.append(lanc_id)
+            alt.adicionados.append(self._valores_lancamento(lanc_id))
+            self.recalcular_saldos(dados['cod_conta'], (dados['data'], lanc_id), alt)
+        return alt
+
+    def atualizar_lancamento(self, lanc_id, dados):
+        dados = self._lancamento_para_db(dados)
+        cols = [c for c in LANCAMENTO_CAMPOS if c in dados]
+        alt = Alteracao()
+        with self.transaction():
+            antes = self.fetch_one(
+                "SELECT cod_conta, data FROM lancamento WHERE id=?", (lanc_id,)
+            )
+            if not antes:
+                return alt
+            alt.removidos.append(self._valores_lancamento(lanc_id))
+            self.execute_query(
+                f"UPDATE lancamento SET {', '.join(c + '=?' for c in cols)} WHERE id=?",
+                [dados[c] for c in cols] + [lanc_id]
+            )
+            self._gravar_chaves([lanc_id])
+            alt.atualizados.append(lanc_id)
+            alt.adicionados.append(self._valores_lancamento(lanc_id))
+            conta_ant, data_ant = antes
+            conta = dados.get('cod_conta', conta_ant)
+            data = dados.get('data', data_ant)
+            if conta == conta_ant:
+                self.recalcular_saldos(conta, min((data, lanc_id), (data_ant, lanc_id)), alt)
+            else:
+                self.recalcular_saldos(conta_ant, (data_ant, lanc_id), alt)
+                self.recalcular_saldos(conta, (data, lanc_id), alt)
+        return alt
+
+    def excluir_lancamento(self, lanc_id):
+        alt = Alteracao()
+        with self.transaction():
+            row = self.fetch_one(
+                "SELECT cod_conta, data FROM lancamento WHERE id=?", (lanc_id,)
+            )
+            if not row:
+                return alt
+            alt.removidos.append(self._valores_lancamento(lanc_id))
+            self.execute_query("DELETE FROM lancamento WHERE id=?", (lanc_id,))
+            alt.excluidos.append(lanc_id)
+            self.recalcular_saldos(row[0], (row[1], lanc_id), alt)
+        return alt
+
+    def chave_lancamento(self, conta, data, entrada, saida, num_doc, historico):
+        # chave_natural a partir dos valores gravados (data e valores no banco)
+        return chave_natural(conta, self.data_do_db(data),
+                             self.centavos(entrada) - self.centavos(saida), num_doc, historico)
+
+    def _gravar_chaves(self, ids):
+        rows = self.fetch_all(
+            "SELECT id, cod_conta, data, valor_entrada, valor_saida, num_doc, historico "
+            f"FROM lancamento WHERE id IN ({', '.join('?' * len(ids))})", list(ids))
+        self.executemany("UPDATE lancamento SET chave_natural=? WHERE id=?",
+                         [(self.chave_lancamento(*r[1:]), r[0]) for r in rows])
+
+    def _valores_lancamento(self, lanc_id):
+        return self.fetch_one(
+            "SELECT data, COALESCE(valor_entrada, 0), COALESCE(valor_saida, 0) "
+            "FROM lancamento WHERE id=?", (lanc_id,)
+        )
+
+    def recalcular_saldos(self, conta_id, a_partir=None, alteracao=None):
+        # Recalcula a cadeia a partir de (data, id) a_partir, ou inteira
+        with self.transaction():
+            if a_partir is None:
+                saldo = 0
+                rows = self.fetch_all(
+                    "SELECT id, valor_entrada, valor_saida, saldo_final, natureza_saldo "
+                    "FROM lancamento WHERE cod_conta=? ORDER BY data, id",
+                    (conta_id,)
+                )
+            else:
+                prev = self.fetch_one(
+                    "SELECT saldo_final, natureza_saldo FROM lancamento "
+                    "WHERE cod_conta=? AND (data, id) < (?, ?) "
+                    "ORDER BY data DESC, id DESC LIMIT 1",
+                    (conta_id, a_partir[0], a_partir[1])
+                )
+                saldo = (prev[0] if prev[1] == 'P' else -prev[0]) if prev else 0
+                rows = self.fetch_all(
+                    "SELECT id, valor_entrada, valor_saida, saldo_final, natureza_saldo "
+                    "FROM lancamento WHERE cod_conta=? AND (data, id) >= (?, ?) "
+                    "ORDER BY data, id",
+                    (conta_id, a_partir[0], a_partir[1])
+                )
+            alterados = []
+            for id_, ent, sai, saldo_f, nat in rows:
+                saldo = round(saldo + (ent or 0) - (sai or 0), 2)
+                novo = (abs(saldo), 'P' if saldo >= 0 else 'N')
+                if (saldo_f, nat) != novo:
+                    alterados.append(novo + (id_,))
+            if alterados:
+                self.executemany(
+                    "UPDATE lancamento SET saldo_final=?, natureza_saldo=? WHERE id=?",
+                    alterados
+                )
+                self._marcar_trechos('Q100', [id_ for _, _, id_ in alterados])
+            if alteracao is not None:
+                for saldo_f, nat, id_ in alterados:
+                    alteracao.saldos[id_] = saldo_f if nat == 'P' else -saldo_f
+                mov = self.fetch_one(
+                    "SELECT saldo_movimento FROM conta_saldo WHERE conta_id=?", (conta_id,)
+                )
+                if mov:
+                    alteracao.delta_saldo_total += saldo - mov[0]
+            # o último valor da cadeia é o saldo de movimento da conta
+            self.execute_query(
+                "UPDATE conta_saldo SET saldo_movimento=?, "
+                "saldo_atual=ROUND(saldo_inicial + ?, 2) WHERE conta_id=?",
+                (saldo, saldo, conta_id)
+            )
+            return len(alterados)
+
+    def recalcular_todos_saldos(self):
+        with self.transaction():
+            return sum(
+                self.recalcular_saldos(conta_id)
+                for (conta_id,) in self.fetch_all(
+                    "SELECT DISTINCT cod_conta FROM lancamento")
+            )
+
+    # --- Consultas de tela e relatórios ---
+    def filtro_lancamentos(self, filtro):
+        # WHERE de um FiltroLancamentos; texto e documento pelo lancamento_fts
+        cond = ["l.data BETWEEN ? AND ?"]
+        params = [self.data_para_db(filtro.d1), self.data_para_db(filtro.d2)]
+        for coluna, valor in (
+            ("l.cod_imovel", filtro.imovel), ("l.cod_conta", filtro.conta),
+            ("l.categoria", filtro.categoria), ("l.tipo_lanc", filtro.tipo_lanc),
+        ):
+            if valor is not None:
+                cond.append(f"{coluna} = ?")
+                params.append(valor)
+        if filtro.valor_min is not None:
+            cond.append("COALESCE(l.valor_entrada, 0) + COALESCE(l.valor_saida, 0) >= ?")
+            params.append(self.valor_para_db(filtro.valor_min))
+        if filtro.valor_max is not None:
+            cond.append("COALESCE(l.valor_entrada, 0) + COALESCE(l.valor_saida, 0) <= ?")
+            params.append(self.valor_para_db(filtro.valor_max))
+        consulta = self.consulta_fts(filtro.participante)
+        if consulta:
+            cond.append("l.id_participante IN "
+                        "(SELECT rowid FROM participante_fts WHERE participante_fts MATCH ?)")
+            params.append(consulta)
+        partes = [f"{coluna} : ({consulta})" for coluna, consulta in (
+            ("historico", self.consulta_fts(filtro.texto)),
+            ("num_doc", self.consulta_fts(filtro.num_doc)),
+        ) if consulta]
+        if partes:
+            cond.append("l.id IN (SELECT rowid FROM lancamento_fts WHERE lancamento_fts MATCH ?)")
+            params.append(" AND ".join(partes))
+        return cond, params
+
+    def pagina_lancamentos(self, filtro, apos=None, limite=500):
+        # Paginação por chave em (data, id) decrescente
+        cond, params = self.filtro_lancamentos(filtro)
+        if apos is not None:
+            # o índice já começa no ponto da página seguinte
+            params[1] = apos[0]
+            cond.append("(l.data < ? OR l.id < ?)")
+            params += [apos[0], apos[1]]
+        return self.fetch_all(f"""
+            SELECT l.id, l.data, i.nome_imovel, l.historico, l.tipo_lanc,
+                   l.valor_entrada, l.valor_saida,
+                   (l.saldo_final * CASE l.natureza_saldo WHEN 'P' THEN 1 ELSE -1 END) as saldo
+            FROM lancamento l
+            JOIN imovel_rural i ON l.cod_imovel=i.id
+            WHERE {' AND '.join(cond)}
+            ORDER BY l.data DESC, l.id DESC
+            LIMIT ?
+        """, params + [limite])
+
+    def lancamentos_por_id(self, ids, filtro=None):
+        # linhas isoladas, com as colunas de pagina_lancamentos
+        if not ids:
+            return []
+        cond, params = self.filtro_lancamentos(filtro) if filtro else ([], [])
+        cond.append(f"l.id IN ({', '.join('?' * len(ids))})")
+        return self.fetch_all(f"""
+            SELECT l.id, l.data, i.nome_imovel, l.historico, l.tipo_lanc,
+                   l.valor_entrada, l.valor_saida,
+                   (l.saldo_final * CASE l.natureza_saldo WHEN 'P' THEN 1 ELSE -1 END) as saldo
+            FROM lancamento l
+            JOIN imovel_rural i ON l.cod_imovel=i.id
+            WHERE {' AND '.join(cond)}
+        """, params + list(ids))
+
+    # --- Tabelas de apoio (combos) ---
+    def dimensao(self, tabela):
+        # (versao, linhas); relê só quando dimensao_versao muda
+        versao = self.fetch_one(
+            "SELECT versao FROM dimensao_versao WHERE tabela=?", (tabela,)
+        )[0]
+        cache = self.manager.dimensoes.get(tabela)
+        if cache is None or cache[0] != versao:
+            cache = self.manager.dimensoes[tabela] = (versao, self.fetch_all(DIMENSOES[tabela]))
+        return cache
+
+    # --- Pesquisa textual (FTS5) ---
+    @staticmethod
+    def consulta_fts(termo):
+        # cada palavra vira um prefixo; CPF/CNPJ sem máscara
+        partes = []
+        for palavra in termo.split():
+            if re.fullmatch(r"[\d./-]+", palavra):
+                palavra = re.sub(r"\D", "", palavra)
+            partes += [f'"{t}"*' for t in re.findall(r"\w+", palavra)]
+        return " ".join(partes)
+
+    def buscar_imoveis(self, termo, limite=LIMITE_BUSCA):
+        consulta = self.consulta_fts(termo)
+        if not consulta:
+            return self.fetch_all("""
+                SELECT id,cod_imovel,nome_imovel,uf,area_total,area_utilizada,participacao
+                FROM imovel_rural ORDER BY nome_imovel LIMIT ?
+            """, (limite,))
+        # código e nome pesam mais que município/UF no bm25
+        return self.fetch_all("""
+            SELECT i.id,i.cod_imovel,i.nome_imovel,i.uf,i.area_total,i.area_utilizada,i.participacao
+            FROM imovel_fts f
+            JOIN imovel_rural i ON i.id = f.rowid
+            WHERE imovel_fts MATCH ?
+            ORDER BY bm25(imovel_fts, 10.0, 5.0, 1.0, 1.0), i.nome_imovel
+            LIMIT ?
+        """, (consulta, limite))
+
+    def buscar_participantes(self, termo, limite=LIMITE_BUSCA):
+        consulta = self.consulta_fts(termo)
+        if not consulta:
+            return self.fetch_all(
+                "SELECT id,cpf_cnpj,nome,tipo_contraparte,data_cadastro FROM participante "
+                "ORDER BY data_cadastro DESC LIMIT ?", (limite,)
+            )
+        return self.fetch_all("""
+            SELECT p.id,p.cpf_cnpj,p.nome,p.tipo_contraparte,p.data_cadastro
+            FROM participante_fts f
+            JOIN participante p ON p.id = f.rowid
+            WHERE participante_fts MATCH ?
+            ORDER BY f.rank, p.nome
+            LIMIT ?
+        """, (consulta, limite))
+
+    def versao_dados(self):
+        # muda a cada escrita, desta ou de outra conexão
+        return self.fetch_one("PRAGMA data_version")[0], self.conn.total_changes
+
+    def totais_periodo(self, d1, d2):
+        # (saldo total, receitas, despesas): meses inteiros pelo resumo_mensal
+        ini, fim = date.fromisoformat(d1), date.fromisoformat(d2)
+        mes = lambda d: d.year * 12 + d.month - 1
+        inicio_mes = lambda m: date(m // 12, m % 12 + 1, 1)
+        m1 = mes(ini) + (ini.day != 1)
+        m2 = mes(fim) - ((fim + timedelta(days=1)).day != 1)
+        vazio = (1, 0)   # BETWEEN 1 AND 0 não seleciona nada
+        if m1 > m2:
+            meses, pontas = vazio, [(d1, d2), vazio]
+        else:
+            meses = (m1, m2)
+            pontas = [
+                (d1, (inicio_mes(m1) - timedelta(days=1)).isoformat()) if ini.day != 1 else vazio,
+                (inicio_mes(m2 + 1).isoformat(), d2) if m2 < mes(fim) else vazio,
+            ]
+        params = [meses[0] // 12, meses[1] // 12, *meses]
+        for a, b in pontas:
+            params += [a, b] if (a, b) == vazio else [self.data_para_db(a), self.data_para_db(b)]
+        saldo, rec, desp = self.fetch_one("""
+            SELECT (SELECT COALESCE(SUM(saldo_atual), 0) FROM conta_saldo),
+                   COALESCE(SUM(e), 0), COALESCE(SUM(s), 0)
+            FROM (
+                SELECT SUM(entradas) AS e, SUM(saidas) AS s FROM resumo_mensal
+                WHERE ano BETWEEN ? AND ? AND ano * 12 + mes - 1 BETWEEN ? AND ?
+                UNION ALL
+                SELECT SUM(valor_entrada), SUM(valor_saida) FROM lancamento
+                WHERE data BETWEEN ? AND ?
+                UNION ALL
+                SELECT SUM(valor_entrada), SUM(valor_saida) FROM lancamento
+                WHERE data BETWEEN ? AND ?
+            )
+        """, params)
+        return round(saldo, 2), round(rec, 2), round(desp, 2)
+
+    def _saldo_antes(self, dia, imovel=None, conta=None):
+        # entradas - saídas anteriores a `dia`
+        filtro, params = "", []
+        for coluna, valor in (("cod_imovel", imovel), ("cod_conta", conta)):
+            if valor is not None:
+                filtro += f" AND {coluna} = ?"
+                params.append(valor)
+        total = self.fetch_one(
+            f"SELECT COALESCE(SUM(entradas - saidas), 0) FROM resumo_mensal "
+            f"WHERE ano * 12 + mes - 1 < ?{filtro}",
+            [dia.year * 12 + dia.month - 1] + params
+        )[0]
+        if dia.day != 1:
+            total += self.fetch_one(
+                f"SELECT COALESCE(SUM(valor_entrada - valor_saida), 0) FROM lancamento "
+                f"WHERE data BETWEEN ? AND ?{filtro}",
+                [self.data_para_db(dia.replace(day=1).isoformat()),
+                 self.data_para_db((dia - timedelta(days=1)).isoformat())] + params
+            )[0]
+        return total
+
+    def fluxo_caixa(self, d1, d2, agrupamento='mes', imovel=None, conta=None):
+        # [(início do período, entradas, saídas, saldo acumulado)] por mês ou semana
+        ini, fim = date.fromisoformat(d1), date.fromisoformat(d2)
+        filtro, params = "", []
+        for coluna, valor in (("cod_imovel", imovel), ("cod_conta", conta)):
+            if valor is not None:
+                filtro += f" AND {coluna} = ?"
+                params.append(valor)
+        if agrupamento == 'semana':
+            ini -= timedelta(days=ini.weekday())
+            fim += timedelta(days=6 - fim.weekday())
+            rows = self.fetch_all(f"""
+                SELECT semana, SUM(entradas), SUM(saidas)
+                FROM resumo_semanal
+                WHERE semana BETWEEN ? AND ?{filtro}
+                GROUP BY semana
+            """, [ini.isoformat(), fim.isoformat()] + params)
+            periodos, dia = [], ini
+            while dia <= fim:
+                periodos.append(dia.isoformat())
+                dia += timedelta(days=7)
+        else:
+            ini, m1, m2 = ini.replace(day=1), ini.year * 12 + ini.month - 1, fim.year * 12 + fim.month - 1
+            rows = self.fetch_all(f"""
+                SELECT printf('%04d-%02d-01', ano, mes), SUM(entradas), SUM(saidas)
+                FROM resumo_mensal
+                WHERE ano BETWEEN ? AND ? AND ano * 12 + mes - 1 BETWEEN ? AND ?{filtro}
+                GROUP BY ano, mes
+            """, [m1 // 12, m2 // 12, m1, m2] + params)
+            periodos = [f"{m // 12:04d}-{m % 12 + 1:02d}-01" for m in range(m1, m2 + 1)]
+        saldo = self._saldo_antes(ini, imovel, conta)
+        if imovel is None:
+            saldo += self.fetch_one(
+                "SELECT COALESCE(SUM(saldo_inicial), 0) FROM conta_bancaria"
+                + (" WHERE id = ?" if conta is not None else ""),
+                [conta] if conta is not None else []
+            )[0]
+        somas = {periodo: (ent or 0, sai or 0) for periodo, ent, sai in rows}
+        serie = []
+        for periodo in periodos:
+            ent, sai = somas.get(periodo, (0, 0))
+            saldo += ent - sai
+            serie.append((periodo, round(ent, 2), round(sai, 2), round(saldo, 2)))
+        return serie
+
+    def exportar_lancamentos_csv(self, path, filtro=None, progresso=None, cancelado=None):
+        # Exporta em lotes, .gz/.zst pela extensão
+        cond, params = self.filtro_lancamentos(filtro) if filtro else ([], [])
+        where = f" WHERE {' AND '.join(cond)}" if cond else ""
+        total = self.fetch_one(f"SELECT COUNT(*) FROM lancamento l{where}", params)[0] if progresso else 0
+        nomes = {tabela: {id_: rotulo for id_, rotulo, _ in self.dimensao(tabela)[1]}
+                 for tabela in ('imovel_rural', 'conta_bancaria', 'participante')}
+        imoveis, contas, participantes = nomes['imovel_rural'], nomes['conta_bancaria'], nomes['participante']
+        data, valor = self.data_do_db, self.formatar_valor
+        tmp = path + ".tmp"
+        feitas = 0
+        try:
+            with abrir_saida(tmp, path) as f:
+                w = csv.writer(f, delimiter=';')
+                w.writerow(COLUNAS_CSV)
+                for rows in self.iterar(f"""
+                    SELECT l.id, l.data, l.cod_imovel, l.cod_conta, l.num_doc, l.tipo_doc,
+                           l.historico, l.id_participante, l.tipo_lanc, l.valor_entrada,
+                           l.valor_saida, l.saldo_final, l.natureza_saldo, l.categoria
+                    FROM lancamento l{where}
+                    ORDER BY l.id
+                """, params):
+                    if cancelado is not None and cancelado():
+                        raise OperacaoCancelada("exportação cancelada")
+                    w.writerows([
+                        (id_, data(dt), imovel, imoveis.get(imovel, ""), conta,
+                         contas.get(conta, ""), num_doc, tipo_doc, historico,
+                         part, participantes.get(part, "") if part is not None else "",
+                         tipo, valor(ent), valor(sai), valor(saldo), nat, cat)
+                        for (id_, dt, imovel, conta, num_doc, tipo_doc, historico, part,
+                             tipo, ent, sai, saldo, nat, cat) in rows
+                    ])
+                    feitas += len(rows)
+                    if progresso:
+                        progresso(feitas, total)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return feitas
+
+    def importar_lancamentos_csv(self, path):
+        # Colunas pelo cabeçalho; saldos recalculados no fim
+        inicio_conta = {}
+
+        def linhas(leitor, pos):
+            for num, l in enumerate(leitor, 2):
+                if not l:
+                    continue
+                try:
+                    data = self.data_para_db(date.fromisoformat(l[pos["Data"]]).isoformat())
+                    conta = int(l[pos["ID Conta"]])
+                    part = l[pos["ID Participante"]]
+                    ent = self.valor_para_db(l[pos["Entrada"]] or 0)
+                    sai = self.valor_para_db(l[pos["Saída"]] or 0)
+                    # vazio volta a ser NULL, como gravado pelo LancamentoDialog
+                    num_doc, historico = l[pos["Documento"]] or None, l[pos["Histórico"]]
+                    row = (
+                        data, int(l[pos["ID Imóvel"]]), conta, num_doc,
+                        int(l[pos["Tipo Doc"]]), historico,
+                        int(part) if part else None, int(l[pos["Tipo"]]),
+                        ent, sai, l[pos["Categoria"]] or None, 0, 'P',
+                        self.chave_lancamento(conta, data, ent, sai, num_doc, historico)
+                    )
+                except (ValueError, IndexError) as e:
+                    raise ValueError(f"linha {num}: {e}")
+                if conta not in inicio_conta or data < inicio_conta[conta]:
+                    inicio_conta[conta] = data
+                yield row
+
+        with abrir_entrada(path) as f:
+            leitor = csv.reader(f, delimiter=';')
+            cabecalho = next(leitor, [])
+            faltando = [c for c in COLUNAS_CSV_IMPORTACAO if c not in cabecalho]
+            if faltando:
+                raise ValueError(f"colunas ausentes no CSV: {', '.join(faltando)}")
+            pos = {c: cabecalho.index(c) for c in COLUNAS_CSV_IMPORTACAO}
+            with self.insercao_em_lote():
+                n = self.bulk_insert("lancamento", LANCAMENTO_IMPORTACAO, linhas(leitor, pos))
+                for conta, data in inicio_conta.items():
+                    self.recalcular_saldos(conta, (data, 0))
+        return n
+
+    def _contar_chaves(self, chaves, existentes):
+        # quantos lançamentos do livro já têm cada chave_natural
+        novas = [c for c in dict.fromkeys(chaves) if c not in existentes]
+        for i in range(0, len(novas), 500):
+            parte = novas[i:i + 500]
+            existentes.update(dict.fromkeys(parte, 0))
+            existentes.update(self.fetch_all(
+                "SELECT chave_natural, COUNT(*) FROM lancamento "
+                f"WHERE chave_natural IN ({', '.join('?' * len(parte))}) GROUP BY chave_natural",
+                parte))
+
+    # --- Importação de extratos bancários ---
+    def layouts_extrato(self):
+        # layouts de CSV salvos em app_config, por nome; sempre inclui o padrão
+        salvos = json.loads(self.get_config('layouts_extrato', '{}'))
+        layouts = {"Padrão": LayoutExtrato()}
+        layouts.update({nome: LayoutExtrato(**d) for nome, d in salvos.items()})
+        return layouts
+
+    def salvar_layout_extrato(self, layout):
+        salvos = json.loads(self.get_config('layouts_extrato', '{}'))
+        salvos[layout.nome] = layout.como_dict()
+        self.set_config('layouts_extrato', json.dumps(salvos, ensure_ascii=False))
+
+    def importar_extrato(self, linhas, conta, imovel, tipo_doc=4, categoria=None,
+                         simular=False, progresso=None, cancelado=None, lote=LOTE_TXT):
+        # A k-ésima ocorrência de uma chave é duplicata se o livro já tem k
+        res = {'lidas': 0, 'novas': 0, 'duplicadas': 0, 'ignoradas': 0,
+               'entradas': 0, 'saidas': 0, 'inicio': None, 'fim': None, 'previa': []}
+        existentes = {}     # chave -> lançamentos com ela antes da importação
+        vistas = {}         # chave -> ocorrências no arquivo até aqui
+        sql = (f"INSERT INTO lancamento ({', '.join(LANCAMENTO_IMPORTACAO)}) "
+               f"VALUES ({', '.join('?' * len(LANCAMENTO_IMPORTACAO))})")
+
+        def gravar(pendentes):
+            self._contar_chaves((c for c, _ in pendentes), existentes)
+            rows = []
+            for chave, (data, centavos, historico, documento) in pendentes:
+                vistas[chave] = vistas.get(chave, 0) + 1
+                if vistas[chave] <= existentes[chave]:
+                    res['duplicadas'] += 1
+                    continue
+                res['novas'] += 1
+                res['entradas' if centavos > 0 else 'saidas'] += abs(centavos)
+                res['inicio'] = min(res['inicio'] or data, data)
+                res['fim'] = max(res['fim'] or data, data)
+                if len(res['previa']) < LIMITE_BUSCA:
+                    res['previa'].append((data, centavos, historico, documento))
+                valor = self.valor_para_db(abs(centavos) / 100)
+                zero = self.valor_para_db(0)
+                rows.append((
+                    self.data_para_db(data), imovel, conta, documento, tipo_doc, historico,
+                    None, 1 if centavos > 0 else 2,
+                    valor if centavos > 0 else zero, valor if centavos < 0 else zero,
+                    categoria, 0, 'P', chave
+                ))
+            if rows and not simular:
+                self.executemany(sql, rows)
+
+        with self.transaction() if simular else self.insercao_em_lote():
+            pendentes = []
+            for data, centavos, historico, documento in linhas:
+                res['lidas'] += 1
+                if not centavos:
+                    res['ignoradas'] += 1
+                    continue
+                historico = historico or "(sem histórico)"
+                pendentes.append((chave_natural(conta, data, centavos, documento, historico),
+                                  (data, centavos, historico, documento)))
+                if len(pendentes) >= lote:
+                    if cancelado is not None and cancelado():
+                        raise OperacaoCancelada("importação cancelada")
+                    gravar(pendentes)
+                    pendentes = []
+                    if progresso:
+                        progresso(res['lidas'], 0)
+            gravar(pendentes)
+            if res['novas'] and not simular:
+                self.recalcular_saldos(conta, (self.data_para_db(res['inicio']), 0))
+        if progresso:
+            progresso(res['lidas'], res['lidas'])
+        res['entradas'] /= 100
+        res['saidas'] /= 100
+        return res
+
+    # --- Importação do TXT do LCDPR ---
+    def importar_lcdpr_txt(self, path, progresso=None, cancelado=None, lote=LOTE_TXT):
+        # Cadastros por chave natural; Q100 deduplicado por chave_natural
+        res = {'linhas': 0, 'imoveis': 0, 'contas': 0, 'participantes': 0, 'lancamentos': 0,
+               'duplicados': 0, 'ignoradas': 0, 'invalidas': 0, 'erros': []}
+        cadastros = {reg: [] for reg in REGISTROS_LCDPR}   # registros ainda não gravados
+        ids = {}                                           # reg -> {chave natural: id}
+        existentes, vistas, inicio_conta = {}, {}, {}
+        imoveis, contas, participantes = {}, {}, {}        # referências do Q100 já resolvidas
+        para_db = (lambda centavos: centavos) if self.compacto else (lambda centavos: centavos / 100)
+        pendentes = []
+        sql_lanc = (f"INSERT INTO lancamento ({', '.join(LANCAMENTO_IMPORTACAO)}) "
+                    f"VALUES ({', '.join('?' * len(LANCAMENTO_IMPORTACAO))})")
+
+        def erro(num, msg):
+            res['invalidas'] += 1
+            if len(res['erros']) < LIMITE_BUSCA:
+                res['erros'].append((num, msg))
+
+        def gravar_cadastros():
+            for reg, rows in cadastros.items():
+                tabela, colunas, _, _ = REGISTROS_LCDPR[reg]
+                if rows:
+                    self.executemany(
+                        f"INSERT INTO {tabela} ({', '.join(colunas)}) "
+                        f"VALUES ({', '.join('?' * len(colunas))}) "
+                        f"ON CONFLICT({colunas[0]}) DO UPDATE SET "
+                        + ", ".join(f"{c}=excluded.{c}" for c in colunas[1:]), rows)
+                    rows.clear()
+                ids[reg] = dict(self.fetch_all(f"SELECT {colunas[0]}, id FROM {tabela}"))
+            imoveis.clear(); contas.clear(); participantes.clear()
+
+        def referencia(reg, valor):
+            if valor not in ids[reg]:
+                raise ValueError(f"{REGISTROS_LCDPR[reg][0]} não encontrado: {valor!r}")
+            id_ = {'0040': imoveis, '0050': contas, '0100': participantes}[reg][valor] = ids[reg][valor]
+            return id_
+
+        def gravar_lancamentos():
+            if not vazio:
+                self._contar_chaves((row[-1] for _, row in pendentes), existentes)
+            rows = []
+            for data, row in pendentes:
+                chave = row[-1]
+                vistas[chave] = vistas.get(chave, 0) + 1
+                if vistas[chave] <= existentes.get(chave, 0):
+                    res['duplicados'] += 1
+                    continue
+                rows.append(row)
+                if row[2] not in inicio_conta or data < inicio_conta[row[2]]:
+                    inicio_conta[row[2]] = data
+            if rows:
+                self.executemany(sql_lanc, rows)
+                res['lancamentos'] += len(rows)
+            pendentes.clear()
+
+        def lancamento(c):
+            data = _data_lcdpr(c[0])
+            imovel = imoveis.get(c[1]) or referencia('0040', c[1])
+            conta = contas.get(c[2]) or referencia('0050', c[2])
+            participante = (participantes.get(c[6]) or referencia('0100', c[6])) if c[6] else None
+            entrada = centavos_de_texto(c[8], "," if "," in c[8] else ".")
+            saida = centavos_de_texto(c[9], "," if "," in c[9] else ".")
+            saldo = centavos_de_texto(c[10], "," if "," in c[10] else ".")
+            num_doc, historico = c[3] or None, c[5]
+            if not historico:
+                raise ValueError("histórico vazio")
+            if c[11] not in ('P', 'N'):
+                raise ValueError(f"natureza do saldo inválida: {c[11]!r}")
+            # o saldo do arquivo entra como está e é conferido no recálculo
+            return data, (
+                self.data_para_db(data), imovel, conta, num_doc, int(c[4]), historico,
+                participante, int(c[7]), para_db(entrada), para_db(saida), None,
+                para_db(saldo), c[11],
+                chave_natural(conta, data, entrada - saida, num_doc, historico)
+            )
+
+        with open(path, encoding=_codificacao_txt(path), errors='replace') as f, \
+                self.insercao_em_lote():
+            vazio = self.fetch_one("SELECT NOT EXISTS (SELECT 1 FROM lancamento)")[0]
+            for num, linha in enumerate(f, 1):
+                linha = linha.rstrip("\r\n")
+                if not linha.strip():
+                    continue
+                res['linhas'] += 1
+                if res['linhas'] % lote == 0:
+                    if cancelado is not None and cancelado():
+                        raise OperacaoCancelada("importação cancelada")
+                    if progresso:
+                        progresso(res['linhas'], 0)
+                if len(linha) < 2 or linha[0] != "|" or linha[-1] != "|":
+                    erro(num, "linha fora do formato |REG|campo|...|")
+                    continue
+                reg, *campos = linha[1:-1].split("|")
+                try:
+                    if reg in REGISTROS_LCDPR:
+                        tabela, colunas, nulaveis, chave_res = REGISTROS_LCDPR[reg]
+                        if len(campos) != len(colunas):
+                            raise ValueError(f"{len(campos)} campos, esperados {len(colunas)}")
+                        if not campos[0]:
+                            raise ValueError(f"{colunas[0]} vazio")
+                        row = [None if not v and c in nulaveis else v
+                               for c, v in zip(colunas, campos)]
+                        if reg == '0040':
+                            row[-1] = int(float(row[-1]))
+                        elif reg == '0100':
+                            row[-1] = int(row[-1])
+                        cadastros[reg].append(row)
+                        res[chave_res] += 1
+                    elif reg == 'Q100':
+                        if len(campos) != CAMPOS_Q100:
+                            raise ValueError(f"{len(campos)} campos, esperados {CAMPOS_Q100}")
+                        if not ids or any(cadastros.values()):
+                            gravar_cadastros()
+                        pendentes.append(lancamento(campos))
+                        if len(pendentes) >= lote:
+                            gravar_lancamentos()
+                    elif re.fullmatch(r"[0-9A-Z]\d{3}", reg):
+                        # abertura, encerramento e blocos que o sistema não guarda
+                        res['ignoradas'] += 1
+                    else:
+                        raise ValueError(f"registro desconhecido: {reg!r}")
+                except (ValueError, IndexError) as e:
+                    erro(num, str(e))
+            gravar_cadastros()
+            gravar_lancamentos()
+            for conta, data in inicio_conta.items():
+                self.recalcular_saldos(conta, (self.data_para_db(data), 0))
+        if progresso:
+            progresso(res['linhas'], res['linhas'])
+        return res
+
+    def iterar(self, sql, params=None, lote=LOTE_TXT):
+        inicio = time.perf_counter()
+        c = self.conn.execute(sql, params or [])
+        n = 0
+        while True:
+            rows = c.fetchmany(lote)
+            if not rows:
+                break
+            n += len(rows)
+            yield rows
+        if self.profiler:
+            self._registrar(sql, params, inicio, n)
+
+    def _filtro_ano(self, ano):
+        if ano is None:
+            return "", []
+        return " WHERE data BETWEEN ? AND ?", [
+            self.data_para_db(f"{int(ano):04d}-01-01"), self.data_para_db(f"{int(ano):04d}-12-31")]
+
+    def total_linhas_lcdpr(self, ano=None):
+        where, params = self._filtro_ano(ano)
+        return 2 + self.fetch_one(
+            "SELECT (SELECT COUNT(*) FROM imovel_rural)"
+            " + (SELECT COUNT(*) FROM conta_bancaria)"
+            " + (SELECT COUNT(*) FROM participante)"
+            f" + (SELECT COUNT(*) FROM lancamento{where})", params
+        )[0]
+
+    def _linhas_lcdpr(self, registro, rows):
+        # tuplas de SELECT * da tabela do registro (Q100: FONTE_Q100)
+        if registro == '0040':
+            return ["|0040|"+ "|".join([
+                im[1],im[2],im[3] or "",im[4] or "",im[5] or "",im[6] or "",
+                im[7],im[8] or "",im[9] or "",im[10] or "",im[11],im[12],
+                im[13],str(im[14]),f"{im[15]:.2f}"
+            ])+"|\n" for im in rows]
+        if registro == '0050':
+            return ["|0050|"+ "|".join([
+                ct[1],ct[2],ct[3] or "",ct[4],ct[5],str(ct[6])
+            ])+"|\n" for ct in rows]
+        if registro == '0100':
+            return ["|0100|"+ "|".join([
+                p[1],p[2],str(p[3])
+            ])+"|\n" for p in rows]
+        data, valor = self.data_do_db, self.formatar_valor
+        return ["|Q100|"+ "|".join([
+            data(l[1]),l[2] or "",l[3] or "",l[4] or "",str(l[5]),str(l[6]),
+            l[7] or "",str(l[8]),valor(l[9]),valor(l[10]),
+            valor(l[11]),l[12]
+        ])+"|\n" for l in rows]
+
+    def blocos_lcdpr(self, lote=LOTE_TXT, ano=None, cache=True):
+        # trechos (texto, nº de linhas) do LCDPR
+        yield "|0000|LCDPR|001|0001|\n", 1
+        for registro, tabela in REGISTROS_CACHE:
+            ano_reg = ano if registro == 'Q100' else None
+            if cache:
+                yield from self._trechos_cacheados(registro, tabela, ano_reg)
+                continue
+            where, params = self._filtro_ano(ano_reg)
+            fonte = FONTE_Q100 if registro == 'Q100' else tabela
+            for rows in self.iterar(f"SELECT * FROM {fonte}{where} ORDER BY id", params, lote):
+                yield "".join(self._linhas_lcdpr(registro, rows)), len(rows)
+        yield "|9999|1|\n", 1
+
+    def _trechos_cacheados(self, registro, tabela, ano):
+        # versão e texto de cada trecho lidos na mesma transação
+        chave_ano = ano or 0
+        _, params = self._filtro_ano(ano)
+        where = " AND data BETWEEN ? AND ?" if params else ""
+        fonte = FONTE_Q100 if registro == 'Q100' else tabela
+        novos, tamanho = [], 0
+        for bloco, in self.fetch_all(
+                "SELECT bloco FROM lcdpr_versao WHERE registro=? ORDER BY bloco", (registro,)):
+            inicio = bloco << BLOCO_CACHE_BITS
+            with self.transaction():
+                versao, linhas, texto = self.fetch_one("""
+                    SELECT v.versao, c.linhas, c.texto
+                    FROM lcdpr_versao v
+                    LEFT JOIN lcdpr_cache c ON c.registro = v.registro AND c.ano = ?
+                         AND c.bloco = v.bloco AND c.versao = v.versao
+                    WHERE v.registro = ? AND v.bloco = ?
+                """, (chave_ano, registro, bloco))
+                if texto is None:
+                    rows = self.fetch_all(
+                        f"SELECT * FROM {fonte} WHERE id BETWEEN ? AND ?{where} ORDER BY id",
+                        [inicio, inicio + (1 << BLOCO_CACHE_BITS) - 1] + params)
+            if texto is not None:
+                yield texto, linhas
+                continue
+            texto = "".join(self._linhas_lcdpr(registro, rows))
+            novos.append((registro, chave_ano, bloco, versao, len(rows), texto))
+            tamanho += len(texto)
+            if tamanho >= 1 << 22:
+                self._gravar_cache(novos)
+                novos, tamanho = [], 0
+            yield texto, len(rows)
+        if novos:
+            self._gravar_cache(novos)
+
+    def _marcar_trechos(self, registro, ids):
+        # invalida no cache do TXT os trechos que contêm os ids informados
+        self.executemany(
+            "INSERT INTO lcdpr_versao (registro, bloco, versao) VALUES (?, ?, 1)"
+            + VERSAO_CACHE_INCREMENTO,
+            [(registro, bloco) for bloco in {id_ >> BLOCO_CACHE_BITS for id_ in ids}])
+
+    def _gravar_cache(self, trechos):
+        with self.transaction():
+            self.executemany(
+                "INSERT OR REPLACE INTO lcdpr_cache (registro, ano, bloco, versao, linhas, texto) "
+                "VALUES (?, ?, ?, ?, ?, ?)", trechos)
+
+    def escrever_lcdpr_txt(self, path, progresso=None, cancelado=None, ano=None, cache=True):
+        # Temporário + rename: nunca deixa um TXT pela metade
+        total = self.total_linhas_lcdpr(ano) if progresso else 0
+        tmp = path + ".tmp"
+        feitas = 0
+        try:
+            with open(tmp, "w", encoding='utf-8', buffering=1 << 20) as f:
+                for texto, linhas in self.blocos_lcdpr(ano=ano, cache=cache):
+                    if cancelado is not None and cancelado():
+                        raise OperacaoCancelada("geração do TXT cancelada")
+                    f.write(texto)
+                    feitas += linhas
+                    if progresso:
+                        progresso(feitas, total)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return feitas
+
+    def validar_lcdpr(self, ano=None, limite=LIMITE_VALIDACAO, progresso=None, cancelado=None):
+        # Uma varredura por tabela; cada regra é um bit da máscara
+        erros, total = [], 0
+        for feitas, (registro, (tabela, chave, regras)) in enumerate(VALIDACOES_LCDPR.items()):
+            if cancelado is not None and cancelado():
+                raise OperacaoCancelada("validação cancelada")
+            if progresso:
+                progresso(feitas, len(VALIDACOES_LCDPR))
+            where, params = self._filtro_ano(ano if registro == 'Q100' else None)
+            colunas = list(dict.fromkeys(c for c, _, _ in regras))
+            mascara = " | ".join(
+                f"(COALESCE({cond}, 0) << {i})" for i, (_, _, cond) in enumerate(regras))
+            sql = (f"SELECT * FROM (SELECT id, {chave}, {', '.join(colunas)}, {mascara} AS falhas"
+                   f" FROM {tabela}{where}) WHERE falhas ORDER BY id")
+            with self.tag(f"validar {registro}"):
+                for rows in self.iterar(sql, params):
+                    for id_, ch, *valores, falhas in rows:
+                        if len(erros) >= limite:
+                            total += bin(falhas).count("1")
+                            continue
+                        valores = dict(zip(colunas, valores))
+                        for i, (coluna, mensagem, _) in enumerate(regras):
+                            if not falhas >> i & 1:
+                                continue
+                            total += 1
+                            if len(erros) >= limite:
+                                continue
+                            valor = valores[coluna]
+                            if coluna.startswith('valor_'):
+                                valor = self.formatar_valor(valor)
+                            erros.append({
+                                'registro': registro, 'id': id_,
+                                'chave': ch,
+                                'campo': coluna, 'valor': "" if valor is None else str(valor),
+                                'mensagem': mensagem,
+                            })
+        if progresso:
+            progresso(len(VALIDACOES_LCDPR), len(VALIDACOES_LCDPR))
+        return {'erros': erros, 'total': total}
+
+    def reconstruir_resumo_mensal(self):
+        with self.transaction():
+            self.execute_query("DELETE FROM resumo_mensal")
+            self.execute_query(RESUMO_MENSAL_REBUILD)
+        return self.fetch_one("SELECT COUNT(*) FROM resumo_mensal")[0]
+
+    def reconstruir_resumo_semanal(self):
+        with self.transaction():
+            self.execute_query("DELETE FROM resumo_semanal")
+            self.execute_query(RESUMO_SEMANAL_REBUILD + " GROUP BY 1, 2, 3")
+        return self.fetch_one("SELECT COUNT(*) FROM resumo_semanal")[0]
+
+    def close(self):
+        self.conn = None
+
+
+# --- GERAÇÃO DE TXT EM LOTE ---
+# Um processo por job (banco, ano); resultados na ordem dos jobs
+def nome_arquivo_lote(banco, ano):
+    return f"LCDPR_{os.path.splitext(os.path.basename(banco))[0]}_{ano}.txt"
+
+
+def _resultado_lote(banco, ano, arquivo, linhas=0, segundos=0.0, erro=None, problemas=0):
+    return {'banco': banco, 'ano': ano, 'arquivo': arquivo, 'linhas': linhas,
+            'segundos': segundos, 'erro': erro, 'problemas': problemas}
+
+
+def _gerar_job_lote(banco, ano, arquivo):
+    # processo filho; gera mesmo com problemas de validação
+    inicio = time.perf_counter()
+    manager = None
+    try:
+        if not os.path.exists(banco):
+            raise FileNotFoundError(f"banco não encontrado: {banco}")
+        manager = ConnectionManager(banco)
+        db = Database(banco, manager=manager)
+        problemas = db.validar_lcdpr(ano, limite=0)['total']
+        linhas = db.escrever_lcdpr_txt(arquivo, ano=ano)
+        return _resultado_lote(banco, ano, arquivo, linhas, time.perf_counter() - inicio,
+                               problemas=problemas)
+    except Exception as e:
+        return _resultado_lote(banco, ano, arquivo, 0, time.perf_counter() - inicio, str(e))
+    finally:
+        if manager is not None:
+            manager.conn.close()
+
+
+def _preparar_banco(banco):
+    # migrações antes de os processos abrirem o arquivo
+    if not os.path.exists(banco):
+        return
+    manager = ConnectionManager(banco)
+    try:
+        Database(banco, manager=manager)
+    finally:
+        manager.conn.close()
+
+
+def gerar_lote(jobs, pasta, processos=None, progresso=None, cancelado=None):
+    # jobs: [(banco, ano)]. Devolve um resultado por job, na mesma ordem.
+    jobs = [(os.path.abspath(b), int(a)) for b, a in jobs]
+    arquivos = [os.path.join(pasta, nome_arquivo_lote(b, a)) for b, a in jobs]
+    repetidos = sorted({os.path.basename(a) for a in arquivos if arquivos.count(a) > 1})
+    if repetidos:
+        raise ValueError(f"jobs com o mesmo arquivo de saída: {', '.join(repetidos)}")
+    os.makedirs(pasta, exist_ok=True)
+    for banco in dict.fromkeys(b for b, _ in jobs):
+        _preparar_banco(banco)
+
+    # os maiores bancos entram primeiro para o último job não ficar sozinho
+    ordem = sorted(range(len(jobs)), key=lambda i: -(
+        os.path.getsize(jobs[i][0]) if os.path.exists(jobs[i][0]) else 0))
+    resultados = [None] * len(jobs)
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processos, mp_context=contexto) as pool:
+        futuros = {pool.submit(_gerar_job_lote, *jobs[i], arquivos[i]): i for i in ordem}
+        pendentes = set(futuros)
+        try:
+            while pendentes:
+                if cancelado is not None and cancelado():
+                    raise OperacaoCancelada("geração em lote cancelada")
+                prontos, pendentes = wait(pendentes, timeout=0.2, return_when=FIRST_COMPLETED)
+                for fut in prontos:
+                    i = futuros[fut]
+                    try:
+                        resultados[i] = fut.result()
+                    except Exception as e:
+                        # processo filho morreu: o job conta como falha
+                        resultados[i] = _resultado_lote(*jobs[i], arquivos[i], erro=str(e))
+                if prontos and progresso:
+                    progresso(len(jobs) - len(pendentes), len(jobs))
+        except BaseException:
+            # jobs que ainda não começaram são descartados; os em andamento terminam
+            pool.shutdown(cancel_futures=True)
+            raise
+    return resultados
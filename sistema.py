@@ -1,22 +1,34 @@
 import sys
-import sqlite3
-import csv
 import os
-from datetime import datetime
+import time
+import queue
+import itertools
+import threading
+import re
+from functools import wraps
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLineEdit, QDateEdit, QComboBox, QLabel, QTextEdit,
     QTableWidget, QTableWidgetItem, QHeaderView, QTabWidget, QDialog,
     QDialogButtonBox, QMessageBox, QFormLayout, QGroupBox, QFrame,
-    QListWidget, QListWidgetItem, QStatusBar, QToolBar, QFileDialog
+    QListWidget, QListWidgetItem, QStatusBar, QToolBar, QFileDialog, QCheckBox,
+    QTableView, QCompleter, QProgressBar
+)
+from PySide6.QtCore import (
+    Qt, QDate, QSize, QSettings, QThread, Signal, QAbstractTableModel, QModelIndex,
+    QTimer, QAbstractListModel, QPointF
+)
+from PySide6.QtGui import QFont, QIcon, QColor, QPainter, QAction, QCursor
+# QtCharts é importado sob demanda, quando o painel é montado
+from dados import (
+    DB_FILENAME, CATEGORIAS, FiltroLancamentos, ConnectionManager, Database, gerar_lote,
+    LayoutExtrato, ler_ofx, ler_csv_extrato, formatar_centavos
 )
-from PySide6.QtCore import Qt, QDate, QSize, QSettings
-from PySide6.QtGui import QFont, QIcon, QColor, QPainter, QAction
-from PySide6.QtCharts import QChart, QChartView, QPieSeries
 
 # --- CONSTANTES E ESTILO GLOBAL ---
-DB_FILENAME = 'lcdpr.db'
 APP_ICON = 'agro_icon.png'
+PONTOS_GRAFICO = 200        # pontos por série no gráfico de fluxo de caixa
+ATRASO_PESQUISA_MS = 250    # espera após a última tecla antes de pesquisar
 STYLE_SHEET = """
 QMainWindow {
     background-color: #000000;
@@ -62,7 +74,7 @@ QGroupBox::title {
     left: 10px;
     padding: 0 5px;
 }
-QTableWidget {
+QTableView {
     background-color: white;
     color: #2c3e50;
     border: 1px solid #bdc3c7;
@@ -103,163 +115,410 @@ QStatusBar {
 }
 """
 
-# --- CLASSE DE ACESSO AOS DADOS ---
-class Database:
-    def __init__(self, filename=DB_FILENAME):
-        self.conn = sqlite3.connect(filename)
-        self.create_tables()
-        self.create_views()
-
-    def create_tables(self):
-        c = self.conn.cursor()
-        c.executescript("""
-        -- Imóveis rurais
-        CREATE TABLE IF NOT EXISTS imovel_rural (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            cod_imovel TEXT UNIQUE NOT NULL,
-            pais TEXT NOT NULL DEFAULT 'BR',
-            moeda TEXT NOT NULL DEFAULT 'BRL',
-            cad_itr TEXT,
-            caepf TEXT,
-            insc_estadual TEXT,
-            nome_imovel TEXT NOT NULL,
-            endereco TEXT NOT NULL,
-            num TEXT,
-            compl TEXT,
-            bairro TEXT NOT NULL,
-            uf TEXT NOT NULL,
-            cod_mun TEXT NOT NULL,
-            cep TEXT NOT NULL,
-            tipo_exploracao INTEGER NOT NULL,
-            participacao REAL NOT NULL DEFAULT 100.0,
-            area_total REAL,
-            area_utilizada REAL,
-            data_cadastro DATE DEFAULT CURRENT_DATE
-        );
-        -- Contas bancárias
-        CREATE TABLE IF NOT EXISTS conta_bancaria (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            cod_conta TEXT UNIQUE NOT NULL,
-            pais_cta TEXT NOT NULL DEFAULT 'BR',
-            banco TEXT,
-            nome_banco TEXT NOT NULL,
-            agencia TEXT NOT NULL,
-            num_conta TEXT NOT NULL,
-            saldo_inicial REAL DEFAULT 0,
-            data_abertura DATE DEFAULT CURRENT_DATE
-        );
-        -- Participantes
-        CREATE TABLE IF NOT EXISTS participante (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            cpf_cnpj TEXT UNIQUE NOT NULL,
-            nome TEXT NOT NULL,
-            tipo_contraparte INTEGER NOT NULL,
-            data_cadastro DATE DEFAULT CURRENT_DATE
-        );
-        -- Culturas
-        CREATE TABLE IF NOT EXISTS cultura (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT NOT NULL,
-            tipo TEXT NOT NULL,
-            ciclo TEXT,
-            unidade_medida TEXT
-        );
-        -- Áreas de produção
-        CREATE TABLE IF NOT EXISTS area_producao (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            imovel_id INTEGER NOT NULL,
-            cultura_id INTEGER NOT NULL,
-            area REAL NOT NULL,
-            data_plantio DATE,
-            data_colheita_estimada DATE,
-            produtividade_estimada REAL,
-            FOREIGN KEY(imovel_id) REFERENCES imovel_rural(id),
-            FOREIGN KEY(cultura_id) REFERENCES cultura(id)
-        );
-        -- Estoques
-        CREATE TABLE IF NOT EXISTS estoque (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            produto TEXT NOT NULL,
-            quantidade REAL NOT NULL,
-            unidade_medida TEXT NOT NULL,
-            valor_unitario REAL,
-            local_armazenamento TEXT,
-            data_entrada DATE DEFAULT CURRENT_DATE,
-            data_validade DATE,
-            imovel_id INTEGER,
-            FOREIGN KEY(imovel_id) REFERENCES imovel_rural(id)
-        );
-        -- Lançamentos contábeis
-        CREATE TABLE IF NOT EXISTS lancamento (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data DATE NOT NULL,
-            cod_imovel INTEGER NOT NULL,
-            cod_conta INTEGER NOT NULL,
-            num_doc TEXT,
-            tipo_doc INTEGER NOT NULL,
-            historico TEXT NOT NULL,
-            id_participante INTEGER,
-            tipo_lanc INTEGER NOT NULL,
-            valor_entrada REAL DEFAULT 0,
-            valor_saida REAL DEFAULT 0,
-            saldo_final REAL NOT NULL,
-            natureza_saldo TEXT NOT NULL,
-            categoria TEXT,
-            area_afetada INTEGER,
-            quantidade REAL,
-            unidade_medida TEXT,
-            FOREIGN KEY(cod_imovel) REFERENCES imovel_rural(id),
-            FOREIGN KEY(cod_conta) REFERENCES conta_bancaria(id),
-            FOREIGN KEY(id_participante) REFERENCES participante(id),
-            FOREIGN KEY(area_afetada) REFERENCES area_producao(id)
-        );
-        """)
-        self.conn.commit()
-
-    def create_views(self):
-        c = self.conn.cursor()
-        c.executescript("""
-        -- Saldo atual das contas
-        CREATE VIEW IF NOT EXISTS saldo_contas AS
-        SELECT 
-            cb.id,
-            cb.cod_conta,
-            cb.nome_banco,
-            l.saldo_final * (CASE l.natureza_saldo WHEN 'P' THEN 1 ELSE -1 END) AS saldo_atual
-        FROM conta_bancaria cb
-        LEFT JOIN (
-            SELECT cod_conta, MAX(id) AS max_id
-            FROM lancamento
-            GROUP BY cod_conta
-        ) last_l ON cb.id = last_l.cod_conta
-        LEFT JOIN lancamento l ON last_l.max_id = l.id;
-        -- Resumo por categoria
-        CREATE VIEW IF NOT EXISTS resumo_categorias AS
-        SELECT 
-            categoria,
-            SUM(valor_entrada) AS total_entradas,
-            SUM(valor_saida) AS total_saidas,
-            strftime('%Y', data) AS ano,
-            strftime('%m', data) AS mes
-        FROM lancamento
-        GROUP BY categoria, ano, mes;
-        """)
-        self.conn.commit()
-
-    def execute_query(self, sql, params=None):
-        c = self.conn.cursor()
-        c.execute(sql, params or [])
-        self.conn.commit()
-        return c
-
-    def fetch_all(self, sql, params=None):
-        return self.execute_query(sql, params).fetchall()
-
-    def fetch_one(self, sql, params=None):
-        return self.execute_query(sql, params).fetchone()
+# --- REDUÇÃO DE PONTOS PARA GRÁFICOS ---
+def lttb(pontos, limite):
+    # Largest-Triangle-Three-Buckets: reduz a `limite` pontos mantendo picos e vales
+    n = len(pontos)
+    if limite >= n or limite < 3:
+        return list(pontos)
+    passo = (n - 2) / (limite - 2)
+    saida = [pontos[0]]
+    a = 0
+    for i in range(limite - 2):
+        ini, fim = int(i * passo) + 1, int((i + 1) * passo) + 1
+        prox_ini, prox_fim = fim, min(int((i + 2) * passo) + 1, n)
+        media_x = sum(p[0] for p in pontos[prox_ini:prox_fim]) / (prox_fim - prox_ini)
+        media_y = sum(p[1] for p in pontos[prox_ini:prox_fim]) / (prox_fim - prox_ini)
+        ax, ay = pontos[a]
+        melhor, maior = ini, -1
+        for j in range(ini, fim):
+            x, y = pontos[j]
+            area = abs((ax - media_x) * (y - ay) - (ax - x) * (media_y - ay))
+            if area > maior:
+                melhor, maior = j, area
+        saida.append(pontos[melhor])
+        a = melhor
+    saida.append(pontos[-1])
+    return saida
+
+
+def perfilado(tag):
+    # marca as consultas do slot com a tag; só para slots sem argumentos
+    def decorador(fn):
+        @wraps(fn)
+        def wrapper(self):
+            with self.db.tag(tag):
+                return fn(self)
+        return wrapper
+    return decorador
+
+
+# --- EXECUTOR DE CONSULTAS EM SEGUNDO PLANO ---
+class QueryExecutor(QThread):
+    # Executa fn(db) numa thread própria; um job novo torna obsoletos os do mesmo canal
+    resultado = Signal(str, object)
+    falha = Signal(str, str)
+    progresso = Signal(str, int, int)
+    _andamento = Signal(str, int, int, int)
+    # o retorno viaja numa tupla: None puro em Signal(object) quebra no PySide6
+    _pronto = Signal(str, int, object)
+    _instancias = {}
+
+    def __init__(self, filename=DB_FILENAME, parent=None):
+        super().__init__(parent)
+        self.filename = filename
+        self.principal = Database(filename).manager
+        self._fila = queue.Queue()
+        self._seq = itertools.count(1)
+        self._ultimo = {}
+        self._atual = None
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pronto.connect(self._entregar)
+        self._andamento.connect(self._repassar)
+
+    @classmethod
+    def get(cls, filename=DB_FILENAME):
+        key = os.path.abspath(filename)
+        ex = cls._instancias.get(key)
+        if ex is None:
+            ex = cls._instancias[key] = cls(filename)
+        return ex
+
+    @classmethod
+    def parar_todos(cls):
+        for ex in list(cls._instancias.values()):
+            ex.parar()
+        cls._instancias.clear()
+
+    def submit(self, canal, fn):
+        with self._lock:
+            job = next(self._seq)
+            self._ultimo[canal] = job
+            if self._atual and self._atual[0] == canal and self._conn is not None:
+                self._conn.interrupt()
+        self._fila.put((canal, job, fn))
+        if not self.isRunning():
+            self.start()
+        return job
+
+    def cancelar(self, canal):
+        self.submit(canal, None)
+
+    def andamento(self, feitas, total):
+        canal, job = self._atual
+        self._andamento.emit(canal, job, feitas, total)
+
+    def _obsoleto(self, canal, job):
+        return self._ultimo.get(canal) != job
+
+    def run(self):
+        manager = ConnectionManager(self.filename)
+        manager.schema_verified = True
+        db = Database(self.filename, manager=manager)
+        self._conn = manager.conn
+        try:
+            while True:
+                item = self._fila.get()
+                if item is None:
+                    break
+                canal, job, fn = item
+                with self._lock:
+                    if fn is None or self._obsoleto(canal, job):
+                        continue
+                    self._atual = (canal, job)
+                manager.compacto = self.principal.compacto
+                manager.profiler = self.principal.profiler
+                try:
+                    with db.tag(canal):
+                        res = fn(db)
+                    self._pronto.emit(canal, job, (res, None))
+                except Exception as e:
+                    self._pronto.emit(canal, job, (None, str(e)))
+                finally:
+                    with self._lock:
+                        self._atual = None
+        finally:
+            self._conn = None
+            manager.conn.close()
+
+    def _entregar(self, canal, job, pacote):
+        # resultados obsoletos são descartados
+        if self._obsoleto(canal, job):
+            return
+        res, erro = pacote
+        if erro is not None:
+            self.falha.emit(canal, erro)
+        else:
+            self.resultado.emit(canal, res)
+
+    def _repassar(self, canal, job, feitas, total):
+        if not self._obsoleto(canal, job):
+            self.progresso.emit(canal, feitas, total)
+
+    def parar(self):
+        if self.isRunning():
+            self._fila.put(None)
+            self.wait()
+
+
+# --- MODELO PAGINADO DA ABA LANÇAMENTOS ---
+class LancamentosModel(QAbstractTableModel):
+    # Guarda as tuplas cruas; a formatação é feita em data()
+    COLUNAS = ["ID","Data","Imóvel","Histórico","Tipo","Entrada","Saída","Saldo"]
+    TIPOS = {1: "Receita", 2: "Despesa"}
+    PAGINA = 500
+    CANAL = "lancamentos"
+    VERDE = QColor("#27ae60")
+    VERMELHO = QColor("#e74c3c")
+    carregando = Signal(bool)
+
+    def __init__(self, db, executor, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.executor = executor
+        self._rows = []
+        self._pos = None
+        self._filtro = None
+        self._fim = True
+        self._pendente = False
+        self._espera = None  # 'pagina' ou 'delta': o que o último job devolve
+        executor.resultado.connect(self._on_resultado)
+        executor.falha.connect(self._on_falha)
+
+    def filtrar(self, filtro):
+        self.beginResetModel()
+        self._rows = []
+        self._pos = None
+        self._filtro = filtro
+        self._fim = False
+        self.endResetModel()
+        self._buscar(None)
+
+    def _submeter(self, espera, fn):
+        self._pendente = True
+        self._espera = espera
+        self.carregando.emit(True)
+        self.executor.submit(self.CANAL, fn)
+
+    def _buscar(self, apos):
+        filtro = self._filtro
+        limite = self.PAGINA
+        self._submeter('pagina', lambda db: db.pagina_lancamentos(filtro, apos, limite))
+
+    def _on_resultado(self, canal, rows):
+        if canal != self.CANAL:
+            return
+        self._pendente = False
+        if self._espera == 'delta':
+            for row in rows:
+                self._inserir_ordenado(row)
+        else:
+            if len(rows) < self.PAGINA:
+                self._fim = True
+            if rows:
+                inicio = len(self._rows)
+                self.beginInsertRows(QModelIndex(), inicio, inicio + len(rows) - 1)
+                self._rows.extend(rows)
+                self._pos = None
+                self.endInsertRows()
+        self.carregando.emit(False)
+
+    def _on_falha(self, canal, erro):
+        if canal != self.CANAL:
+            return
+        self._pendente = False
+        if self._espera == 'pagina':
+            self._fim = True
+        self.carregando.emit(False)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._fim and not self._pendente
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent) and self._rows:
+            ultima = self._rows[-1]
+            self._buscar((ultima[1], ultima[0]))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUNAS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUNAS[section]
+        return None
+
+    def lanc_id(self, row):
+        return self._rows[row][0]
+
+    # --- Atualização incremental a partir de uma Alteracao ---
+    def _linha(self, lanc_id):
+        if self._pos is None:
+            self._pos = {row[0]: r for r, row in enumerate(self._rows)}
+        return self._pos.get(lanc_id, -1)
+
+    def _remover(self, lanc_id):
+        r = self._linha(lanc_id)
+        if r < 0:
+            return
+        self.beginRemoveRows(QModelIndex(), r, r)
+        del self._rows[r]
+        self._pos = None
+        self.endRemoveRows()
+
+    def _inserir_ordenado(self, row):
+        chave = (row[1], row[0])
+        lo, hi = 0, len(self._rows)
+        while lo < hi:
+            meio = (lo + hi) // 2
+            if (self._rows[meio][1], self._rows[meio][0]) > chave:
+                lo = meio + 1
+            else:
+                hi = meio
+        if lo == len(self._rows) and not self._fim:
+            return  # além da janela carregada: virá com o próximo fetchMore
+        self.beginInsertRows(QModelIndex(), lo, lo)
+        self._rows.insert(lo, row)
+        self._pos = None
+        self.endInsertRows()
+
+    def aplicar_alteracao(self, alt):
+        if self._filtro is None:
+            return
+        if self._pendente:
+            # uma página em andamento pode ter sido lida antes da escrita
+            self.filtrar(self._filtro)
+            return
+        for lanc_id in alt.excluidos + alt.atualizados:
+            self._remover(lanc_id)
+        for lanc_id, saldo in alt.saldos.items():
+            r = self._linha(lanc_id)
+            if r >= 0 and self._rows[r][7] != saldo:
+                self._rows[r] = self._rows[r][:7] + (saldo,)
+                idx = self.index(r, 7)
+                self.dataChanged.emit(idx, idx)
+        ids = alt.inseridos + alt.atualizados
+        if ids:
+            # as linhas novas vêm pelo executor, já com o saldo gravado
+            filtro = self._filtro
+            self._submeter('delta', lambda db: db.lancamentos_por_id(ids, filtro))
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        c = index.column()
+        if role == Qt.DisplayRole:
+            val = row[c]
+            if c == 1: return self.db.data_do_db(val)
+            if c == 4: return self.TIPOS.get(val, "Adiantamento")
+            if c in (5, 6, 7): return self.db.formatar_valor(val)
+            return str(val)
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignCenter)
+        if role == Qt.ForegroundRole:
+            if c == 5: return self.VERDE
+            if c == 6: return self.VERMELHO
+            if c == 7: return self.VERDE if (row[7] or 0) >= 0 else self.VERMELHO
+        return None
+
+
+# --- MODELO DAS TABELAS DE APOIO (COMBOS) ---
+class ModeloDimensao(QAbstractListModel):
+    # Um modelo por (banco, tabela), repovoado quando a versão da tabela muda
+    _modelos = {}
 
-    def close(self):
-        self.conn.close()
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.versao = None
+        self._rows = []
+        self._linhas = None
+
+    @classmethod
+    def para(cls, db, tabela):
+        modelo = cls._modelos.get((db.manager, tabela))
+        if modelo is None:
+            modelo = cls._modelos[(db.manager, tabela)] = cls()
+        versao, rows = db.dimensao(tabela)
+        if versao != modelo.versao:
+            modelo.beginResetModel()
+            modelo.versao, modelo._rows, modelo._linhas = versao, rows, None
+            modelo.endResetModel()
+        return modelo
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        id_, nome, codigo = self._rows[index.row()]
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return f"{nome} ({codigo})" if codigo else nome
+        if role == Qt.UserRole:
+            return id_
+        return None
+
+    def linha(self, id_):
+        if self._linhas is None:
+            self._linhas = {row[0]: r for r, row in enumerate(self._rows)}
+        return self._linhas.get(id_, -1)
+
+
+class ComboDimensao(QComboBox):
+    # Combo editável com busca por nome ou código; com `todos`, vazio = sem filtro
+    def __init__(self, db, tabela, parent=None, todos=None):
+        super().__init__(parent)
+        self.db = db
+        self.tabela = tabela
+        self._selecao = None
+        self.setEditable(True)
+        self.setInsertPolicy(QComboBox.NoInsert)
+        self.setSizeAdjustPolicy(QComboBox.AdjustToMinimumContentsLengthWithIcon)
+        self.setMinimumContentsLength(20 if todos else 30)
+        self.view().setUniformItemSizes(True)
+        self.setModel(ModeloDimensao.para(db, tabela))
+        completer = QCompleter(self.model(), self)
+        completer.setFilterMode(Qt.MatchContains)
+        completer.setCaseSensitivity(Qt.CaseInsensitive)
+        completer.setCompletionMode(QCompleter.PopupCompletion)
+        self.setCompleter(completer)
+        self.setCurrentIndex(-1)
+        self.lineEdit().setPlaceholderText(todos or "Selecione...")
+        if todos:
+            self.lineEdit().setClearButtonEnabled(True)
+            self.lineEdit().textEdited.connect(lambda texto: texto or self.setCurrentIndex(-1))
+        # o modelo é compartilhado: quando é repovoado, a escolha é mantida
+        self.model().modelAboutToBeReset.connect(self._guardar_selecao)
+        self.model().modelReset.connect(self._restaurar_selecao)
+
+    def atualizar(self):
+        ModeloDimensao.para(self.db, self.tabela)
+
+    def showPopup(self):
+        self.atualizar()
+        super().showPopup()
+
+    def _guardar_selecao(self):
+        self._selecao = self.valor()
+
+    def _restaurar_selecao(self):
+        self.selecionar(self._selecao)
+
+    def valor(self):
+        # texto digitado só vale se for um rótulo exato
+        i = self.currentIndex()
+        if i < 0 or self.itemText(i) != self.currentText():
+            i = self.findText(self.currentText(), Qt.MatchExactly) if self.currentText() else -1
+            if i < 0:
+                return None
+        return self.itemData(i, Qt.UserRole)
+
+    def selecionar(self, id_):
+        self.setCurrentIndex(self.model().linha(id_))
 
 
 # --- DIALOG BASE PARA CADASTROS ---
@@ -415,13 +674,13 @@ class CadastroImovelDialog(CadastroBaseDialog):
                 """, data + (self.imovel_id,))
                 msg = "Imóvel atualizado com sucesso!"
             else:
-                self.db.execute_query("""
+                self.imovel_id = self.db.execute_query("""
                     INSERT INTO imovel_rural (
                         cod_imovel, nome_imovel, cad_itr, caepf, insc_estadual,
                         endereco, num, compl, bairro, uf, cod_mun, cep,
                         tipo_exploracao, participacao, area_total, area_utilizada
                     ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, data)
+                """, data).lastrowid
                 msg = "Imóvel cadastrado com sucesso!"
             QMessageBox.information(self, "Sucesso", msg)
             self.accept()
@@ -464,7 +723,7 @@ class CadastroContaDialog(CadastroBaseDialog):
         self.nome_banco.setText(nome)
         self.agencia.setText(agencia)
         self.num_conta.setText(num)
-        self.saldo_inicial.setText(str(saldo))
+        self.saldo_inicial.setText(self.db.formatar_valor(saldo))
 
     def salvar(self):
         if not all([self.cod_conta.text(), self.nome_banco.text(),
@@ -472,7 +731,7 @@ class CadastroContaDialog(CadastroBaseDialog):
             QMessageBox.warning(self, "Campos Obrigatórios", "Preencha todos os campos obrigatórios!")
             return
         try:
-            saldo = float(self.saldo_inicial.text().replace(',', '.'))
+            saldo = self.db.valor_para_db(self.saldo_inicial.text().replace(',', '.'))
             data = (
                 self.cod_conta.text(), "BR", self.banco.text() or "",
                 self.nome_banco.text(), self.agencia.text(),
@@ -487,12 +746,12 @@ class CadastroContaDialog(CadastroBaseDialog):
                 """, data + (self.conta_id,))
                 msg = "Conta atualizada com sucesso!"
             else:
-                self.db.execute_query("""
+                self.conta_id = self.db.execute_query("""
                     INSERT INTO conta_bancaria (
                         cod_conta, pais_cta, banco, nome_banco,
                         agencia, num_conta, saldo_inicial
                     ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, data)
+                """, data).lastrowid
                 msg = "Conta cadastrada com sucesso!"
             QMessageBox.information(self, "Sucesso", msg)
             self.accept()
@@ -587,10 +846,10 @@ class CadastroParticipanteDialog(QDialog):
                     data + (self.participante_id,)
                 )
             else:
-                self.db.execute_query(
+                self.participante_id = self.db.execute_query(
                     "INSERT INTO participante (cpf_cnpj, nome, tipo_contraparte) VALUES (?,?,?)",
                     data
-                )
+                ).lastrowid
             QMessageBox.information(self, "Sucesso", "Participante salvo com sucesso!")
             self.accept()
         except Exception as e:
@@ -602,6 +861,7 @@ class LancamentoDialog(QDialog):
     def __init__(self, parent=None, lanc_id=None):
         super().__init__(parent)
         self.lanc_id = lanc_id
+        self.alteracao = None
         self.setWindowTitle("Lançamento Contábil")
         self.setMinimumSize(700, 500)
         self.db = Database()
@@ -617,22 +877,13 @@ class LancamentoDialog(QDialog):
         self.data.setCalendarPopup(True)
         form.addRow("Data:", self.data)
         # Imóvel
-        self.imovel = QComboBox()
-        self.imovel.addItem("Selecione...", None)
-        for id_, nome in self.db.fetch_all("SELECT id, nome_imovel FROM imovel_rural"):
-            self.imovel.addItem(nome, id_)
+        self.imovel = ComboDimensao(self.db, 'imovel_rural')
         form.addRow("Imóvel Rural:", self.imovel)
         # Conta
-        self.conta = QComboBox()
-        self.conta.addItem("Selecione...", None)
-        for id_, nome in self.db.fetch_all("SELECT id, nome_banco FROM conta_bancaria"):
-            self.conta.addItem(nome, id_)
+        self.conta = ComboDimensao(self.db, 'conta_bancaria')
         form.addRow("Conta Bancária:", self.conta)
         # Participante
-        self.participante = QComboBox()
-        self.participante.addItem("Selecione...", None)
-        for id_, nome in self.db.fetch_all("SELECT id, nome FROM participante"):
-            self.participante.addItem(nome, id_)
+        self.participante = ComboDimensao(self.db, 'participante')
         form.addRow("Participante:", self.participante)
         # Documento
         hl = QHBoxLayout(); hl.setContentsMargins(0,0,0,0)
@@ -654,11 +905,7 @@ class LancamentoDialog(QDialog):
         form.addRow("Valor:", hl2)
         # Categoria
         self.categoria = QComboBox()
-        self.categoria.addItems([
-            "Sementes","Adubos","Defensivos","Combustível",
-            "Manutenção","Mão de Obra","Venda de Produtos",
-            "Serviços","Outros"
-        ])
+        self.categoria.addItems(CATEGORIAS)
         form.addRow("Categoria:", self.categoria)
 
         self.layout.addLayout(form)
@@ -676,62 +923,44 @@ class LancamentoDialog(QDialog):
             "FROM lancamento WHERE id=?", (self.lanc_id,)
         )
         if row:
-            self.data.setDate(QDate.fromString(row[0], "yyyy-MM-dd"))
-            self.imovel.setCurrentIndex(self.imovel.findData(row[1]))
-            self.conta.setCurrentIndex(self.conta.findData(row[2]))
+            self.data.setDate(QDate.fromString(self.db.data_do_db(row[0]), "yyyy-MM-dd"))
+            self.imovel.selecionar(row[1])
+            self.conta.selecionar(row[2])
             self.num_doc.setText(row[3] or "")
             self.tipo_doc.setCurrentIndex(row[4]-1)
             self.historico.setText(row[5])
-            self.participante.setCurrentIndex(self.participante.findData(row[6]))
+            self.participante.selecionar(row[6])
             self.tipo_lanc.setCurrentIndex(row[7]-1)
-            self.valor_entrada.setText(f"{row[8]:.2f}")
-            self.valor_saida.setText(f"{row[9]:.2f}")
+            self.valor_entrada.setText(self.db.formatar_valor(row[8]))
+            self.valor_saida.setText(self.db.formatar_valor(row[9]))
             self.categoria.setCurrentText(row[11])
 
+    @perfilado("salvar_lancamento")
     def salvar(self):
-        if not (self.imovel.currentData() and self.conta.currentData() and self.historico.text()):
+        if not (self.imovel.valor() and self.conta.valor() and self.historico.text()):
             QMessageBox.warning(self, "Campos Obrigatórios", "Preencha todos os campos obrigatórios!")
             return
         try:
             ent = float(self.valor_entrada.text().replace(',', '.'))
             sai = float(self.valor_saida.text().replace(',', '.'))
+            dados = {
+                'data': self.data.date().toString("yyyy-MM-dd"),
+                'cod_imovel': self.imovel.valor(),
+                'cod_conta': self.conta.valor(),
+                'num_doc': self.num_doc.text() or None,
+                'tipo_doc': self.tipo_doc.currentIndex()+1,
+                'historico': self.historico.text(),
+                'id_participante': self.participante.valor(),
+                'tipo_lanc': self.tipo_lanc.currentIndex()+1,
+                'valor_entrada': ent,
+                'valor_saida': sai,
+                'categoria': self.categoria.currentText(),
+            }
             if self.lanc_id:
-                self.db.execute_query("""
-                    UPDATE lancamento SET
-                        data=?, cod_imovel=?, cod_conta=?, num_doc=?, tipo_doc=?, historico=?,
-                        id_participante=?, tipo_lanc=?, valor_entrada=?, valor_saida=?, natureza_saldo=?, categoria=?
-                    WHERE id=?
-                """, (
-                    self.data.date().toString("yyyy-MM-dd"),
-                    self.imovel.currentData(), self.conta.currentData(),
-                    self.num_doc.text() or None, self.tipo_doc.currentIndex()+1, self.historico.text(),
-                    self.participante.currentData(), self.tipo_lanc.currentIndex()+1,
-                    ent, sai,
-                    'P' if ent - sai >= 0 else 'N',
-                    self.categoria.currentText(),
-                    self.lanc_id
-                ))
+                self.alteracao = self.db.atualizar_lancamento(self.lanc_id, dados)
             else:
-                prev = self.db.fetch_one(
-                    "SELECT saldo_final FROM lancamento WHERE cod_conta=? ORDER BY id DESC LIMIT 1",
-                    (self.conta.currentData(),)
-                )
-                saldo_ant = prev[0] if prev else 0.0
-                saldo_f = saldo_ant + ent - sai
-                nat = 'P' if saldo_f >= 0 else 'N'
-                self.db.execute_query("""
-                    INSERT INTO lancamento (
-                        data, cod_imovel, cod_conta, num_doc, tipo_doc, historico,
-                        id_participante, tipo_lanc, valor_entrada, valor_saida,
-                        saldo_final, natureza_saldo, categoria
-                    ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)
-                """, (
-                    self.data.date().toString("yyyy-MM-dd"),
-                    self.imovel.currentData(), self.conta.currentData(),
-                    self.num_doc.text() or None, self.tipo_doc.currentIndex()+1, self.historico.text(),
-                    self.participante.currentData(), self.tipo_lanc.currentIndex()+1,
-                    ent, sai, abs(saldo_f), nat, self.categoria.currentText()
-                ))
+                self.alteracao = self.db.inserir_lancamento(dados)
+                self.lanc_id = self.alteracao.inseridos[0]
             QMessageBox.information(self, "Sucesso", "Lançamento salvo com sucesso!")
             self.accept()
         except Exception as e:
@@ -764,16 +993,523 @@ class RelatorioPeriodoDialog(QDialog):
         )
 
 
+# --- DIALOG DE DIAGNÓSTICO DE CONSULTAS ---
+class DiagnosticoDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Diagnóstico de Consultas")
+        self.setMinimumSize(900, 600)
+        self.db = Database()
+        self.layout = QVBoxLayout(self)
+
+        hl = QHBoxLayout()
+        self.chk_ativo = QCheckBox("Perfilamento ativo")
+        self.chk_ativo.setChecked(self.db.profiler is not None)
+        self.chk_ativo.toggled.connect(self._alternar)
+        hl.addWidget(self.chk_ativo)
+        hl.addWidget(QLabel("Consulta lenta (ms):"))
+        limite = self.db.profiler.limite_lento_ms if self.db.profiler else 100.0
+        self.limite = QLineEdit(f"{limite:g}"); self.limite.setMaximumWidth(80)
+        self.limite.editingFinished.connect(self._alternar)
+        hl.addWidget(self.limite)
+        hl.addStretch()
+        for txt, fn in [("Atualizar", self.atualizar), ("Limpar", self.limpar),
+                        ("Exportar JSON", self.exportar)]:
+            b = QPushButton(txt); b.clicked.connect(fn); hl.addWidget(b)
+        self.layout.addLayout(hl)
+
+        self.tabela = QTableWidget(0, 7)
+        self.tabela.setHorizontalHeaderLabels(
+            ["Tag", "Consulta", "Chamadas", "Total (ms)", "Médio (ms)", "Máx (ms)", "Linhas"])
+        self.tabela.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.tabela.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.tabela.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.tabela.setSortingEnabled(True)
+        self.layout.addWidget(self.tabela, 2)
+
+        self.layout.addWidget(QLabel("Consultas lentas e planos de execução:"))
+        self.lentas = QTextEdit(); self.lentas.setReadOnly(True)
+        self.layout.addWidget(self.lentas, 1)
+        self.atualizar()
+
+    def _alternar(self):
+        try:
+            limite = float(self.limite.text().replace(',', '.'))
+        except ValueError:
+            limite = 100.0
+        if self.chk_ativo.isChecked():
+            self.db.manager.ativar_perfil(limite)
+        else:
+            self.db.manager.desativar_perfil()
+        self.atualizar()
+
+    def atualizar(self):
+        prof = self.db.profiler
+        rel = prof.relatorio() if prof else []
+        self.tabela.setSortingEnabled(False)
+        self.tabela.setRowCount(len(rel))
+        for r, e in enumerate(rel):
+            for c, val in enumerate([e['tag'], e['sql'], e['chamadas'], round(e['total_ms'], 2),
+                                     round(e['medio_ms'], 2), round(e['max_ms'], 2), e['linhas']]):
+                item = QTableWidgetItem()
+                item.setData(Qt.DisplayRole, val)
+                self.tabela.setItem(r, c, item)
+        self.tabela.setSortingEnabled(True)
+        self.lentas.setPlainText("\n\n".join(
+            f"[{l['tag'] or '-'}] {l['ms']} ms, {l['linhas']} linhas\n{l['sql']}\n  "
+            + "\n  ".join(l['plano'])
+            for l in (prof.consultas_lentas() if prof else [])
+        ))
+
+    def limpar(self):
+        if self.db.profiler:
+            self.db.profiler.limpar()
+        self.atualizar()
+
+    def exportar(self):
+        if not self.db.profiler:
+            QMessageBox.warning(self, "Diagnóstico", "Ative o perfilamento antes de exportar.")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Exportar Diagnóstico", "diagnostico.json", "JSON (*.json)")
+        if not path: return
+        try:
+            self.db.profiler.exportar_json(path)
+            QMessageBox.information(self, "Diagnóstico", "Relatório exportado com sucesso!")
+        except Exception as e:
+            QMessageBox.critical(self, "Erro", f"Erro ao exportar: {e}")
+
+
+# --- DIALOG DE PROGRESSO DE TAREFAS LONGAS ---
+class TarefaDialog(QDialog):
+    # Progresso e Cancelar para um job fn(db, andamento, cancelado)
+    CANAIS = ("validar_lcdpr", "gerar_txt", "gerar_lote", "exportar", "importar_extrato", "importar_txt")
+
+    def __init__(self, titulo, texto, canal, fn, unidade="linhas", parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(titulo)
+        self.setMinimumWidth(450)
+        self.texto = texto
+        self.canal = canal
+        self.unidade = unidade
+        self.resultado = None
+        self.executor = QueryExecutor.get()
+        self._cancelar = threading.Event()
+        layout = QVBoxLayout(self)
+        self.lbl = QLabel(f"{texto}...")
+        layout.addWidget(self.lbl)
+        self.barra = QProgressBar()
+        self.barra.setRange(0, 0)   # indeterminada até chegar o total
+        layout.addWidget(self.barra)
+        self.btn_cancelar = QPushButton("Cancelar")
+        self.btn_cancelar.setObjectName("danger")
+        self.btn_cancelar.clicked.connect(self.reject)
+        layout.addWidget(self.btn_cancelar, alignment=Qt.AlignRight)
+
+        self.executor.progresso.connect(self._on_progresso)
+        self.executor.resultado.connect(self._on_resultado)
+        self.executor.falha.connect(self._on_falha)
+        andamento, cancelado = self.executor.andamento, self._cancelar.is_set
+        self.executor.submit(canal, lambda db: fn(db, andamento, cancelado))
+
+    @property
+    def cancelado(self):
+        return self._cancelar.is_set()
+
+    def reject(self):
+        self._cancelar.set()
+        self.btn_cancelar.setEnabled(False)
+        self.lbl.setText("Cancelando...")
+
+    def _desconectar(self):
+        self.executor.progresso.disconnect(self._on_progresso)
+        self.executor.resultado.disconnect(self._on_resultado)
+        self.executor.falha.disconnect(self._on_falha)
+
+    def _on_progresso(self, canal, feitas, total):
+        if canal != self.canal or self.cancelado:
+            return
+        if self.barra.maximum() != total:
+            self.barra.setRange(0, total)
+        self.barra.setValue(feitas)
+        if total:
+            self.lbl.setText(f"{self.texto}... {feitas:,} de {total:,} {self.unidade}".replace(",", "."))
+        else:
+            self.lbl.setText(f"{self.texto}... {feitas:,} {self.unidade}".replace(",", "."))
+
+    def _on_resultado(self, canal, res):
+        if canal != self.canal:
+            return
+        self._desconectar()
+        self.resultado = res
+        self.accept()
+
+    def _on_falha(self, canal, erro):
+        if canal != self.canal:
+            return
+        self._desconectar()
+        if not self.cancelado:
+            QMessageBox.critical(self, "Erro", f"{self.windowTitle()}: {erro}")
+        super().reject()
+
+
+# --- DIALOG DE IMPORTAÇÃO DE EXTRATOS BANCÁRIOS ---
+class ImportarExtratoDialog(QDialog):
+    # OFX ou CSV para uma conta; "Pré-visualizar" simula sem gravar
+    CANAL = "importar_extrato"
+    CAMPOS_LAYOUT = (
+        ("delimitador", "Delimitador"), ("codificacao", "Codificação"),
+        ("pular", "Linhas de cabeçalho"), ("formato_data", "Formato da data"),
+        ("decimal", "Separador decimal"), ("col_data", "Coluna da data"),
+        ("col_historico", "Coluna do histórico"), ("col_documento", "Coluna do documento"),
+        ("col_valor", "Coluna do valor (±)"), ("col_credito", "Coluna de crédito"),
+        ("col_debito", "Coluna de débito"), ("ignorar", "Ignorar histórico iniciado por"),
+    )
+    COLUNAS = ("col_data", "col_historico", "col_documento", "col_valor", "col_credito", "col_debito")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Importar Extrato Bancário")
+        self.setMinimumSize(800, 650)
+        self.db = Database()
+        self.resultado = None
+        self.layouts = self.db.layouts_extrato()
+        layout = QVBoxLayout(self)
+
+        form = QFormLayout()
+        hl = QHBoxLayout()
+        self.arquivo = QLineEdit()
+        btn_arq = QPushButton("..."); btn_arq.clicked.connect(self.escolher_arquivo)
+        hl.addWidget(self.arquivo); hl.addWidget(btn_arq)
+        form.addRow("Arquivo:", hl)
+        self.formato = QComboBox()
+        self.formato.addItem("OFX", None)
+        for nome in self.layouts:
+            self.formato.addItem(f"CSV - {nome}", nome)
+        self.formato.currentIndexChanged.connect(self._mostrar_layout)
+        form.addRow("Formato:", self.formato)
+        self.conta = ComboDimensao(self.db, 'conta_bancaria')
+        form.addRow("Conta:", self.conta)
+        self.imovel = ComboDimensao(self.db, 'imovel_rural')
+        form.addRow("Imóvel:", self.imovel)
+        self.tipo_doc = QComboBox()
+        self.tipo_doc.addItems(["Nota Fiscal", "Recibo", "Boleto", "Outros"])
+        self.tipo_doc.setCurrentIndex(3)
+        form.addRow("Tipo de Documento:", self.tipo_doc)
+        self.categoria = QComboBox()
+        self.categoria.addItem("", None)
+        for cat in CATEGORIAS:
+            self.categoria.addItem(cat, cat)
+        form.addRow("Categoria:", self.categoria)
+        layout.addLayout(form)
+
+        self.grp_layout = QGroupBox("Layout do CSV (colunas a partir de 1; vazio = não usada)")
+        fl = QFormLayout(self.grp_layout)
+        self.campos = {}
+        for attr, rotulo in self.CAMPOS_LAYOUT:
+            self.campos[attr] = QLineEdit()
+            fl.addRow(f"{rotulo}:", self.campos[attr])
+        btn_salvar = QPushButton("Salvar Layout..."); btn_salvar.clicked.connect(self.salvar_layout)
+        fl.addRow(btn_salvar)
+        layout.addWidget(self.grp_layout)
+
+        self.resumo = QLabel("Use Pré-visualizar para conferir o extrato antes de importar.")
+        layout.addWidget(self.resumo)
+        self.previa = QTableWidget(0, 4)
+        self.previa.setHorizontalHeaderLabels(["Data", "Histórico", "Documento", "Valor"])
+        self.previa.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.previa.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.previa.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.previa, 1)
+
+        hl = QHBoxLayout()
+        hl.addStretch()
+        btn_prev = QPushButton("Pré-visualizar"); btn_prev.clicked.connect(lambda: self.executar(True))
+        btn_imp = QPushButton("Importar"); btn_imp.setObjectName("success")
+        btn_imp.clicked.connect(lambda: self.executar(False))
+        btn_fechar = QPushButton("Fechar"); btn_fechar.clicked.connect(self.reject)
+        hl.addWidget(btn_prev); hl.addWidget(btn_imp); hl.addWidget(btn_fechar)
+        layout.addLayout(hl)
+        self._mostrar_layout()
+
+    def escolher_arquivo(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Extrato", "", "Extratos (*.ofx *.csv *.txt);;Todos (*)")
+        if not path:
+            return
+        self.arquivo.setText(path)
+        if path.lower().endswith(".ofx"):
+            self.formato.setCurrentIndex(0)
+        elif self.formato.currentIndex() == 0:
+            self.formato.setCurrentIndex(1)
+
+    def _mostrar_layout(self):
+        nome = self.formato.currentData()
+        self.grp_layout.setVisible(nome is not None)
+        if nome is None:
+            return
+        for attr, valor in self.layouts[nome].como_dict().items():
+            if attr in self.campos:
+                if attr in self.COLUNAS and valor is not None:
+                    valor += 1
+                self.campos[attr].setText("" if valor is None else str(valor))
+
+    def _layout(self, nome):
+        valores = {}
+        for attr, _ in self.CAMPOS_LAYOUT:
+            txt = self.campos[attr].text()
+            if attr in self.COLUNAS or attr == "pular":
+                txt = txt.strip()
+                valores[attr] = int(txt) - (attr != "pular") if txt else (0 if attr == "pular" else None)
+            else:
+                valores[attr] = txt
+        if valores["col_data"] is None or valores["col_historico"] is None:
+            raise ValueError("Informe as colunas da data e do histórico.")
+        if valores["col_valor"] is None and (valores["col_credito"] is None or valores["col_debito"] is None):
+            raise ValueError("Informe a coluna do valor ou as de crédito e débito.")
+        return LayoutExtrato(nome=nome, **valores)
+
+    def salvar_layout(self):
+        nome = self.formato.currentData() or "Padrão"
+        novo = QLineEdit(nome)
+        dlg = QDialog(self); dlg.setWindowTitle("Salvar Layout")
+        fl = QFormLayout(dlg); fl.addRow("Nome:", novo)
+        btns = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        btns.accepted.connect(dlg.accept); btns.rejected.connect(dlg.reject); fl.addRow(btns)
+        if not dlg.exec() or not novo.text().strip():
+            return
+        try:
+            lay = self._layout(novo.text().strip())
+            self.db.salvar_layout_extrato(lay)
+        except Exception as e:
+            QMessageBox.critical(self, "Erro", f"Erro ao salvar layout: {e}")
+            return
+        if lay.nome not in self.layouts:
+            self.formato.addItem(f"CSV - {lay.nome}", lay.nome)
+        self.layouts[lay.nome] = lay
+        self.formato.setCurrentIndex(self.formato.findData(lay.nome))
+
+    def executar(self, simular):
+        path = self.arquivo.text().strip()
+        conta, imovel = self.conta.valor(), self.imovel.valor()
+        if not path or not os.path.exists(path):
+            QMessageBox.warning(self, "Importação", "Escolha o arquivo do extrato.")
+            return
+        if conta is None or imovel is None:
+            QMessageBox.warning(self, "Importação", "Selecione a conta e o imóvel.")
+            return
+        if self.formato.currentData() is None:
+            leitor = lambda: ler_ofx(path)
+        else:
+            try:
+                lay = self._layout(self.formato.currentData())
+            except ValueError as e:
+                QMessageBox.warning(self, "Layout Inválido", str(e))
+                return
+            leitor = lambda: ler_csv_extrato(path, lay)
+        tipo_doc, categoria = self.tipo_doc.currentIndex() + 1, self.categoria.currentData()
+        dlg = TarefaDialog(
+            "Importar Extrato", "Lendo extrato" if simular else "Importando extrato", self.CANAL,
+            lambda db, andamento, cancelado: db.importar_extrato(
+                leitor(), conta, imovel, tipo_doc, categoria, simular, andamento, cancelado),
+            "linhas", self)
+        if not dlg.exec():
+            return
+        res = dlg.resultado
+        self._mostrar(res, simular)
+        if not simular:
+            QMessageBox.information(self, "Importação", self.resumo.text())
+            self.resultado = res
+            self.accept()
+
+    def _mostrar(self, res, simular):
+        periodo = f" de {res['inicio']} a {res['fim']}" if res['inicio'] else ""
+        self.resumo.setText(
+            f"{res['lidas']} linhas lidas: {res['novas']} {'a importar' if simular else 'importadas'}{periodo}, "
+            f"{res['duplicadas']} já no livro, {res['ignoradas']} sem valor. "
+            f"Entradas R$ {formatar_centavos(round(res['entradas'] * 100), milhar=True)}, "
+            f"saídas R$ {formatar_centavos(round(res['saidas'] * 100), milhar=True)}."
+        )
+        self.previa.setRowCount(len(res['previa']))
+        for r, (data, centavos, historico, documento) in enumerate(res['previa']):
+            for c, val in enumerate([data, historico, documento, formatar_centavos(centavos, milhar=True)]):
+                self.previa.setItem(r, c, QTableWidgetItem(val))
+
+
+# --- DIALOGS DE GERAÇÃO DE TXT EM LOTE ---
+class LoteTxtDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Gerar TXT em Lote")
+        self.setMinimumSize(650, 450)
+        self.settings = QSettings("PrimeOnHub", "AgroApp")
+        layout = QVBoxLayout(self)
+
+        hl = QHBoxLayout()
+        hl.addWidget(QLabel("Anos:"))
+        ano = QDate.currentDate().year() - 1
+        self.anos = QLineEdit(str(ano))
+        self.anos.setPlaceholderText(f"ex.: {ano - 1}, {ano}")
+        hl.addWidget(self.anos)
+        btn_add = QPushButton("Adicionar Bancos..."); btn_add.clicked.connect(self.adicionar)
+        btn_rem = QPushButton("Remover"); btn_rem.setObjectName("danger"); btn_rem.clicked.connect(self.remover)
+        hl.addWidget(btn_add); hl.addWidget(btn_rem)
+        layout.addLayout(hl)
+
+        self.tabela = QTableWidget(0, 2)
+        self.tabela.setHorizontalHeaderLabels(["Banco", "Ano"])
+        self.tabela.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.tabela.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        self.tabela.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.tabela.setSelectionBehavior(QTableWidget.SelectRows)
+        layout.addWidget(self.tabela)
+
+        hl = QHBoxLayout()
+        hl.addWidget(QLabel("Pasta de saída:"))
+        self.pasta = QLineEdit(self.settings.value("lote_txt/pasta", os.path.abspath("LCDPR_lote")))
+        hl.addWidget(self.pasta)
+        btn_pasta = QPushButton("..."); btn_pasta.clicked.connect(self.escolher_pasta)
+        hl.addWidget(btn_pasta)
+        layout.addLayout(hl)
+
+        btns = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        btns.button(QDialogButtonBox.Ok).setText("Gerar")
+        btns.accepted.connect(self.validar)
+        btns.rejected.connect(self.reject)
+        layout.addWidget(btns)
+
+    def adicionar(self):
+        try:
+            anos = [int(a) for a in re.split(r"[,;\s]+", self.anos.text().strip()) if a]
+        except ValueError:
+            QMessageBox.warning(self, "Lote", "Informe os anos como números, separados por vírgula.")
+            return
+        if not anos:
+            QMessageBox.warning(self, "Lote", "Informe ao menos um ano.")
+            return
+        bancos, _ = QFileDialog.getOpenFileNames(self, "Bancos de Dados", "", "SQLite (*.db *.sqlite);;Todos (*)")
+        existentes = set(self.jobs)
+        for banco in bancos:
+            for ano in anos:
+                if (banco, ano) in existentes:
+                    continue
+                r = self.tabela.rowCount()
+                self.tabela.insertRow(r)
+                self.tabela.setItem(r, 0, QTableWidgetItem(banco))
+                self.tabela.setItem(r, 1, QTableWidgetItem(str(ano)))
+
+    def remover(self):
+        for r in sorted({i.row() for i in self.tabela.selectedIndexes()}, reverse=True):
+            self.tabela.removeRow(r)
+
+    def escolher_pasta(self):
+        pasta = QFileDialog.getExistingDirectory(self, "Pasta de Saída", self.pasta.text())
+        if pasta:
+            self.pasta.setText(pasta)
+
+    @property
+    def jobs(self):
+        return [(self.tabela.item(r, 0).text(), int(self.tabela.item(r, 1).text()))
+                for r in range(self.tabela.rowCount())]
+
+    def validar(self):
+        if not self.jobs:
+            QMessageBox.warning(self, "Lote", "Adicione ao menos um banco.")
+            return
+        if not self.pasta.text().strip():
+            QMessageBox.warning(self, "Lote", "Informe a pasta de saída.")
+            return
+        self.settings.setValue("lote_txt/pasta", self.pasta.text().strip())
+        self.accept()
+
+
+class ResultadoLoteDialog(QDialog):
+    def __init__(self, resultados, segundos, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Resultado do Lote")
+        self.setMinimumSize(800, 450)
+        layout = QVBoxLayout(self)
+        falhas = sum(1 for r in resultados if r['erro'])
+        layout.addWidget(QLabel(
+            f"{len(resultados) - falhas} arquivo(s) gerado(s), {falhas} falha(s) em {segundos:.1f} s"))
+
+        self.tabela = QTableWidget(len(resultados), 7)
+        self.tabela.setHorizontalHeaderLabels(
+            ["Banco", "Ano", "Arquivo", "Linhas", "Tempo (s)", "Problemas", "Situação"])
+        self.tabela.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.tabela.horizontalHeader().setSectionResizeMode(6, QHeaderView.Stretch)
+        self.tabela.setEditTriggers(QTableWidget.NoEditTriggers)
+        for r, res in enumerate(resultados):
+            for c, val in enumerate([os.path.basename(res['banco']), res['ano'],
+                                     os.path.basename(res['arquivo']), res['linhas'],
+                                     round(res['segundos'], 2), res['problemas'], res['erro'] or "OK"]):
+                item = QTableWidgetItem()
+                item.setData(Qt.DisplayRole, val)
+                if (c == 5 and res['problemas']) or (c == 6 and res['erro']):
+                    item.setForeground(QColor("#e74c3c"))
+                self.tabela.setItem(r, c, item)
+        layout.addWidget(self.tabela)
+
+        btns = QDialogButtonBox(QDialogButtonBox.Close)
+        btns.rejected.connect(self.reject)
+        layout.addWidget(btns)
+
+
+# --- DIALOG DE VALIDAÇÃO DO LCDPR ---
+class ValidacaoDialog(QDialog):
+    # Problemas de validar_lcdpr; com `gerar`, aceitar gera mesmo assim
+    COLUNAS = (("Registro", 'registro'), ("Id", 'id'), ("Identificação", 'chave'),
+               ("Campo", 'campo'), ("Valor", 'valor'), ("Problema", 'mensagem'))
+
+    def __init__(self, resultado, gerar=False, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Validação do LCDPR")
+        self.setMinimumSize(900, 500)
+        layout = QVBoxLayout(self)
+        erros, total = resultado['erros'], resultado['total']
+        texto = f"{total} problema(s) encontrado(s)"
+        if total > len(erros):
+            texto += f"; listados os {len(erros)} primeiros"
+        if gerar:
+            texto += ". O programa da Receita pode recusar o arquivo."
+        layout.addWidget(QLabel(texto))
+
+        self.tabela = QTableWidget(len(erros), len(self.COLUNAS))
+        self.tabela.setHorizontalHeaderLabels([titulo for titulo, _ in self.COLUNAS])
+        self.tabela.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.tabela.horizontalHeader().setSectionResizeMode(len(self.COLUNAS) - 1, QHeaderView.Stretch)
+        self.tabela.setEditTriggers(QTableWidget.NoEditTriggers)
+        for r, erro in enumerate(erros):
+            for c, (_, chave) in enumerate(self.COLUNAS):
+                item = QTableWidgetItem()
+                item.setData(Qt.DisplayRole, erro[chave])
+                self.tabela.setItem(r, c, item)
+        self.tabela.setSortingEnabled(True)
+        layout.addWidget(self.tabela)
+
+        if gerar:
+            btns = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+            btns.button(QDialogButtonBox.Ok).setText("Gerar Mesmo Assim")
+            btns.accepted.connect(self.accept)
+        else:
+            btns = QDialogButtonBox(QDialogButtonBox.Close)
+        btns.rejected.connect(self.reject)
+        layout.addWidget(btns)
+
+
 # --- WIDGET DASHBOARD (Painel) COM FILTRO INICIAL/FINAL E %
 class DashboardWidget(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.db = Database()
+        self.executor = QueryExecutor.get()
+        self.executor.resultado.connect(self._on_resultado)
         self.settings = QSettings("PrimeOnHub", "AgroApp")
+        # (d1, d2, versao_dados) -> totais; só guarda a versão mais recente
+        self._memo = {}
         self.layout = QVBoxLayout(self)
         self._build_filter_ui()
         self._build_cards_ui()
         self._build_piechart_ui()
+        self._build_fluxo_ui()
         self.load_data()
 
     def _build_filter_ui(self):
@@ -802,6 +1538,7 @@ class DashboardWidget(QWidget):
         self.layout.addLayout(self.cards_layout)
 
     def _build_piechart_ui(self):
+        from PySide6.QtCharts import QChart, QChartView, QPieSeries
         self.pie_group = QGroupBox("Receitas x Despesas")
         gl = QVBoxLayout(self.pie_group)
         self.series = QPieSeries()
@@ -812,6 +1549,60 @@ class DashboardWidget(QWidget):
         gl.addWidget(self.chart_view)
         self.layout.addWidget(self.pie_group)
 
+    def _build_fluxo_ui(self):
+        from PySide6.QtCharts import QChart, QChartView, QLineSeries, QDateTimeAxis, QValueAxis
+        self.fluxo_group = QGroupBox("Fluxo de Caixa")
+        gl = QVBoxLayout(self.fluxo_group)
+        hl = QHBoxLayout()
+        self.fluxo_agrup = QComboBox()
+        self.fluxo_agrup.addItem("Mensal", "mes"); self.fluxo_agrup.addItem("Semanal", "semana")
+        self.fluxo_imovel = ComboDimensao(self.db, 'imovel_rural', todos="Todos os imóveis")
+        self.fluxo_conta = ComboDimensao(self.db, 'conta_bancaria', todos="Todas as contas")
+        for combo in (self.fluxo_agrup, self.fluxo_imovel, self.fluxo_conta):
+            combo.currentIndexChanged.connect(lambda _: self.carregar_fluxo())
+            hl.addWidget(combo)
+        hl.addStretch()
+        gl.addLayout(hl)
+        # séries criadas uma vez; só os pontos são trocados
+        self.serie_entradas = QLineSeries(); self.serie_entradas.setName("Entradas")
+        self.serie_saidas = QLineSeries(); self.serie_saidas.setName("Saídas")
+        self.serie_saldo = QLineSeries(); self.serie_saldo.setName("Saldo acumulado")
+        chart = QChart()
+        self.eixo_x = QDateTimeAxis(); self.eixo_x.setFormat("MM/yyyy")
+        self.eixo_y = QValueAxis(); self.eixo_y.setLabelFormat("%.0f")
+        chart.addAxis(self.eixo_x, Qt.AlignBottom)
+        chart.addAxis(self.eixo_y, Qt.AlignLeft)
+        for serie in (self.serie_entradas, self.serie_saidas, self.serie_saldo):
+            chart.addSeries(serie)
+            serie.attachAxis(self.eixo_x)
+            serie.attachAxis(self.eixo_y)
+        self.fluxo_view = QChartView(chart)
+        self.fluxo_view.setRenderHint(QPainter.Antialiasing)
+        gl.addWidget(self.fluxo_view)
+        self.layout.addWidget(self.fluxo_group)
+
+    def carregar_fluxo(self):
+        d1 = self.dt_dash_ini.date().toString("yyyy-MM-dd")
+        d2 = self.dt_dash_fim.date().toString("yyyy-MM-dd")
+        agrup = self.fluxo_agrup.currentData()
+        imovel, conta = self.fluxo_imovel.valor(), self.fluxo_conta.valor()
+        self.executor.submit("fluxo_caixa", lambda db: db.fluxo_caixa(d1, d2, agrup, imovel, conta))
+
+    def _mostrar_fluxo(self, serie):
+        if not serie:
+            return
+        xs = [QDate.fromString(p[0], "yyyy-MM-dd").startOfDay().toMSecsSinceEpoch() for p in serie]
+        valores = []
+        for alvo, col in ((self.serie_entradas, 1), (self.serie_saidas, 2), (self.serie_saldo, 3)):
+            pontos = lttb([(x, self.db.valor_do_db(p[col])) for x, p in zip(xs, serie)], PONTOS_GRAFICO)
+            alvo.replace([QPointF(x, y) for x, y in pontos])
+            valores += [y for _, y in pontos]
+        self.eixo_x.setFormat("dd/MM/yy" if self.fluxo_agrup.currentData() == 'semana' else "MM/yyyy")
+        self.eixo_x.setRange(QDate.fromString(serie[0][0], "yyyy-MM-dd").startOfDay(),
+                             QDate.fromString(serie[-1][0], "yyyy-MM-dd").startOfDay())
+        self.eixo_y.setRange(min(0, min(valores)), max(valores) or 1)
+        self.eixo_y.applyNiceNumbers()
+
     def _card(self, title, value, color):
         frm = QFrame()
         frm.setStyleSheet(f"""
@@ -831,30 +1622,90 @@ class DashboardWidget(QWidget):
         self.load_data()
 
     def load_data(self):
+        self.fluxo_imovel.atualizar(); self.fluxo_conta.atualizar()
+        self.carregar_fluxo()
         d1 = self.dt_dash_ini.date().toString("yyyy-MM-dd")
         d2 = self.dt_dash_fim.date().toString("yyyy-MM-dd")
+        self._periodo = (self.db.data_para_db(d1), self.db.data_para_db(d2))
+        self._chave = (d1, d2, self.db.versao_dados())
+        if self._chave in self._memo:
+            # nada mudou desde a última consulta
+            self._totais = self._memo[self._chave]
+            self._mostrar(*self._totais)
+            return
+        self._totais = None
+        for card in (self.saldo_card, self.receita_card, self.despesa_card):
+            card.findChild(QLabel, "value").setText("Carregando...")
+        self.executor.submit("dashboard", lambda db: db.totais_periodo(d1, d2))
+
+    def _on_resultado(self, canal, res):
+        if canal == "fluxo_caixa":
+            self._mostrar_fluxo(res)
+        if canal != "dashboard":
+            return
+        self._totais = res
+        self._memorizar(res)
+        self._mostrar(*res)
+
+    def _memorizar(self, totais):
+        versao = self._chave[2]
+        self._memo = {k: v for k, v in self._memo.items() if k[2] == versao}
+        self._memo[self._chave] = totais
+
+    def aplicar_alteracao(self, alt):
+        # ajusta os cartões sem consultar o banco; o fluxo é relido em segundo plano
+        if self._totais is None:
+            self.load_data()
+            return
+        self.carregar_fluxo()
+        d1, d2 = self._periodo
+        saldo, rec, desp = self._totais
+        for data, ent, sai in alt.removidos:
+            if d1 <= data <= d2:
+                rec -= ent; desp -= sai
+        for data, ent, sai in alt.adicionados:
+            if d1 <= data <= d2:
+                rec += ent; desp += sai
+        saldo += alt.delta_saldo_total
+        self._totais = (round(saldo, 2), round(rec, 2), round(desp, 2))
+        self._chave = self._chave[:2] + (self.db.versao_dados(),)
+        self._memorizar(self._totais)
+        self._mostrar(*self._totais)
+
+    def _mostrar(self, saldo, rec, desp):
         # Saldo total
-        saldo = self.db.fetch_one("SELECT SUM(saldo_atual) FROM saldo_contas")[0] or 0
-        self.saldo_card.findChild(QLabel, "value").setText(f"R$ {saldo:,.2f}")
+        self.saldo_card.findChild(QLabel, "value").setText(self.db.moeda(saldo))
         # Receitas e Despesas no intervalo
-        rec = self.db.fetch_one(
-            "SELECT SUM(valor_entrada) FROM lancamento WHERE data BETWEEN ? AND ?", (d1, d2)
-        )[0] or 0
-        desp = self.db.fetch_one(
-            "SELECT SUM(valor_saida)   FROM lancamento WHERE data BETWEEN ? AND ?", (d1, d2)
-        )[0] or 0
-        self.receita_card.findChild(QLabel, "value").setText(f"R$ {rec:,.2f}")
-        self.despesa_card.findChild(QLabel, "value").setText(f"R$ {desp:,.2f}")
+        self.receita_card.findChild(QLabel, "value").setText(self.db.moeda(rec))
+        self.despesa_card.findChild(QLabel, "value").setText(self.db.moeda(desp))
         # Gráfico de pizza com %
         self.series.clear()
-        s1 = self.series.append("Receitas", rec)
-        s2 = self.series.append("Despesas", desp)
+        s1 = self.series.append("Receitas", self.db.valor_do_db(rec))
+        s2 = self.series.append("Despesas", self.db.valor_do_db(desp))
         for slice in self.series.slices():
             pct = slice.percentage() * 100
             slice.setLabelVisible(True)
             slice.setLabel(f"{slice.label()} ({pct:.1f}%)")
 
 
+def linha_por_id(tabela, id_):
+    for r in range(tabela.rowCount()):
+        if tabela.item(r, 0).data(Qt.UserRole) == id_:
+            return r
+    return -1
+
+
+def posicao_ordenada(tabela, col, chave):
+    lo, hi = 0, tabela.rowCount()
+    while lo < hi:
+        meio = (lo + hi) // 2
+        if tabela.item(meio, col).text() <= chave:
+            lo = meio + 1
+        else:
+            hi = meio
+    return lo
+
+
 # --- WIDGET GERENCIAMENTO IMÓVEIS ---
 class GerenciamentoImoveisWidget(QWidget):
     def __init__(self, parent=None):
@@ -877,7 +1728,10 @@ class GerenciamentoImoveisWidget(QWidget):
         self.btn_excluir.setIcon(QIcon.fromTheme("edit-delete")); tl.addWidget(self.btn_excluir)
         tl.addStretch()
         self.pesquisa = QLineEdit(); self.pesquisa.setPlaceholderText("Pesquisar imóveis...")
-        self.pesquisa.textChanged.connect(self.carregar_imoveis); tl.addWidget(self.pesquisa)
+        self._atraso = QTimer(self); self._atraso.setSingleShot(True)
+        self._atraso.setInterval(ATRASO_PESQUISA_MS)
+        self._atraso.timeout.connect(self.carregar_imoveis)
+        self.pesquisa.textChanged.connect(lambda _: self._atraso.start()); tl.addWidget(self.pesquisa)
         self.layout.addLayout(tl)
 
         self.tabela = QTableWidget(0, 6)
@@ -888,41 +1742,63 @@ class GerenciamentoImoveisWidget(QWidget):
         self.tabela.cellClicked.connect(self._select_row)
         self.layout.addWidget(self.tabela)
 
+    @perfilado("imoveis")
     def carregar_imoveis(self):
-        termo = f"%{self.pesquisa.text()}%"
-        rows = self.db.fetch_all("""
-            SELECT id,cod_imovel,nome_imovel,uf,area_total,area_utilizada,participacao
-            FROM imovel_rural
-            WHERE cod_imovel LIKE ? OR nome_imovel LIKE ?
-            ORDER BY nome_imovel
-        """, (termo, termo))
+        rows = self.db.buscar_imoveis(self.pesquisa.text())
         self.tabela.setRowCount(len(rows))
-        for r,(id_,cod,nome,uf,at,au,part) in enumerate(rows):
-            for c,val in enumerate([
-                cod, nome, uf,
-                f"{at or 0:.2f} ha",
-                f"{au or 0:.2f} ha",
-                f"{part:.2f}%"
-            ]):
-                item = QTableWidgetItem(val)
-                self.tabela.setItem(r, c, item)
-            self.tabela.item(r, 0).setData(Qt.UserRole, id_)
+        for r, row in enumerate(rows):
+            self._preencher_linha(r, row)
+
+    def _preencher_linha(self, r, row):
+        id_,cod,nome,uf,at,au,part = row
+        for c,val in enumerate([
+            cod, nome, uf,
+            f"{at or 0:.2f} ha",
+            f"{au or 0:.2f} ha",
+            f"{part:.2f}%"
+        ]):
+            item = QTableWidgetItem(val)
+            self.tabela.setItem(r, c, item)
+        self.tabela.item(r, 0).setData(Qt.UserRole, id_)
+
+    def _atualizar_linha(self, id_):
+        if self.db.consulta_fts(self.pesquisa.text()):
+            # ordenado por relevância: refaz a pesquisa
+            self.carregar_imoveis()
+            return
+        row = self.db.fetch_one("""
+            SELECT id,cod_imovel,nome_imovel,uf,area_total,area_utilizada,participacao
+            FROM imovel_rural WHERE id=?
+        """, (id_,))
+        r = linha_por_id(self.tabela, id_)
+        if r >= 0:
+            self.tabela.removeRow(r)
+        if row is None:
+            return
+        pos = posicao_ordenada(self.tabela, 1, row[2])
+        self.tabela.insertRow(pos)
+        self._preencher_linha(pos, row)
 
     def _select_row(self, row, _):
         self.selected_row = row
         self.btn_editar.setEnabled(True)
         self.btn_excluir.setEnabled(True)
 
+    def _remover_selecionada(self):
+        self.tabela.removeRow(self.selected_row)
+        self.btn_editar.setEnabled(False)
+        self.btn_excluir.setEnabled(False)
+
     def novo_imovel(self):
         dlg = CadastroImovelDialog(self)
         if dlg.exec():
-            self.carregar_imoveis()
+            self._atualizar_linha(dlg.imovel_id)
 
     def editar_imovel(self):
         id_ = self.tabela.item(self.selected_row, 0).data(Qt.UserRole)
         dlg = CadastroImovelDialog(self, id_)
         if dlg.exec():
-            self.carregar_imoveis()
+            self._atualizar_linha(id_)
 
     def excluir_imovel(self):
         id_ = self.tabela.item(self.selected_row, 0).data(Qt.UserRole)
@@ -934,7 +1810,7 @@ class GerenciamentoImoveisWidget(QWidget):
             try:
                 self.db.execute_query("DELETE FROM imovel_rural WHERE id=?", (id_,))
                 QMessageBox.information(self, "Sucesso", "Imóvel excluído!")
-                self.carregar_imoveis()
+                self._remover_selecionada()
             except Exception as e:
                 QMessageBox.critical(self, "Erro", f"Erro ao excluir: {e}")
 
@@ -970,29 +1846,50 @@ class GerenciamentoContasWidget(QWidget):
         self.tabela.cellClicked.connect(self._select_row)
         self.layout.addWidget(self.tabela)
 
+    @perfilado("contas")
     def carregar_contas(self):
         rows = self.db.fetch_all("SELECT id,cod_conta,nome_banco,agencia,num_conta,saldo_inicial FROM conta_bancaria ORDER BY nome_banco")
         self.tabela.setRowCount(len(rows))
-        for r,(id_,cod,banco,ag,cont,saldo) in enumerate(rows):
-            for c,val in enumerate([cod,banco,ag,cont,f"R$ {saldo:,.2f}"]):
-                self.tabela.setItem(r,c, QTableWidgetItem(val))
-            self.tabela.item(r,0).setData(Qt.UserRole, id_)
+        for r,row in enumerate(rows):
+            self._preencher_linha(r, row)
+
+    def _preencher_linha(self, r, row):
+        id_,cod,banco,ag,cont,saldo = row
+        for c,val in enumerate([cod,banco,ag,cont,self.db.moeda(saldo)]):
+            self.tabela.setItem(r,c, QTableWidgetItem(val))
+        self.tabela.item(r,0).setData(Qt.UserRole, id_)
+
+    def _atualizar_linha(self, id_):
+        row = self.db.fetch_one("SELECT id,cod_conta,nome_banco,agencia,num_conta,saldo_inicial FROM conta_bancaria WHERE id=?", (id_,))
+        r = linha_por_id(self.tabela, id_)
+        if r >= 0:
+            self.tabela.removeRow(r)
+        if row is None:
+            return
+        pos = posicao_ordenada(self.tabela, 1, row[2])
+        self.tabela.insertRow(pos)
+        self._preencher_linha(pos, row)
 
     def _select_row(self, row, _):
         self.selected_row = row
         self.btn_editar.setEnabled(True)
         self.btn_excluir.setEnabled(True)
 
+    def _remover_selecionada(self):
+        self.tabela.removeRow(self.selected_row)
+        self.btn_editar.setEnabled(False)
+        self.btn_excluir.setEnabled(False)
+
     def nova_conta(self):
         dlg = CadastroContaDialog(self)
         if dlg.exec():
-            self.carregar_contas()
+            self._atualizar_linha(dlg.conta_id)
 
     def editar_conta(self):
         id_ = self.tabela.item(self.selected_row,0).data(Qt.UserRole)
         dlg = CadastroContaDialog(self, id_)
         if dlg.exec():
-            self.carregar_contas()
+            self._atualizar_linha(id_)
 
     def excluir_conta(self):
         id_ = self.tabela.item(self.selected_row,0).data(Qt.UserRole)
@@ -1002,7 +1899,7 @@ class GerenciamentoContasWidget(QWidget):
             try:
                 self.db.execute_query("DELETE FROM conta_bancaria WHERE id=?", (id_,))
                 QMessageBox.information(self,"Sucesso","Conta excluída!")
-                self.carregar_contas()
+                self._remover_selecionada()
             except Exception as e:
                 QMessageBox.critical(self,"Erro",f"Erro ao excluir: {e}")
 
@@ -1028,6 +1925,11 @@ class GerenciamentoParticipantesWidget(QWidget):
         self.btn_excluir.clicked.connect(self.excluir_participante)
         self.btn_excluir.setIcon(QIcon.fromTheme("edit-delete")); tl.addWidget(self.btn_excluir)
         tl.addStretch()
+        self.pesquisa = QLineEdit(); self.pesquisa.setPlaceholderText("Pesquisar por nome ou CPF/CNPJ...")
+        self._atraso = QTimer(self); self._atraso.setSingleShot(True)
+        self._atraso.setInterval(ATRASO_PESQUISA_MS)
+        self._atraso.timeout.connect(self.carregar_participantes)
+        self.pesquisa.textChanged.connect(lambda _: self._atraso.start()); tl.addWidget(self.pesquisa)
         self.layout.addLayout(tl)
 
         self.tabela = QTableWidget(0,4)
@@ -1038,30 +1940,54 @@ class GerenciamentoParticipantesWidget(QWidget):
         self.tabela.cellClicked.connect(self._select_row)
         self.layout.addWidget(self.tabela)
 
+    @perfilado("participantes")
     def carregar_participantes(self):
-        rows = self.db.fetch_all("SELECT id,cpf_cnpj,nome,tipo_contraparte,data_cadastro FROM participante ORDER BY data_cadastro DESC")
+        rows = self.db.buscar_participantes(self.pesquisa.text())
         self.tabela.setRowCount(len(rows))
+        for r,row in enumerate(rows):
+            self._preencher_linha(r, row)
+
+    def _preencher_linha(self, r, row):
         tipos = {1:"PF",2:"PJ",3:"Órgão Público",4:"Outros"}
-        for r,(id_,cpf,nome,tipo,data) in enumerate(rows):
-            for c,val in enumerate([cpf,nome,tipos.get(tipo,str(tipo)),data]):
-                self.tabela.setItem(r,c, QTableWidgetItem(val))
-            self.tabela.item(r,0).setData(Qt.UserRole,id_)
+        id_,cpf,nome,tipo,data = row
+        for c,val in enumerate([cpf,nome,tipos.get(tipo,str(tipo)),data]):
+            self.tabela.setItem(r,c, QTableWidgetItem(val))
+        self.tabela.item(r,0).setData(Qt.UserRole,id_)
+
+    def _atualizar_linha(self, id_):
+        # data_cadastro não muda na edição; um novo participante entra no topo
+        if self.db.consulta_fts(self.pesquisa.text()):
+            self.carregar_participantes()
+            return
+        row = self.db.fetch_one("SELECT id,cpf_cnpj,nome,tipo_contraparte,data_cadastro FROM participante WHERE id=?", (id_,))
+        if row is None:
+            return
+        r = linha_por_id(self.tabela, id_)
+        if r < 0:
+            r = 0
+            self.tabela.insertRow(r)
+        self._preencher_linha(r, row)
 
     def _select_row(self,row,_):
         self.selected_row = row
         self.btn_editar.setEnabled(True)
         self.btn_excluir.setEnabled(True)
 
+    def _remover_selecionada(self):
+        self.tabela.removeRow(self.selected_row)
+        self.btn_editar.setEnabled(False)
+        self.btn_excluir.setEnabled(False)
+
     def novo_participante(self):
         dlg = CadastroParticipanteDialog(self)
         if dlg.exec():
-            self.carregar_participantes()
+            self._atualizar_linha(dlg.participante_id)
 
     def editar_participante(self):
         id_ = self.tabela.item(self.selected_row,0).data(Qt.UserRole)
         dlg = CadastroParticipanteDialog(self,id_)
         if dlg.exec():
-            self.carregar_participantes()
+            self._atualizar_linha(id_)
 
     def excluir_participante(self):
         id_ = self.tabela.item(self.selected_row,0).data(Qt.UserRole)
@@ -1071,19 +1997,48 @@ class GerenciamentoParticipantesWidget(QWidget):
             try:
                 self.db.execute_query("DELETE FROM participante WHERE id=?", (id_,))
                 QMessageBox.information(self,"Sucesso","Participante excluído!")
-                self.carregar_participantes()
+                self._remover_selecionada()
             except Exception as e:
                 QMessageBox.critical(self,"Erro",f"Erro ao excluir: {e}")
 
 
+# --- ABA CONSTRUÍDA SOB DEMANDA ---
+class AbaSobDemanda(QWidget):
+    # o conteúdo só é criado quando a aba é exibida
+    def __init__(self, fabrica, parent=None):
+        super().__init__(parent)
+        self._fabrica = fabrica
+        self.conteudo = None
+        self._layout = QVBoxLayout(self)
+        self._layout.setContentsMargins(0, 0, 0, 0)
+
+    def construir(self):
+        if self.conteudo is None:
+            self.conteudo = self._fabrica()
+            self._layout.addWidget(self.conteudo)
+        return self.conteudo
+
+
+def construir_aba(tabs, indice):
+    aba = tabs.widget(indice)
+    if isinstance(aba, AbaSobDemanda):
+        aba.construir()
+
+
 # --- WIDGET CADASTROS COM ABAS ---
 class CadastrosWidget(QTabWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setTabPosition(QTabWidget.West)
-        self.addTab(GerenciamentoImoveisWidget(), "Imóveis")
-        self.addTab(GerenciamentoContasWidget(), "Contas")
-        self.addTab(GerenciamentoParticipantesWidget(), "Participantes")
+        self.currentChanged.connect(lambda i: construir_aba(self, i))
+        self.paginas = {
+            'imovel': AbaSobDemanda(GerenciamentoImoveisWidget),
+            'conta': AbaSobDemanda(GerenciamentoContasWidget),
+            'participante': AbaSobDemanda(GerenciamentoParticipantesWidget),
+        }
+        self.addTab(self.paginas['imovel'], "Imóveis")
+        self.addTab(self.paginas['conta'], "Contas")
+        self.addTab(self.paginas['participante'], "Participantes")
         self.addTab(QWidget(), "Culturas")
         self.addTab(QWidget(), "Áreas")
         self.addTab(QWidget(), "Estoque")
@@ -1100,6 +2055,8 @@ class MainWindow(QMainWindow):
         self.setGeometry(100,100,1200,800)
         self.setStyleSheet(STYLE_SHEET)
         self.db = Database()
+        self.executor = QueryExecutor.get()
+        self.executor.falha.connect(self._on_falha)
         self._setup_ui()
 
     def _setup_ui(self):
@@ -1110,11 +2067,32 @@ class MainWindow(QMainWindow):
         self.tabs.setContentsMargins(10,10,10,10)
         self.setCentralWidget(self.tabs)
 
-        # Painel
+        # cada aba é montada ao ser exibida; a inicial, após a primeira pintura
+        self._pintada = False
+        self.dashboard = None
+        self.lanc_model = None
+        self.tabs.addTab(AbaSobDemanda(self._criar_painel), "Painel")
+        self.tabs.addTab(AbaSobDemanda(self._criar_aba_lancamentos), "Lançamentos")
+        self.aba_cadastros = AbaSobDemanda(CadastrosWidget)
+        self.tabs.addTab(self.aba_cadastros, "Cadastros")
+        self.tabs.addTab(AbaSobDemanda(self._criar_aba_planejamento), "Planejamento")
+        self.tabs.currentChanged.connect(lambda i: construir_aba(self.tabs, i))
+
+        self.status = QStatusBar()
+        self.setStatusBar(self.status)
+        self.status.showMessage("Sistema iniciado com sucesso!")
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self._pintada:
+            self._pintada = True
+            QTimer.singleShot(0, lambda: construir_aba(self.tabs, self.tabs.currentIndex()))
+
+    def _criar_painel(self):
         self.dashboard = DashboardWidget()
-        self.tabs.addTab(self.dashboard, "Painel")
+        return self.dashboard
 
-        # Lançamentos
+    def _criar_aba_lancamentos(self):
         w_l = QWidget(); l_l = QVBoxLayout(w_l); l_l.setContentsMargins(10,10,10,10)
         self.lanc_filter_layout = QHBoxLayout()
         self.lanc_filter_layout.addWidget(QLabel("De:"))
@@ -1132,37 +2110,79 @@ class MainWindow(QMainWindow):
         self.btn_del_lanc.clicked.connect(self.excluir_lancamento)
         self.lanc_filter_layout.addWidget(self.btn_del_lanc)
         l_l.addLayout(self.lanc_filter_layout)
-
-        self.tab_lanc = QTableWidget(0,8)
-        self.tab_lanc.setHorizontalHeaderLabels(["ID","Data","Imóvel","Histórico","Tipo","Entrada","Saída","Saldo"])
+        self._build_filtro_avancado(l_l)
+        self.lbl_lanc_status = QLabel("Carregando lançamentos...")
+        self.lbl_lanc_status.setVisible(False)
+        l_l.addWidget(self.lbl_lanc_status)
+
+        self.lanc_model = LancamentosModel(self.db, self.executor, self)
+        self.lanc_model.carregando.connect(self.lbl_lanc_status.setVisible)
+        self.tab_lanc = QTableView()
+        self.tab_lanc.setModel(self.lanc_model)
         self.tab_lanc.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.tab_lanc.setSelectionBehavior(QTableWidget.SelectRows)
-        self.tab_lanc.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.tab_lanc.cellClicked.connect(lambda r,_: (
+        self.tab_lanc.verticalHeader().setDefaultSectionSize(28)
+        self.tab_lanc.setSelectionBehavior(QTableView.SelectRows)
+        self.tab_lanc.setEditTriggers(QTableView.NoEditTriggers)
+        self.tab_lanc.clicked.connect(lambda _: (
             self.btn_edit_lanc.setEnabled(True),
             self.btn_del_lanc.setEnabled(True)
         ))
         l_l.addWidget(self.tab_lanc)
-        self.tabs.addTab(w_l, "Lançamentos")
-
-        # Cadastros
-        self.cadw = CadastrosWidget()
-        self.tabs.addTab(self.cadw, "Cadastros")
+        self.carregar_lancamentos()
+        return w_l
 
-        # Planejamento
+    def _criar_aba_planejamento(self):
         w_p = QWidget(); l_p = QVBoxLayout(w_p); l_p.setContentsMargins(10,10,10,10)
         self.tab_plan = QTableWidget(0,5)
         self.tab_plan.setHorizontalHeaderLabels(["Cultura","Área","Plantio","Colheita Est.","Prod. Est."])
         self.tab_plan.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         l_p.addWidget(self.tab_plan)
-        self.tabs.addTab(w_p, "Planejamento")
-
-        self.status = QStatusBar()
-        self.setStatusBar(self.status)
-        self.status.showMessage("Sistema iniciado com sucesso!")
-
-        self.carregar_lancamentos()
         self.carregar_planejamento()
+        return w_p
+
+    def _build_filtro_avancado(self, layout):
+        hl = QHBoxLayout()
+        self.flt_imovel = ComboDimensao(self.db, 'imovel_rural', todos="Todos")
+        self.flt_conta = ComboDimensao(self.db, 'conta_bancaria', todos="Todos")
+        self.flt_categoria = QComboBox(); self.flt_tipo = QComboBox()
+        for combo in (self.flt_categoria, self.flt_tipo):
+            combo.addItem("Todos", None)
+        for cat in CATEGORIAS:
+            self.flt_categoria.addItem(cat, cat)
+        for tipo, nome in LancamentosModel.TIPOS.items():
+            self.flt_tipo.addItem(nome, tipo)
+        for rotulo, combo in (("Imóvel:", self.flt_imovel), ("Conta:", self.flt_conta),
+                              ("Categoria:", self.flt_categoria), ("Tipo:", self.flt_tipo)):
+            hl.addWidget(QLabel(rotulo)); hl.addWidget(combo)
+        self.flt_participante = QLineEdit(); self.flt_participante.setPlaceholderText("Participante / CPF-CNPJ")
+        self.flt_valor_min = QLineEdit(); self.flt_valor_min.setPlaceholderText("Valor mín.")
+        self.flt_valor_max = QLineEdit(); self.flt_valor_max.setPlaceholderText("Valor máx.")
+        self.flt_num_doc = QLineEdit(); self.flt_num_doc.setPlaceholderText("Nº documento")
+        self.flt_texto = QLineEdit(); self.flt_texto.setPlaceholderText("Histórico contém...")
+        for campo in (self.flt_participante, self.flt_valor_min, self.flt_valor_max,
+                      self.flt_num_doc, self.flt_texto):
+            campo.returnPressed.connect(self.carregar_lancamentos)
+            hl.addWidget(campo)
+        self.flt_valor_min.setMaximumWidth(90); self.flt_valor_max.setMaximumWidth(90)
+        layout.addLayout(hl)
+
+    def _filtro_lancamentos(self):
+        valores = []
+        for campo in (self.flt_valor_min, self.flt_valor_max):
+            txt = campo.text().strip().replace(',', '.')
+            valores.append(float(txt) if txt else None)
+        return FiltroLancamentos(
+            self.dt_ini.date().toString("yyyy-MM-dd"),
+            self.dt_fim.date().toString("yyyy-MM-dd"),
+            conta=self.flt_conta.valor(),
+            imovel=self.flt_imovel.valor(),
+            participante=self.flt_participante.text(),
+            categoria=self.flt_categoria.currentData(),
+            tipo_lanc=self.flt_tipo.currentData(),
+            valor_min=valores[0], valor_max=valores[1],
+            num_doc=self.flt_num_doc.text(),
+            texto=self.flt_texto.text(),
+        )
 
     def _create_menu(self):
         mb = self.menuBar()
@@ -1171,20 +2191,31 @@ class MainWindow(QMainWindow):
         m1.addAction(a1)
         a2 = QAction("Exportar Dados", self); a2.triggered.connect(self.exportar_dados)
         m1.addAction(a2)
+        a5 = QAction("Gerar TXT em Lote...", self); a5.triggered.connect(self.gerar_txt_lote)
+        m1.addAction(a5)
+        a6 = QAction("Importar Extrato Bancário...", self); a6.triggered.connect(self.importar_extrato)
+        m1.addAction(a6)
+        a7 = QAction("Importar TXT do LCDPR...", self); a7.triggered.connect(self.importar_txt)
+        m1.addAction(a7)
+        a8 = QAction("Validar Dados do LCDPR...", self); a8.triggered.connect(self.validar_lcdpr)
+        m1.addAction(a8)
+        a4 = QAction("Converter para Formato Compacto", self)
+        a4.triggered.connect(self.converter_formato_compacto)
+        m1.addAction(a4)
         m1.addSeparator()
         a3 = QAction("Sair", self); a3.triggered.connect(self.close)
         m1.addAction(a3)
 
         m2 = mb.addMenu("&Cadastros")
         for txt,fn in [
-            ("Imóvel Rural", lambda: self.tabs.setCurrentIndex(1)),
-            ("Conta Bancária", lambda: self.tabs.setCurrentIndex(2)),
-            ("Participante", lambda: self.tabs.setCurrentIndex(3)),
+            ("Imóvel Rural", self.cad_imovel),
+            ("Conta Bancária", self.cad_conta),
+            ("Participante", self.cad_participante),
             ("Cultura", lambda: QMessageBox.information(self,"Cultura","Em desenvolvimento"))
         ]:
             act = QAction(txt, self); act.triggered.connect(fn); m2.addAction(act)
 
-        m3 = mb.addMenu("&Relatórios")
+        m3 = self.menu_relatorios = mb.addMenu("&Relatórios")
         bal = QAction("Balancete", self); bal.triggered.connect(self.abrir_balancete)
         m3.addAction(bal)
         raz = QAction("Razão", self); raz.triggered.connect(self.abrir_razao)
@@ -1192,6 +2223,8 @@ class MainWindow(QMainWindow):
 
         m4 = mb.addMenu("&Ajuda")
         m4.addAction(QAction("Manual do Usuário", self))
+        diag = QAction("Diagnóstico de Consultas", self); diag.triggered.connect(self.abrir_diagnostico)
+        m4.addAction(diag)
         sb = QAction("Sobre o Sistema", self); sb.triggered.connect(self.mostrar_sobre)
         m4.addAction(sb)
 
@@ -1200,60 +2233,50 @@ class MainWindow(QMainWindow):
         tb.setIconSize(QSize(32,32))
         self.addToolBar(Qt.LeftToolBarArea, tb)
         tb.addAction(QAction(QIcon("icons/add.png"), "Novo Lançamento", self, triggered=self.novo_lancamento))
-        tb.addAction(QAction(QIcon("icons/farm.png"), "Cad. Imóvel", self, triggered=lambda: self.tabs.setCurrentIndex(1)))
-        tb.addAction(QAction(QIcon("icons/bank.png"), "Cad. Conta", self, triggered=lambda: self.tabs.setCurrentIndex(2)))
-        tb.addAction(QAction(QIcon("icons/users.png"), "Cad. Participante", self, triggered=lambda: self.tabs.setCurrentIndex(3)))
-        tb.addAction(QAction(QIcon("icons/report.png"), "Relatórios", self, triggered=lambda: self.tabs.setCurrentIndex(4)))
+        tb.addAction(QAction(QIcon("icons/farm.png"), "Cad. Imóvel", self, triggered=self.cad_imovel))
+        tb.addAction(QAction(QIcon("icons/bank.png"), "Cad. Conta", self, triggered=self.cad_conta))
+        tb.addAction(QAction(QIcon("icons/users.png"), "Cad. Participante", self, triggered=self.cad_participante))
+        tb.addAction(QAction(QIcon("icons/report.png"), "Relatórios", self, triggered=lambda: self.menu_relatorios.popup(QCursor.pos())))
         tb.addAction(QAction(QIcon("icons/txt.png"), "Gerar TXT LCDPR", self, triggered=self.gerar_txt))
 
     def carregar_lancamentos(self):
-        d1 = self.dt_ini.date().toString("yyyy-MM-dd")
-        d2 = self.dt_fim.date().toString("yyyy-MM-dd")
-        q = f"""
-        SELECT l.id, l.data, i.nome_imovel, l.historico,
-               CASE l.tipo_lanc WHEN 1 THEN 'Receita' WHEN 2 THEN 'Despesa' ELSE 'Adiantamento' END,
-               l.valor_entrada, l.valor_saida,
-               (l.saldo_final * CASE l.natureza_saldo WHEN 'P' THEN 1 ELSE -1 END) as saldo
-        FROM lancamento l
-        JOIN imovel_rural i ON l.cod_imovel=i.id
-        WHERE l.data BETWEEN '{d1}' AND '{d2}'
-        ORDER BY l.data DESC
-        """
-        rows = self.db.fetch_all(q)
-        self.tab_lanc.setRowCount(len(rows))
-        for r,row in enumerate(rows):
-            for c,val in enumerate(row):
-                item = QTableWidgetItem(str(val))
-                item.setTextAlignment(Qt.AlignCenter)
-                if c==5: item.setForeground(QColor("#27ae60"))
-                if c==6: item.setForeground(QColor("#e74c3c"))
-                if c==7:
-                    item.setForeground(QColor("#27ae60") if float(val)>=0 else QColor("#e74c3c"))
-                self.tab_lanc.setItem(r,c,item)
+        self.flt_imovel.atualizar(); self.flt_conta.atualizar()
+        try:
+            filtro = self._filtro_lancamentos()
+        except ValueError:
+            QMessageBox.warning(self, "Filtro Inválido", "Informe os valores mínimo/máximo como números.")
+            return
+        self.btn_edit_lanc.setEnabled(False)
+        self.btn_del_lanc.setEnabled(False)
+        self.lanc_model.filtrar(filtro)
+
+    def _on_falha(self, canal, erro):
+        if canal in TarefaDialog.CANAIS:
+            return  # tratado pelo próprio TarefaDialog
+        QMessageBox.critical(self, "Erro", f"Erro ao carregar dados: {erro}")
 
     def editar_lancamento(self):
-        row = self.tab_lanc.currentRow()
-        lanc_id = int(self.tab_lanc.item(row,0).text())
+        lanc_id = self.lanc_model.lanc_id(self.tab_lanc.currentIndex().row())
         dlg = LancamentoDialog(self, lanc_id)
         if dlg.exec():
-            self.carregar_lancamentos()
-            self.dashboard.load_data()
+            self._aplicar_alteracao(dlg.alteracao)
 
     def excluir_lancamento(self):
-        row = self.tab_lanc.currentRow()
-        lanc_id = int(self.tab_lanc.item(row,0).text())
+        lanc_id = self.lanc_model.lanc_id(self.tab_lanc.currentIndex().row())
         ans = QMessageBox.question(self, "Confirmar Exclusão",
                                    f"Excluir lançamento ID {lanc_id}?",
                                    QMessageBox.Yes | QMessageBox.No)
         if ans == QMessageBox.Yes:
             try:
-                self.db.execute_query("DELETE FROM lancamento WHERE id=?", (lanc_id,))
+                alt = self.db.excluir_lancamento(lanc_id)
                 QMessageBox.information(self, "Sucesso", "Lançamento excluído!")
-                self.carregar_lancamentos()
-                self.dashboard.load_data()
+                self.btn_edit_lanc.setEnabled(False)
+                self.btn_del_lanc.setEnabled(False)
+                self._aplicar_alteracao(alt)
             except Exception as e:
                 QMessageBox.critical(self, "Erro", f"Erro ao excluir: {e}")
 
+    @perfilado("planejamento")
     def carregar_planejamento(self):
         q = """
         SELECT c.nome, a.area, a.data_plantio, a.data_colheita_estimada, a.produtividade_estimada
@@ -1272,63 +2295,161 @@ class MainWindow(QMainWindow):
     def novo_lancamento(self):
         dlg = LancamentoDialog(self)
         if dlg.exec():
-            self.carregar_lancamentos()
-            self.dashboard.load_data()
+            self._aplicar_alteracao(dlg.alteracao)
+
+    def _aplicar_alteracao(self, alt):
+        # abas ainda não montadas carregam os dados atuais quando abertas
+        if self.lanc_model is not None:
+            self.lanc_model.aplicar_alteracao(alt)
+        if self.dashboard is not None:
+            self.dashboard.aplicar_alteracao(alt)
+
+    def _abrir_cadastro(self, pagina):
+        self.tabs.setCurrentWidget(self.aba_cadastros)
+        cadastros = self.aba_cadastros.construir()
+        cadastros.setCurrentWidget(cadastros.paginas[pagina])
 
     def cad_imovel(self):
-        self.tabs.setCurrentIndex(1)
+        self._abrir_cadastro('imovel')
 
     def cad_conta(self):
-        self.tabs.setCurrentIndex(2)
+        self._abrir_cadastro('conta')
 
     def cad_participante(self):
-        self.tabs.setCurrentIndex(3)
+        self._abrir_cadastro('participante')
 
     def exportar_dados(self):
-        path, _ = QFileDialog.getSaveFileName(self, "Exportar Dados", "", "CSV (*.csv)")
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Exportar Dados", "", "CSV (*.csv);;CSV gzip (*.csv.gz);;CSV zstd (*.csv.zst)")
         if not path: return
-        try:
-            lancs = self.db.fetch_all("SELECT * FROM lancamento")
-            with open(path,'w',newline='',encoding='utf-8') as f:
-                w = csv.writer(f, delimiter=';')
-                w.writerow([
-                    "ID","Data","Imóvel","Conta","Documento","Tipo Doc",
-                    "Histórico","Participante","Tipo","Entrada","Saída","Saldo","Natureza","Categoria"
-                ])
-                for l in lancs:
-                    w.writerow(l[1:])
+        filtro = None
+        if self.lanc_model is not None:
+            ans = QMessageBox.question(self, "Exportar Dados",
+                                       "Exportar só os lançamentos do filtro atual da aba Lançamentos?",
+                                       QMessageBox.Yes | QMessageBox.No)
+            if ans == QMessageBox.Yes:
+                try:
+                    filtro = self._filtro_lancamentos()
+                except ValueError:
+                    QMessageBox.warning(self, "Filtro Inválido", "Informe os valores mínimo/máximo como números.")
+                    return
+        dlg = TarefaDialog("Exportar Dados", f"Exportando {os.path.basename(path)}", "exportar",
+                           lambda db, andamento, cancelado: db.exportar_lancamentos_csv(path, filtro, andamento, cancelado),
+                           "lançamentos", self)
+        if dlg.exec():
+            self.status.showMessage(f"{dlg.resultado} lançamentos exportados.", 5000)
             QMessageBox.information(self, "Exportação", "Dados exportados com sucesso!")
-        except Exception as e:
-            QMessageBox.critical(self, "Erro", f"Erro na exportação: {e}")
+        else:
+            self.status.showMessage("Exportação interrompida.", 5000)
 
-    def gerar_txt(self):
+    def converter_formato_compacto(self):
+        if self.db.compacto:
+            QMessageBox.information(self, "Formato Compacto", "O banco já está no formato compacto.")
+            return
+        ans = QMessageBox.question(
+            self, "Formato Compacto",
+            "Converter valores para centavos inteiros e datas para número do dia?\n"
+            "Faça uma cópia de segurança do banco antes de continuar.",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if ans != QMessageBox.Yes:
+            return
         try:
-            with open("LCDPR.txt","w",encoding='utf-8') as f:
-                f.write("|0000|LCDPR|001|0001|\n")
-                for im in self.db.fetch_all("SELECT * FROM imovel_rural"):
-                    f.write("|0040|"+ "|".join([
-                        im[1],im[2],im[3] or "",im[4] or "",im[5] or "",im[6],
-                        im[7],im[8] or "",im[9] or "",im[10],im[11],im[12],
-                        im[13],str(im[14]),f"{im[15]:.2f}"
-                    ])+"|\n")
-                for ct in self.db.fetch_all("SELECT * FROM conta_bancaria"):
-                    f.write("|0050|"+ "|".join([
-                        ct[1],ct[2],ct[3] or "",ct[4],ct[5],str(ct[6])
-                    ])+"|\n")
-                for p in self.db.fetch_all("SELECT * FROM participante"):
-                    f.write("|0100|"+ "|".join([
-                        p[1],p[2],str(p[3])
-                    ])+"|\n")
-                for l in self.db.fetch_all("SELECT * FROM lancamento"):
-                    f.write("|Q100|"+ "|".join([
-                        l[1],str(l[2]),str(l[3]),l[4] or "",str(l[5]),str(l[6]),
-                        l[7] or "",str(l[8]),f"{l[9]:.2f}",f"{l[10]:.2f}",
-                        f"{l[11]:.2f}",l[12]
-                    ])+"|\n")
-                f.write("|9999|1|\n")
-            QMessageBox.information(self,"TXT","Arquivo LCDPR.txt gerado!")
+            self.db.converter_formato_compacto()
+            QMessageBox.information(self, "Formato Compacto", "Banco convertido com sucesso!")
+            if self.lanc_model is not None:
+                self.carregar_lancamentos()
+            if self.dashboard is not None:
+                self.dashboard.load_data()
         except Exception as e:
-            QMessageBox.critical(self,"Erro",f"Erro ao gerar TXT: {e}")
+            QMessageBox.critical(self, "Erro", f"Erro na conversão: {e}")
+
+    def _validar(self, gerar):
+        dlg = TarefaDialog("Validar LCDPR", "Validando os registros", "validar_lcdpr",
+                           lambda db, andamento, cancelado: db.validar_lcdpr(
+                               progresso=andamento, cancelado=cancelado),
+                           unidade="tabelas", parent=self)
+        if not dlg.exec():
+            return False
+        res = dlg.resultado
+        if not res['total']:
+            if not gerar:
+                QMessageBox.information(self, "Validação", "Nenhum problema encontrado.")
+            return True
+        return bool(ValidacaoDialog(res, gerar, self).exec())
+
+    def validar_lcdpr(self):
+        self._validar(gerar=False)
+
+    def gerar_txt(self):
+        if not self._validar(gerar=True):
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Gerar TXT LCDPR", "LCDPR.txt", "Texto (*.txt)")
+        if not path:
+            return
+        dlg = TarefaDialog("Gerar TXT LCDPR", f"Gerando {os.path.basename(path)}", "gerar_txt",
+                           lambda db, andamento, cancelado: db.escrever_lcdpr_txt(path, andamento, cancelado),
+                           parent=self)
+        if dlg.exec():
+            self.status.showMessage(f"Arquivo {path} gerado!", 5000)
+            QMessageBox.information(self, "TXT", f"Arquivo {path} gerado!")
+        else:
+            self.status.showMessage("Geração do TXT interrompida.", 5000)
+
+    def importar_extrato(self):
+        dlg = ImportarExtratoDialog(self)
+        if not dlg.exec():
+            return
+        res = dlg.resultado
+        self.status.showMessage(f"{res['novas']} lançamentos importados, {res['duplicadas']} duplicados.", 5000)
+        if self.lanc_model is not None:
+            self.carregar_lancamentos()
+        if self.dashboard is not None:
+            self.dashboard.load_data()
+
+    def importar_txt(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Importar TXT do LCDPR", "", "Texto (*.txt);;Todos (*)")
+        if not path:
+            return
+        dlg = TarefaDialog("Importar TXT do LCDPR", f"Importando {os.path.basename(path)}", "importar_txt",
+                           lambda db, andamento, cancelado: db.importar_lcdpr_txt(path, andamento, cancelado),
+                           parent=self)
+        if not dlg.exec():
+            self.status.showMessage("Importação interrompida.", 5000)
+            return
+        res = dlg.resultado
+        resumo = (f"{res['imoveis']} imóveis, {res['contas']} contas e {res['participantes']} participantes; "
+                  f"{res['lancamentos']} lançamentos importados, {res['duplicados']} já existentes.")
+        self.status.showMessage(resumo, 5000)
+        if res['invalidas']:
+            erros = "\n".join(f"Linha {num}: {msg}" for num, msg in res['erros'][:20])
+            if res['invalidas'] > 20:
+                erros += f"\n... e mais {res['invalidas'] - 20}"
+            QMessageBox.warning(self, "Importação",
+                                f"{resumo}\n\n{res['invalidas']} linhas inválidas foram ignoradas:\n{erros}")
+        else:
+            QMessageBox.information(self, "Importação", resumo)
+        if self.lanc_model is not None:
+            self.carregar_lancamentos()
+        if self.dashboard is not None:
+            self.dashboard.load_data()
+
+    def gerar_txt_lote(self):
+        lote = LoteTxtDialog(self)
+        if not lote.exec():
+            return
+        jobs, pasta = lote.jobs, lote.pasta.text().strip()
+        inicio = time.perf_counter()
+        dlg = TarefaDialog("Gerar TXT em Lote", f"Gerando {len(jobs)} declarações", "gerar_lote",
+                           lambda db, andamento, cancelado: gerar_lote(jobs, pasta, None, andamento, cancelado),
+                           "declarações", self)
+        if not dlg.exec():
+            self.status.showMessage("Geração em lote interrompida.", 5000)
+            return
+        segundos = time.perf_counter() - inicio
+        falhas = sum(1 for r in dlg.resultado if r['erro'])
+        self.status.showMessage(f"Lote concluído: {len(jobs) - falhas} gerados, {falhas} falhas.", 5000)
+        ResultadoLoteDialog(dlg.resultado, segundos, self).exec()
 
     def abrir_balancete(self):
         dlg = RelatorioPeriodoDialog("Balancete", self)
@@ -1342,6 +2463,13 @@ class MainWindow(QMainWindow):
             d1,d2 = dlg.periodo
             # lógica de razão
 
+    def abrir_diagnostico(self):
+        DiagnosticoDialog(self).exec()
+
+    def closeEvent(self, event):
+        QueryExecutor.parar_todos()
+        super().closeEvent(event)
+
     def mostrar_sobre(self):
         QMessageBox.information(
             self, "Sobre o Sistema",
@@ -1362,4 +2490,7 @@ if __name__ == "__main__":
     app.setStyle("Fusion")
     window = MainWindow()
     window.show()
-    sys.exit(app.exec())
+    ret = app.exec()
+    QueryExecutor.parar_todos()
+    ConnectionManager.close_all()
+    sys.exit(ret)
@@ -0,0 +1,85 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dados import BLOCO_CACHE_BITS, LANCAMENTO_IMPORTACAO, ConnectionManager, Database
+
+BLOCO = 1 << BLOCO_CACHE_BITS
+TOTAL = 2 * BLOCO + 500     # trechos 0, 1 e 2 do Q100
+
+
+def participante(lanc_id):
+    # o participante 1 só aparece no trecho 1; o 2, nos trechos 0 e 2
+    if lanc_id >> BLOCO_CACHE_BITS == 1:
+        return 1 if lanc_id % 7 == 0 else None
+    return 2 if lanc_id % 7 == 1 else None
+
+
+class CacheTxtLcdpr(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.addCleanup(ConnectionManager.close_all)
+        self.db = db = Database(os.path.join(self.dir.name, "cache.db"))
+        db.execute_query(
+            "INSERT INTO imovel_rural (cod_imovel, nome_imovel, endereco, bairro, uf, "
+            "cod_mun, cep, tipo_exploracao) VALUES ('IM1', 'Fazenda', 'Estrada', 'Rural', "
+            "'GO', '5208707', '74000000', 1)")
+        db.execute_query(
+            "INSERT INTO conta_bancaria (cod_conta, nome_banco, agencia, num_conta) "
+            "VALUES ('CT1', 'Banco', '0001', '1000-0')")
+        db.executemany(
+            "INSERT INTO participante (cpf_cnpj, nome, tipo_contraparte) VALUES (?, ?, 1)",
+            [("11144477735", "Cooperativa"), ("52998224725", "José Pereira")])
+        with db.insercao_em_lote():
+            db.executemany(
+                f"INSERT INTO lancamento ({', '.join(LANCAMENTO_IMPORTACAO)}) "
+                f"VALUES ({', '.join('?' * len(LANCAMENTO_IMPORTACAO))})",
+                [(f"2024-{n % 12 + 1:02d}-{n % 28 + 1:02d}", 1, 1, f"D{n}", 1, f"Lançamento {n}",
+                  participante(n), 1, 10.0, 0.0, None, 0, 'P', None)
+                 for n in range(1, TOTAL + 1)])
+            db.recalcular_saldos(1)
+        self.renderizados = []
+        linhas_lcdpr = db._linhas_lcdpr
+
+        def espiao(registro, rows):
+            self.renderizados += sorted({(registro, row[0] >> BLOCO_CACHE_BITS) for row in rows})
+            return linhas_lcdpr(registro, rows)
+        db._linhas_lcdpr = espiao
+        self.gerar()
+
+    def gerar(self):
+        # gera com cache e confere com a geração completa, sem cache
+        self.renderizados = []
+        com_cache = "".join(texto for texto, _ in self.db.blocos_lcdpr())
+        renderizados = list(self.renderizados)
+        sem_cache = "".join(texto for texto, _ in self.db.blocos_lcdpr(cache=False))
+        self.assertEqual(com_cache, sem_cache)
+        return renderizados
+
+    def test_sem_alteracao_nada_e_renderizado(self):
+        self.assertEqual(self.gerar(), [])
+
+    def test_historico_renderiza_so_o_trecho(self):
+        self.db.atualizar_lancamento(BLOCO + 10, {'historico': "Histórico corrigido"})
+        self.assertEqual(self.gerar(), [('Q100', 1)])
+        self.db.atualizar_lancamento(5, {'historico': "Outro histórico"})
+        self.db.atualizar_lancamento(TOTAL, {'historico': "Último"})
+        self.assertEqual(self.gerar(), [('Q100', 0), ('Q100', 2)])
+
+    def test_chave_do_participante_renderiza_quem_a_referencia(self):
+        self.db.execute_query("UPDATE participante SET cpf_cnpj='39053344705' WHERE id=1")
+        self.assertEqual(self.gerar(), [('0100', 0), ('Q100', 1)])
+        self.db.execute_query("UPDATE participante SET cpf_cnpj='11222333000181' WHERE id=2")
+        self.assertEqual(self.gerar(), [('0100', 0), ('Q100', 0), ('Q100', 2)])
+
+    def test_nome_do_participante_nao_afeta_o_q100(self):
+        self.db.execute_query("UPDATE participante SET nome='Cooperativa Mista' WHERE id=1")
+        self.assertEqual(self.gerar(), [('0100', 0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import gzip
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dados import ConnectionManager, Database, FiltroLancamentos, OperacaoCancelada
+
+LANCAMENTOS = """
+    SELECT data, cod_imovel, cod_conta, num_doc, tipo_doc, historico, id_participante,
+           tipo_lanc, valor_entrada, valor_saida, saldo_final, natureza_saldo, categoria,
+           chave_natural
+    FROM lancamento ORDER BY id
+"""
+
+
+class ExportacaoImportacaoCsv(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.addCleanup(ConnectionManager.close_all)
+        self.origem = self.banco("origem.db")
+        for n in range(40):
+            self.origem.inserir_lancamento({
+                'data': f"2024-{n % 12 + 1:02d}-{n % 28 + 1:02d}", 'cod_imovel': n % 2 + 1,
+                'cod_conta': n % 3 % 2 + 1, 'num_doc': f"D{n}" if n % 4 else None,
+                'tipo_doc': 1, 'historico': f"Lançamento; \"{n}\"\nsegunda linha",
+                'id_participante': n % 3 or None, 'tipo_lanc': 1 if n % 3 else 2,
+                'categoria': "Vendas" if n % 5 else None,
+                'valor_entrada': round(10.01 * n, 2) if n % 3 else 0,
+                'valor_saida': 0 if n % 3 else round(3.3 * n, 2),
+            })
+
+    def caminho(self, nome):
+        return os.path.join(self.dir.name, nome)
+
+    def banco(self, nome):
+        # cadastros iguais: os IDs exportados valem no destino
+        db = Database(self.caminho(nome))
+        db.executemany(
+            "INSERT INTO imovel_rural (cod_imovel, nome_imovel, endereco, bairro, uf, "
+            "cod_mun, cep, tipo_exploracao) VALUES (?, ?, 'Estrada', 'Rural', 'GO', "
+            "'5208707', '74000000', 1)", [("IM1", "Fazenda 1"), ("IM2", "Fazenda 2")])
+        db.executemany(
+            "INSERT INTO conta_bancaria (cod_conta, nome_banco, agencia, num_conta) "
+            "VALUES (?, 'Banco', '0001', ?)", [("CT1", "1000-0"), ("CT2", "2000-0")])
+        db.executemany(
+            "INSERT INTO participante (cpf_cnpj, nome, tipo_contraparte) VALUES (?, ?, 1)",
+            [("00000000001", "Participante 1"), ("00000000002", "Participante 2")])
+        return db
+
+    def round_trip(self, nome, filtro=None):
+        path = self.caminho(nome)
+        exportadas = self.origem.exportar_lancamentos_csv(path, filtro)
+        destino = self.banco(nome + ".db")
+        self.assertEqual(destino.importar_lancamentos_csv(path), exportadas)
+        return path, destino
+
+    def test_csv(self):
+        path, destino = self.round_trip("lancamentos.csv")
+        self.assertEqual(destino.fetch_all(LANCAMENTOS), self.origem.fetch_all(LANCAMENTOS))
+        with open(path, 'rb') as f:
+            self.assertTrue(f.read(3).startswith(b"ID;"))
+
+    def test_csv_gzip(self):
+        path, destino = self.round_trip("lancamentos.csv.gz")
+        self.assertEqual(destino.fetch_all(LANCAMENTOS), self.origem.fetch_all(LANCAMENTOS))
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            self.assertTrue(f.readline().startswith("ID;Data;"))
+        # mesmo conteúdo do CSV sem compressão
+        simples = self.caminho("simples.csv")
+        self.origem.exportar_lancamentos_csv(simples)
+        with gzip.open(path, 'rb') as a, open(simples, 'rb') as b:
+            self.assertEqual(a.read(), b.read())
+
+    def test_filtro(self):
+        filtro = FiltroLancamentos("2024-03-01", "2024-08-31", conta=2)
+        _, destino = self.round_trip("filtrado.csv.gz", filtro)
+        ids = [row[0] for row in self.origem.pagina_lancamentos(filtro, limite=1000)]
+        self.assertTrue(ids)
+        esperado = self.origem.fetch_all(
+            f"SELECT data, historico, valor_entrada, valor_saida FROM lancamento "
+            f"WHERE id IN ({', '.join('?' * len(ids))}) ORDER BY id", ids)
+        self.assertEqual(destino.fetch_all(
+            "SELECT data, historico, valor_entrada, valor_saida FROM lancamento ORDER BY id"),
+            esperado)
+
+    def test_cancelamento_nao_deixa_arquivo(self):
+        path = self.caminho("cancelado.csv.gz")
+        with self.assertRaises(OperacaoCancelada):
+            self.origem.exportar_lancamentos_csv(path, cancelado=lambda: True)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(path + ".tmp"))
+
+
+if __name__ == "__main__":
+    unittest.main()
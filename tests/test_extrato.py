@@ -0,0 +1,137 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dados import ConnectionManager, Database, LayoutExtrato, ler_csv_extrato, ler_ofx
+
+OFX = """OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+ENCODING:USASCII
+CHARSET:1252
+
+<OFX>
+<BANKMSGSRSV1><STMTTRNRS><STMTRS>
+<BANKTRANLIST>
+<DTSTART>20240301
+<DTEND>20240331
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240305120000<TRNAMT>1500.00<FITID>A1<MEMO>VENDA DE SOJA
+</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240307<TRNAMT>-89,90<CHECKNUM>000123<MEMO>TARIFA
+</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240307<TRNAMT>-89.90<CHECKNUM>000123<MEMO>TARIFA
+</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240310<TRNAMT>-250.00<FITID>A4<NAME>ADUBO
+</STMTTRN>
+</BANKTRANLIST>
+</STMTRS></STMTTRNRS></BANKMSGSRSV1>
+</OFX>
+"""
+
+CSV = """Data;Histórico;Valor
+01/03/2024;SALDO ANTERIOR;10.000,00
+02/03/2024;PIX RECEBIDO;1.234,56
+02/03/2024;PIX RECEBIDO;1.234,56
+03/03/2024;COMPRA DIESEL;-480,10
+04/03/2024;ESTORNO;0,00
+"""
+
+
+class ImportacaoExtrato(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.addCleanup(ConnectionManager.close_all)
+        self.db = Database(self.caminho("extrato.db"))
+        self.db.execute_query(
+            "INSERT INTO imovel_rural (cod_imovel, nome_imovel, endereco, bairro, uf, "
+            "cod_mun, cep, tipo_exploracao) VALUES ('IM1', 'Fazenda', 'Estrada', 'Rural', "
+            "'GO', '5208707', '74000000', 1)")
+        self.db.execute_query(
+            "INSERT INTO conta_bancaria (cod_conta, nome_banco, agencia, num_conta) "
+            "VALUES ('CT1', 'Banco', '0001', '1000-0')")
+
+    def caminho(self, nome):
+        return os.path.join(self.dir.name, nome)
+
+    def arquivo(self, nome, conteudo):
+        path = self.caminho(nome)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(conteudo)
+        return path
+
+    def importar(self, linhas, **kw):
+        return self.db.importar_extrato(list(linhas), conta=1, imovel=1, **kw)
+
+    def livro(self):
+        return self.db.fetch_all(
+            "SELECT id, data, valor_entrada, valor_saida, num_doc, historico, saldo_final, "
+            "natureza_saldo, chave_natural FROM lancamento ORDER BY id")
+
+    def test_k_esima_ocorrencia(self):
+        tarifa = ("2024-03-07", -1290, "TARIFA PACOTE", "")
+        self.assertEqual(self.importar([tarifa])['novas'], 1)
+        # o livro já tem uma: só a segunda e a terceira do arquivo são novas,
+        # mesmo com cada ocorrência num lote diferente
+        res = self.importar([tarifa] * 3, lote=1)
+        self.assertEqual((res['novas'], res['duplicadas']), (2, 1))
+        res = self.importar([tarifa] * 4)
+        self.assertEqual((res['novas'], res['duplicadas']), (1, 3))
+        self.assertEqual(self.db.fetch_one("SELECT COUNT(*) FROM lancamento")[0], 4)
+        # a chave normaliza caixa e espaços do histórico
+        res = self.importar([("2024-03-07", -1290, "  tarifa   pacote ", "")] * 4)
+        self.assertEqual((res['novas'], res['duplicadas']), (0, 4))
+
+    def test_reimportar_ofx_nao_acrescenta(self):
+        path = self.arquivo("extrato.ofx", OFX)
+        res = self.importar(ler_ofx(path))
+        self.assertEqual((res['lidas'], res['novas'], res['duplicadas']), (4, 4, 0))
+        self.assertEqual((res['entradas'], res['saidas']), (1500.0, 429.8))
+        antes = self.livro()
+        res = self.importar(ler_ofx(path))
+        self.assertEqual((res['novas'], res['duplicadas']), (0, 4))
+        self.assertEqual(self.livro(), antes)
+
+    def test_reimportar_csv_nao_acrescenta(self):
+        path = self.arquivo("extrato.csv", CSV)
+        res = self.importar(ler_csv_extrato(path, LayoutExtrato()))
+        self.assertEqual((res['lidas'], res['novas'], res['ignoradas']), (4, 3, 1))
+        antes = self.livro()
+        self.assertEqual(antes[-1][6:8], (round(2469.12 - 480.10, 2), 'P'))
+        res = self.importar(ler_csv_extrato(path, LayoutExtrato()))
+        self.assertEqual((res['novas'], res['duplicadas']), (0, 3))
+        self.assertEqual(self.livro(), antes)
+
+    def test_simulacao_nao_grava(self):
+        path = self.arquivo("extrato.ofx", OFX)
+        res = self.importar(ler_ofx(path), simular=True)
+        self.assertEqual(res['novas'], 4)
+        self.assertEqual(len(res['previa']), 4)
+        self.assertEqual(self.livro(), [])
+
+    def test_chave_natural_sobrevive_conversao(self):
+        path = self.arquivo("extrato.ofx", OFX)
+        self.importar(ler_ofx(path))
+        # lançamento digitado com a mesma chave de uma linha do extrato
+        self.db.inserir_lancamento({
+            'data': "2024-03-10", 'cod_imovel': 1, 'cod_conta': 1, 'num_doc': "A4",
+            'tipo_doc': 4, 'historico': "ADUBO", 'tipo_lanc': 2,
+            'valor_entrada': 0, 'valor_saida': 250.0,
+        })
+        chaves = self.db.fetch_all("SELECT id, chave_natural FROM lancamento ORDER BY id")
+        self.assertEqual(chaves[-1][1], chaves[-2][1])
+        self.assertTrue(self.db.converter_formato_compacto())
+        self.assertEqual(self.db.fetch_all(
+            "SELECT id, chave_natural FROM lancamento ORDER BY id"), chaves)
+        res = self.importar(ler_ofx(path))
+        self.assertEqual((res['novas'], res['duplicadas']), (0, 4))
+        # a chave de quem é gravado depois da conversão também coincide
+        res = self.importar([("2024-03-10", -25000, "ADUBO", "A4")] * 3)
+        self.assertEqual((res['novas'], res['duplicadas']), (1, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dados import ConnectionManager, Database, FiltroLancamentos
+
+
+class FiltroEPaginacao(unittest.TestCase):
+    compacto = False
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.addCleanup(ConnectionManager.close_all)
+        self.db = db = Database(os.path.join(self.dir.name, "filtro.db"))
+        if self.compacto:
+            db.converter_formato_compacto()
+        db.executemany(
+            "INSERT INTO imovel_rural (cod_imovel, nome_imovel, endereco, bairro, uf, "
+            "cod_mun, cep, tipo_exploracao) VALUES (?, ?, 'Estrada', 'Rural', 'GO', "
+            "'5208707', '74000000', 1)", [("IM1", "Fazenda Norte"), ("IM2", "Fazenda Sul")])
+        db.executemany(
+            "INSERT INTO conta_bancaria (cod_conta, nome_banco, agencia, num_conta) "
+            "VALUES (?, 'Banco', '0001', ?)", [("CT1", "1000-0"), ("CT2", "2000-0")])
+        db.executemany(
+            "INSERT INTO participante (cpf_cnpj, nome, tipo_contraparte) VALUES (?, ?, 1)",
+            [("11144477735", "Cooperativa Agrícola"), ("52998224725", "José Pereira")])
+        # poucas datas para que várias linhas empatem no mesmo dia
+        self.linhas = []
+        for n in range(90):
+            entrada = round(7.5 * n, 2) if n % 3 else None
+            saida = None if n % 3 else round(11.25 * n, 2)
+            dados = {
+                'data': f"2024-0{n % 4 + 1}-1{n % 3}", 'cod_imovel': n % 2 + 1,
+                'cod_conta': (n // 2) % 2 + 1, 'num_doc': f"NF{n:03d}" if n % 5 else None,
+                'tipo_doc': 1, 'historico': f"Venda de {'milho' if n % 2 else 'soja'} {n}",
+                'id_participante': n % 3 or None, 'tipo_lanc': 1 if entrada else 2,
+                'categoria': ("Insumos", "Vendas", None)[n % 3],
+                'valor_entrada': entrada, 'valor_saida': saida,
+            }
+            dados['id'] = self.db.inserir_lancamento(dados).inseridos[0]
+            self.linhas.append(dados)
+
+    def ids(self, filtro):
+        return [row[0] for row in self.db.pagina_lancamentos(filtro, limite=1000)]
+
+    def esperado(self, filtro, cond=lambda d: True):
+        # mesma ordem da tela: (data, id) decrescente
+        linhas = [d for d in self.linhas if filtro.d1 <= d['data'] <= filtro.d2 and cond(d)]
+        return [d['id'] for d in sorted(linhas, key=lambda d: (d['data'], d['id']), reverse=True)]
+
+    def test_criterios(self):
+        def total(d):
+            return (d['valor_entrada'] or 0) + (d['valor_saida'] or 0)
+        casos = [
+            ({}, lambda d: True),
+            ({'conta': 2}, lambda d: d['cod_conta'] == 2),
+            ({'imovel': 1, 'tipo_lanc': 2}, lambda d: d['cod_imovel'] == 1 and d['tipo_lanc'] == 2),
+            ({'categoria': "Vendas"}, lambda d: d['categoria'] == "Vendas"),
+            # entrada ou saída NULL contam como zero
+            ({'valor_min': 100, 'valor_max': 400.5}, lambda d: 100 <= total(d) <= 400.5),
+            ({'valor_max': 0}, lambda d: total(d) == 0),
+            ({'participante': "cooperativa"}, lambda d: d['id_participante'] == 1),
+            ({'participante': "52998224725"}, lambda d: d['id_participante'] == 2),
+            ({'texto': "milho"}, lambda d: "milho" in d['historico']),
+            ({'num_doc': "NF010"}, lambda d: d['num_doc'] == "NF010"),
+            ({'texto': "soja", 'conta': 1, 'valor_min': 50},
+             lambda d: "soja" in d['historico'] and d['cod_conta'] == 1 and total(d) >= 50),
+        ]
+        for criterios, cond in casos:
+            with self.subTest(**criterios):
+                filtro = FiltroLancamentos("2024-02-01", "2024-03-31", **criterios)
+                esperado = self.esperado(filtro, cond)
+                self.assertEqual(self.ids(filtro), esperado)
+                self.assertEqual(sorted(r[0] for r in self.db.lancamentos_por_id(
+                    [d['id'] for d in self.linhas], filtro)), sorted(esperado))
+
+    def test_paginacao_por_chave(self):
+        casos = [
+            ({}, lambda d: True),
+            ({'conta': 1}, lambda d: d['cod_conta'] == 1),
+            ({'texto': "milho"}, lambda d: "milho" in d['historico']),
+        ]
+        for criterios, cond in casos:
+            with self.subTest(**criterios):
+                filtro = FiltroLancamentos("2024-01-01", "2024-12-31", **criterios)
+                lidos, apos = [], None
+                while True:
+                    pagina = self.db.pagina_lancamentos(filtro, apos, limite=7)
+                    lidos += [row[0] for row in pagina]
+                    if len(pagina) < 7:
+                        break
+                    apos = (pagina[-1][1], pagina[-1][0])
+                self.assertEqual(lidos, self.esperado(filtro, cond))
+
+    def test_pagina_nao_altera_o_filtro(self):
+        filtro = FiltroLancamentos("2024-01-01", "2024-12-31")
+        primeira = self.db.pagina_lancamentos(filtro, limite=5)
+        self.db.pagina_lancamentos(filtro, (primeira[-1][1], primeira[-1][0]), limite=5)
+        self.assertEqual(self.db.pagina_lancamentos(filtro, limite=5), primeira)
+
+
+class FiltroEPaginacaoCompacto(FiltroEPaginacao):
+    compacto = True
+
+
+if __name__ == "__main__":
+    unittest.main()
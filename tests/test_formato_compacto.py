@@ -0,0 +1,87 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dados import ConnectionManager, Database
+
+VALORES = (0.01, 0.1, 0.2, 0.29, 1.15, 19.99, 100.1, 1234.56, 99999.99)
+
+
+class FormatoCompacto(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.addCleanup(ConnectionManager.close_all)
+
+    def caminho(self, nome):
+        return os.path.join(self.dir.name, nome)
+
+    def livro(self, nome, compacto_antes=False, compacto_depois=False):
+        # mesmos lançamentos; a conversão pode vir antes (valores passam por
+        # valor_para_db) ou depois (valores passam pelo conversor)
+        db = Database(self.caminho(nome))
+        if compacto_antes:
+            db.converter_formato_compacto()
+        db.execute_query(
+            "INSERT INTO imovel_rural (cod_imovel, nome_imovel, endereco, bairro, uf, "
+            "cod_mun, cep, tipo_exploracao) VALUES ('IM1', 'Fazenda', 'Estrada', 'Rural', "
+            "'GO', '5208707', '74000000', 1)")
+        db.executemany(
+            "INSERT INTO conta_bancaria (cod_conta, nome_banco, agencia, num_conta) "
+            "VALUES (?, 'Banco', '0001', ?)", [("CT1", "1000-0"), ("CT2", "2000-0")])
+        db.execute_query(
+            "INSERT INTO participante (cpf_cnpj, nome, tipo_contraparte) "
+            "VALUES ('00000000001', 'Participante', 1)")
+        for n in range(60):
+            valor = VALORES[n % len(VALORES)] * (n // len(VALORES) + 1)
+            db.inserir_lancamento({
+                'data': f"2024-{n % 12 + 1:02d}-{n % 28 + 1:02d}", 'cod_imovel': 1,
+                'cod_conta': n % 2 + 1, 'num_doc': f"D{n}", 'tipo_doc': 1,
+                'historico': f"Lançamento {n}", 'id_participante': 1 if n % 3 else None,
+                'tipo_lanc': 1 if n % 4 else 2,
+                'valor_entrada': valor if n % 4 else 0, 'valor_saida': 0 if n % 4 else valor,
+            })
+        if compacto_depois:
+            db.converter_formato_compacto()
+        return db
+
+    def saldos(self, db):
+        lancamentos = [
+            (id_, db.data_do_db(data), db.centavos(saldo), nat)
+            for id_, data, saldo, nat in db.fetch_all(
+                "SELECT id, data, saldo_final, natureza_saldo FROM lancamento ORDER BY id")]
+        contas = [(c, db.centavos(s)) for c, s in db.fetch_all(
+            "SELECT conta_id, saldo_atual FROM conta_saldo ORDER BY conta_id")]
+        return lancamentos, contas
+
+    def txt(self, db, nome):
+        path = self.caminho(nome)
+        db.escrever_lcdpr_txt(path)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_saldos_e_txt_iguais_ao_formato_padrao(self):
+        padrao = self.livro("padrao.db")
+        self.assertFalse(padrao.compacto)
+        esperado = self.saldos(padrao), self.txt(padrao, "padrao.txt")
+        for nome, antes in (("compacto.db", True), ("convertido.db", False)):
+            with self.subTest(nome):
+                db = self.livro(nome, compacto_antes=antes, compacto_depois=not antes)
+                self.assertTrue(db.compacto)
+                self.assertEqual((self.saldos(db), self.txt(db, nome + ".txt")), esperado)
+
+    def test_valor_para_db_arredonda_meio_centavo_para_cima(self):
+        db = Database(self.caminho("arredondamento.db"))
+        db.converter_formato_compacto()
+        # 1.005 e 2.675 não têm representação exata em float
+        self.assertEqual([db.valor_para_db(v) for v in (1.005, 2.675, "0.125", -0.005, 0)],
+                         [101, 268, 13, -1, 0])
+        with self.assertRaises(ValueError):
+            db.valor_para_db("abc")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dados import ConnectionManager, Database
+
+
+# Lançamentos comparados entre bancos pelas chaves naturais das referências
+LANCAMENTOS = """
+    SELECT l.data, i.cod_imovel, c.cod_conta, l.num_doc, l.tipo_doc, l.historico,
+           p.cpf_cnpj, l.tipo_lanc, l.valor_entrada, l.valor_saida, l.saldo_final,
+           l.natureza_saldo
+    FROM lancamento l
+    JOIN imovel_rural i ON i.id = l.cod_imovel
+    JOIN conta_bancaria c ON c.id = l.cod_conta
+    LEFT JOIN participante p ON p.id = l.id_participante
+    ORDER BY l.id
+"""
+
+
+class RoundTripLcdprTxt(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.addCleanup(ConnectionManager.close_all)
+
+    def caminho(self, nome):
+        return os.path.join(self.dir.name, nome)
+
+    def banco_com_lacunas(self, compacto=False):
+        # ids 1 de imóvel, conta e participante excluídos: as referências do
+        # banco de origem não coincidem com as posições dos registros no TXT
+        db = Database(self.caminho("origem.db"))
+        db.executemany(
+            "INSERT INTO imovel_rural (cod_imovel, insc_estadual, nome_imovel, endereco, compl, "
+            "bairro, uf, cod_mun, cep, tipo_exploracao) VALUES (?, 'ISENTO', ?, 'Estrada', 'km 4', "
+            "'Rural', 'GO', '5208707', '74000000', 1)",
+            [(f"IM{n}", f"Fazenda {n}") for n in range(1, 4)])
+        db.executemany(
+            "INSERT INTO conta_bancaria (cod_conta, nome_banco, agencia, num_conta) "
+            "VALUES (?, 'Banco', '0001', ?)",
+            [(f"CT{n}", f"{n}000-0") for n in range(1, 4)])
+        db.executemany(
+            "INSERT INTO participante (cpf_cnpj, nome, tipo_contraparte) VALUES (?, ?, 1)",
+            [(f"0000000000{n}", f"Participante {n}") for n in range(1, 4)])
+        for n in range(30):
+            imovel, conta = n % 3 + 1, (n + 1) % 3 + 1
+            db.inserir_lancamento({
+                'data': f"2024-{n % 12 + 1:02d}-{n % 28 + 1:02d}", 'cod_imovel': imovel,
+                'cod_conta': conta, 'num_doc': f"D{n}" if n % 2 else None, 'tipo_doc': 1,
+                'historico': f"Lançamento {n}", 'id_participante': n % 4 or None,
+                'tipo_lanc': 1 if n % 3 else 2,
+                'valor_entrada': 100.25 * n if n % 3 else 0, 'valor_saida': 0 if n % 3 else 33.1 * n,
+            })
+        for lanc_id, in db.fetch_all(
+                "SELECT id FROM lancamento WHERE cod_imovel = 1 OR cod_conta = 1 OR id_participante = 1"):
+            db.excluir_lancamento(lanc_id)
+        for tabela in ('imovel_rural', 'conta_bancaria', 'participante'):
+            db.execute_query(f"DELETE FROM {tabela} WHERE id = 1")
+        if compacto:
+            db.converter_formato_compacto()
+        return db
+
+    def verificar_round_trip(self, compacto):
+        origem = self.banco_com_lacunas(compacto)
+        self.assertTrue(origem.fetch_one("SELECT COUNT(*) FROM lancamento")[0])
+        txt = self.caminho("origem.txt")
+        origem.escrever_lcdpr_txt(txt)
+
+        destino = Database(self.caminho("destino.db"))
+        if compacto:
+            destino.converter_formato_compacto()
+        res = destino.importar_lcdpr_txt(txt)
+        self.assertEqual(res['invalidas'], 0, res['erros'])
+        self.assertEqual(destino.fetch_all(LANCAMENTOS), origem.fetch_all(LANCAMENTOS))
+
+        copia = self.caminho("destino.txt")
+        destino.escrever_lcdpr_txt(copia)
+        with open(txt, 'rb') as a, open(copia, 'rb') as b:
+            self.assertEqual(a.read(), b.read())
+
+    def test_ids_com_lacunas(self):
+        self.verificar_round_trip(compacto=False)
+
+    def test_ids_com_lacunas_formato_compacto(self):
+        self.verificar_round_trip(compacto=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
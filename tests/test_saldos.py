@@ -0,0 +1,95 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dados import ConnectionManager, Database
+
+
+class CadeiaSaldos(unittest.TestCase):
+    compacto = False
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.addCleanup(ConnectionManager.close_all)
+        self.db = Database(os.path.join(self.dir.name, "saldos.db"))
+        if self.compacto:
+            self.db.converter_formato_compacto()
+        self.db.execute_query(
+            "INSERT INTO imovel_rural (cod_imovel, nome_imovel, endereco, bairro, uf, "
+            "cod_mun, cep, tipo_exploracao) VALUES ('IM1', 'Fazenda', 'Estrada', 'Rural', "
+            "'GO', '5208707', '74000000', 1)")
+        self.db.executemany(
+            "INSERT INTO conta_bancaria (cod_conta, nome_banco, agencia, num_conta, saldo_inicial) "
+            "VALUES (?, 'Banco', '0001', ?, ?)",
+            [("CT1", "1000-0", self.db.valor_para_db(500.0)), ("CT2", "2000-0", 0)])
+        self.ids = [self.inserir(f"2024-03-{n % 10 + 10:02d}", n % 2 + 1,
+                                 entrada=12.35 * n if n % 3 else 0,
+                                 saida=0 if n % 3 else 40.1 + n)
+                    for n in range(20)]
+        self.verificar_cadeias()
+
+    def inserir(self, data, conta, entrada=0.0, saida=0.0):
+        alt = self.db.inserir_lancamento({
+            'data': data, 'cod_imovel': 1, 'cod_conta': conta, 'tipo_doc': 1,
+            'historico': f"Lançamento {data}", 'tipo_lanc': 1 if entrada else 2,
+            'valor_entrada': entrada, 'valor_saida': saida,
+        })
+        return alt.inseridos[0]
+
+    def verificar_cadeias(self):
+        # refaz do zero, em centavos, a cadeia (data, id) de cada conta
+        db = self.db
+        for conta, inicial in db.fetch_all("SELECT id, saldo_inicial FROM conta_bancaria"):
+            saldo, esperado, gravado = 0, [], []
+            for id_, ent, sai, saldo_f, nat in db.fetch_all(
+                    "SELECT id, valor_entrada, valor_saida, saldo_final, natureza_saldo "
+                    "FROM lancamento WHERE cod_conta=? ORDER BY data, id", (conta,)):
+                saldo += db.centavos(ent) - db.centavos(sai)
+                esperado.append((id_, abs(saldo), 'P' if saldo >= 0 else 'N'))
+                gravado.append((id_, db.centavos(saldo_f), nat))
+            self.assertEqual(gravado, esperado)
+            movimento, atual = db.fetch_one(
+                "SELECT saldo_movimento, saldo_atual FROM conta_saldo WHERE conta_id=?", (conta,))
+            self.assertEqual(db.centavos(movimento), saldo)
+            self.assertEqual(db.centavos(atual), db.centavos(inicial) + saldo)
+
+    def test_insercao_retroativa(self):
+        self.inserir("2024-01-05", 1, saida=999.99)
+        self.verificar_cadeias()
+        # mesmo dia de lançamentos existentes: desempata pelo id
+        self.inserir("2024-03-10", 1, entrada=0.01)
+        self.verificar_cadeias()
+
+    def test_atualizacao_muda_data(self):
+        ultimo, primeiro = self.ids[-1], self.ids[0]
+        self.db.atualizar_lancamento(ultimo, {'data': "2024-02-01"})
+        self.verificar_cadeias()
+        self.db.atualizar_lancamento(primeiro, {'data': "2024-04-30", 'valor_saida': 77.7})
+        self.verificar_cadeias()
+
+    def test_atualizacao_muda_conta(self):
+        lanc = self.ids[4]
+        conta = self.db.fetch_one("SELECT cod_conta FROM lancamento WHERE id=?", (lanc,))[0]
+        self.db.atualizar_lancamento(lanc, {'cod_conta': 3 - conta, 'data': "2024-03-01"})
+        self.verificar_cadeias()
+        self.db.atualizar_lancamento(lanc, {'cod_conta': conta, 'data': "2024-03-31"})
+        self.verificar_cadeias()
+
+    def test_exclusao(self):
+        for lanc in (self.ids[7], self.ids[0], self.ids[-1]):
+            self.db.excluir_lancamento(lanc)
+            self.verificar_cadeias()
+        self.assertIsNone(self.db.fetch_one(
+            "SELECT id FROM lancamento WHERE id=?", (self.ids[7],)))
+
+
+class CadeiaSaldosCompacta(CadeiaSaldos):
+    compacto = True
+
+
+if __name__ == "__main__":
+    unittest.main()
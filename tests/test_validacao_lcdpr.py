@@ -0,0 +1,120 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dados import ConnectionManager, Database, OperacaoCancelada, _tipo_cpf_cnpj
+
+
+class TipoCpfCnpj(unittest.TestCase):
+    def test_cpf(self):
+        for doc in ("52998224725", "529.982.247-25", "11144477735", "39053344705"):
+            self.assertEqual(_tipo_cpf_cnpj(doc), 1, doc)
+
+    def test_cnpj(self):
+        for doc in ("11222333000181", "11.222.333/0001-81", "04252011000110"):
+            self.assertEqual(_tipo_cpf_cnpj(doc), 2, doc)
+
+    def test_invalidos(self):
+        for doc in (
+            "52998224724", "52998224715",           # 2º e 1º dígitos de CPF
+            "11222333000182", "11222333000191",     # 2º e 1º dígitos de CNPJ
+            "11111111111", "00000000000000",        # dígitos todos iguais
+            "5299822472", "112223330001810",        # tamanho errado
+            "", None, "abc",
+        ):
+            self.assertEqual(_tipo_cpf_cnpj(doc), 0, doc)
+
+
+class ValidacaoLcdpr(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.addCleanup(ConnectionManager.close_all)
+        self.db = db = Database(os.path.join(self.dir.name, "validacao.db"))
+        db.execute_query(
+            "INSERT INTO imovel_rural (cod_imovel, nome_imovel, endereco, bairro, uf, "
+            "cod_mun, cep, tipo_exploracao, participacao) VALUES ('IM1', 'Fazenda', 'Estrada', "
+            "'Rural', 'GO', '5208707', '74000000', 1, 100)")
+        db.execute_query(
+            "INSERT INTO conta_bancaria (cod_conta, banco, nome_banco, agencia, num_conta) "
+            "VALUES ('CT1', '001', 'Banco', '0001', '1000-0')")
+        db.executemany(
+            "INSERT INTO participante (cpf_cnpj, nome, tipo_contraparte) VALUES (?, ?, ?)",
+            [("52998224725", "José", 1), ("11222333000181", "Cooperativa", 2)])
+        for n, ano in enumerate((2023, 2024)):
+            db.inserir_lancamento({
+                'data': f"{ano}-05-10", 'cod_imovel': 1, 'cod_conta': 1, 'num_doc': f"NF{n}",
+                'tipo_doc': 1, 'historico': "Venda", 'id_participante': 1, 'tipo_lanc': 1,
+                'valor_entrada': 100.0, 'valor_saida': 0,
+            })
+
+    def problemas(self, **kw):
+        res = self.db.validar_lcdpr(**kw)
+        return res['total'], [(e['registro'], e['id'], e['chave'], e['campo'], e['mensagem'])
+                              for e in res['erros']]
+
+    def test_livro_valido(self):
+        self.assertEqual(self.problemas(), (0, []))
+
+    def test_funcao_registrada_na_conexao(self):
+        # disponível sem passar por validar_lcdpr, também em conexões novas
+        self.assertEqual(self.db.fetch_one(
+            "SELECT tipo_cpf_cnpj('52998224725'), tipo_cpf_cnpj('11222333000181')"), (1, 2))
+        ConnectionManager.close_all()
+        db = Database(os.path.join(self.dir.name, "validacao.db"))
+        self.assertEqual(db.fetch_one("SELECT tipo_cpf_cnpj('111')"), (0,))
+
+    def test_regras_de_uma_linha_em_ordem(self):
+        db = self.db
+        # cada linha devolve todas as regras que falharam, na ordem das regras
+        db.execute_query("UPDATE imovel_rural SET uf='XX', cep='740-00' WHERE id=1")
+        db.execute_query("UPDATE conta_bancaria SET banco='1' WHERE id=1")
+        db.execute_query("UPDATE participante SET tipo_contraparte=1 WHERE id=2")
+        db.execute_query(
+            "INSERT INTO participante (cpf_cnpj, nome, tipo_contraparte) VALUES ('52998224724', '', 7)")
+        self.assertEqual(self.problemas(), (7, [
+            ('0040', 1, 'IM1', 'uf', "UF inexistente"),
+            ('0040', 1, 'IM1', 'cep', "CEP deve ter 8 dígitos"),
+            ('0050', 1, 'CT1', 'banco', "código do banco deve ter 3 dígitos"),
+            ('0100', 2, '11222333000181', 'cpf_cnpj', "pessoa física com CNPJ"),
+            ('0100', 3, '52998224724', 'cpf_cnpj', "CPF/CNPJ inválido"),
+            ('0100', 3, '52998224724', 'nome', "campo obrigatório vazio"),
+            ('0100', 3, '52998224724', 'tipo_contraparte', "tipo de participante fora de 1 a 4"),
+        ]))
+
+    def test_q100_chave_referencias_e_ano(self):
+        db = self.db
+        db.execute_query("UPDATE lancamento SET num_doc=NULL, historico='Venda de soja', "
+                         "id_participante=9, valor_entrada=0 WHERE id=1")
+        db.execute_query("UPDATE lancamento SET cod_conta=5, tipo_doc=0 WHERE id=2")
+        # sem documento, o lançamento é identificado pelo histórico
+        self.assertEqual(self.problemas(), (4, [
+            ('Q100', 1, 'Venda de soja', 'id_participante', "participante inexistente"),
+            ('Q100', 1, 'Venda de soja', 'valor_entrada', "lançamento sem valor de entrada nem de saída"),
+            ('Q100', 2, 'NF1', 'cod_conta', "conta bancária inexistente"),
+            ('Q100', 2, 'NF1', 'tipo_doc', "tipo de documento fora de 1 a 4"),
+        ]))
+        # com `ano`, só os lançamentos do exercício; os cadastros, sempre
+        self.assertEqual(self.problemas(ano=2024)[0], 2)
+        self.assertEqual(self.problemas(ano=2022), (0, []))
+
+    def test_limite_continua_contando(self):
+        self.db.execute_query("UPDATE lancamento SET historico='', tipo_lanc=9")
+        total, erros = self.problemas(limite=3)
+        self.assertEqual(total, 4)
+        self.assertEqual([e[1:4:2] for e in erros],
+                         [(1, 'tipo_lanc'), (1, 'historico'), (2, 'tipo_lanc')])
+
+    def test_cancelamento(self):
+        andamento = []
+        self.db.validar_lcdpr(progresso=lambda feitas, total: andamento.append((feitas, total)))
+        self.assertEqual(andamento, [(0, 4), (1, 4), (2, 4), (3, 4), (4, 4)])
+        with self.assertRaises(OperacaoCancelada):
+            self.db.validar_lcdpr(cancelado=lambda: True)
+
+
+if __name__ == "__main__":
+    unittest.main()